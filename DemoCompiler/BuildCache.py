@@ -0,0 +1,183 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Incremental build cache for the Jack compiler.
+
+The cache is a JSON file (`.jackcache.json`) kept next to the `.vm`
+outputs. For every class it records:
+- `key`: a hash of the source, the compiler version and the options used.
+- `interface`: the class's members (name -> signature), as recorded by
+  `CompilationEngine.interface`.
+- `references`: for every other class whose members it calls, the
+  signature of each such member at compile time (None if unknown).
+- `strings`: the string constants it takes from the shared string pool.
+
+A class is up to date when its key still matches, its `.vm` exists, and
+every member it references still has the recorded signature. Source
+hashes are reused while a file's mtime and size are unchanged, so a no-op
+rebuild does not even read the sources. A long-running process can keep a
+loaded cache between builds, reloading it only when `is_stale()`.
+"""
+
+import hashlib
+import json
+import os
+import typing
+
+CACHE_FILENAME = ".jackcache.json"
+
+
+class BuildCache:
+    """The build cache of one output directory."""
+
+    def __init__(self, directory: str, version: str,
+                 options: dict[str, typing.Any]) -> None:
+        """Loads the cache of a directory, if there is one.
+
+        Args:
+            directory: The directory holding the sources and `.vm` outputs.
+            version: The compiler version; a new version invalidates all.
+            options: The compile options; different options invalidate all.
+        """
+        self.path = os.path.join(directory, CACHE_FILENAME)
+        self.salt = json.dumps([version, options], sort_keys=True)
+        self.entries: dict[str, dict] = {}
+        self.stamp = self.file_stamp()
+        try:
+            with open(self.path, "r") as cache_file:
+                self.entries = json.load(cache_file)
+        except (OSError, ValueError):
+            # A missing or corrupt cache just means a full build.
+            self.entries = {}
+
+    def file_stamp(self) -> typing.Optional[list[int]]:
+        """Return the mtime and size of the cache file, or None if there is
+        none."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return [stat.st_mtime_ns, stat.st_size]
+
+    def is_stale(self) -> bool:
+        """Return True if another process changed the cache file since this
+        cache was loaded or saved."""
+        return self.file_stamp() != self.stamp
+
+    def source_state(self, input_path: str) -> tuple[list[int], str]:
+        """Return the mtime and size of a source, and its content hash,
+        reusing the cached hash while the mtime and size are unchanged.
+
+        Take it before compiling the source, and `record` it: the file may
+        be saved again while it compiles.
+        """
+        stat = os.stat(input_path)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        entry = self.entries.get(input_path)
+        if entry is not None and entry.get("stamp") == stamp:
+            return stamp, entry["source"]
+        with open(input_path, "rb") as input_file:
+            return stamp, hashlib.sha256(input_file.read()).hexdigest()
+
+    def key(self, source: str) -> str:
+        """Return the cache key of a source hash under this version and
+        options."""
+        return hashlib.sha256((self.salt + source).encode()).hexdigest()
+
+    def is_fresh(self, input_path: str, state: tuple[list[int], str]) -> bool:
+        """Return True if the source and options match the last build of it
+        and its output still exists. References are checked separately.
+
+        Args:
+            input_path: The source.
+            state: Its `source_state`.
+        """
+        entry = self.entries.get(input_path)
+        return (entry is not None
+                and entry["key"] == self.key(state[1])
+                and os.path.exists(entry["output"]))
+
+    def interfaces(self) -> dict[str, dict[str, str]]:
+        """Return the recorded interface of every cached class."""
+        return {entry["class"]: entry["interface"]
+                for entry in self.entries.values()}
+
+    def references_current(self, input_path: str,
+                           interfaces: dict[str, dict[str, str]]) -> bool:
+        """Return True if every member the class references still has the
+        signature it was compiled against.
+
+        Args:
+            input_path: A source that `is_fresh`.
+            interfaces: The current interface of every class in the build.
+        """
+        references = self.entries[input_path]["references"]
+        for class_name, members in references.items():
+            interface = interfaces.get(class_name, {})
+            for member, signature in members.items():
+                if interface.get(member) != signature:
+                    return False
+        return True
+
+    def record(self, input_path: str, state: tuple[list[int], str],
+               output_path: str, class_name: str,
+               interface: dict[str, str], references: dict[str, list[str]],
+               interfaces: dict[str, dict[str, str]],
+               strings: typing.Iterable[str] = ()) -> None:
+        """Record a successful compilation of a source.
+
+        Args:
+            input_path: The compiled source.
+            state: Its `source_state`, taken before it was compiled; a
+                later save then makes it out of date.
+            output_path: The `.vm` file written for it.
+            class_name: The compiled class.
+            interface: The class's members (name -> signature).
+            references: Members of other classes it calls (class -> names).
+            interfaces: The current interface of every class in the build.
+            strings: The string constants it takes from the shared pool.
+        """
+        stamp, source = state
+        self.entries[input_path] = {
+            "stamp": stamp,
+            "source": source,
+            "key": self.key(source),
+            "output": output_path,
+            "class": class_name,
+            "interface": interface,
+            "references": {
+                other: {member: interfaces.get(other, {}).get(member)
+                        for member in sorted(members)}
+                for other, members in sorted(references.items())},
+            "strings": sorted(strings),
+        }
+
+    def strings(self) -> set[str]:
+        """Return the string constants that the cached classes take from the
+        shared string pool."""
+        return {string for entry in self.entries.values()
+                for string in entry.get("strings", ())}
+
+    def forget(self, input_path: str) -> None:
+        """Drop a source from the cache, so it is rebuilt next time."""
+        self.entries.pop(input_path, None)
+
+    def prune(self, input_paths: typing.Iterable[str]) -> None:
+        """Drop the entries of sources that are no longer part of the build."""
+        keep = set(input_paths)
+        for input_path in list(self.entries):
+            if input_path not in keep:
+                del self.entries[input_path]
+
+    def save(self) -> None:
+        """Write the cache back to disk atomically."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump(self.entries, cache_file, sort_keys=True)
+        os.replace(temp_path, self.path)
+        self.stamp = self.file_stamp()
@@ -19,63 +19,146 @@ High-level flow:
 The implementation assumes that `JackTokenizer` exposes a *single* current
 token at a time, and that `advance()` has already been called before most
 compile_* routines.
+
+Malformed code raises a `SourceError` at the offending token: an
+`UnexpectedToken` where a statement, a term or the token that closes one
+should be, and an `UndeclaredIdentifier` for a variable no scope declares.
 """
 
 import typing
-import copy
+import ConstantFolder
+import Peephole
+from Diagnostics import SourceError, UnexpectedToken, UndeclaredIdentifier
+from StringPool import StringPool
+from StrengthReducer import StrengthReducer
 from JackTokenizer import JackTokenizer
 from VMWriter import VMWriter
-from SymbolTable import SymbolTable
+from SymbolTable import SymbolTable, Entry
 
 op_list = {'+','-','*','/','&','|','<','>',"="}
+comparison_ops = {'<', '>', '='}
 op_list_ext:dict = {'<': "&lt;", '>': "&gt;", '&': "&amp;"}
 keyword_const = {"true", "false", "null", "this"}
+# Values of the keyword constants that fold like integer literals.
+keyword_values = {"true": ConstantFolder.TRUE, "false": ConstantFolder.FALSE, "null": 0}
+class_var_kinds = {"static", "field"}
+subroutine_kinds = {"constructor", "method", "function"}
 
 class CompilationEngine:
     """Gets input from a JackTokenizer and emits its parsed structure into an
     output stream.
     """
 
-    def __init__(self, input_stream: "JackTokenizer", output_stream) -> None:
+    def __init__(self, input_stream: "JackTokenizer", output_stream,
+                 buffered: bool = False, ir: bool = False,
+                 peephole: bool = False, fold_constants: bool = False,
+                 pool_strings: str = None,
+                 strength_reducer: StrengthReducer = None,
+                 direct_branches: bool = False) -> None:
         """
         Creates a new compilation engine with the given input and output. The
         next routine called must be compileClass()
         :param input_stream: The input stream.
         :param output_stream: The output stream.
+        :param buffered: Buffer the VM output and write it in large chunks.
+        :param ir: Build the VM code as a `VMCode` instruction list, available
+            as `self.output_stream.code`, and render it at the end of the class.
+        :param peephole: Run the peephole optimizer over the class (implies ir).
+        :param fold_constants: Evaluate constant (sub)expressions at compile time.
+        :param pool_strings: Build each string constant once, in a static slot
+            of the class ("class") or of the shared `StringPool` ("program").
+        :param strength_reducer: Lower `*` and `/` by constants to cheaper
+            sequences, as this reducer decides.
+        :param direct_branches: Compile if and while statements with as few
+            branches and `not`s as possible (see `compile_direct_if`).
         """
         self.input_stream: JackTokenizer = input_stream
-        self.output_stream = VMWriter(output_stream)
+        self.output_stream = VMWriter(output_stream, buffered, ir or peephole)
+        self.peephole = peephole
+        self.fold_constants = fold_constants
+        self.strength_reducer = strength_reducer
+        self.direct_branches = direct_branches
+        # Whether the value the last compiled term or expression leaves on
+        # the stack is known to be a boolean (0 or -1).
+        self.boolean = False
+        # The push that the last compiled term consists of, if it is a
+        # variable or a constant, which strength reduction may push again.
+        self.operand: typing.Optional[tuple] = None
+        # Constant left operands of enclosing expressions whose push is held
+        # back until their right operand turns out not to be constant.
+        self.pending_constants: list[int] = []
+        self.pool_strings = pool_strings
+        self.string_pool: StringPool = None
+        # Optimization statistics, e.g. instructions removed per peephole rule.
+        self.report: dict[str, int] = {}
         self.class_name: str = None
         self.symTable: SymbolTable = None
         # Label counters ensure unique VM labels across the entire class compilation.
         self.label_counter_if = -1
         self.label_counter_while = -1
+        # The class's externally visible members (name -> signature), and the
+        # members of other classes it calls (class -> names), for build caching.
+        self.interface: dict[str, str] = {}
+        self.references: dict[str, set[str]] = {}
+
+    def error(self, error_type: type, message: str) -> SourceError:
+        """Return an error of the given `SourceError` type at the current
+        token."""
+        return error_type(message, *(self.input_stream.position() or ()))
+
+    def unexpected(self, expected: str) -> UnexpectedToken:
+        """Return the error for a current token that is not what the grammar
+        expects there."""
+        if not self.input_stream.has_more_tokens():
+            return self.error(UnexpectedToken,
+                              f"unexpected end of input, expected {expected}")
+        return self.error(UnexpectedToken, f"unexpected "
+                          f"{self.input_stream.get_token()!r}, expected {expected}")
+
+    def skip(self, symbol: str) -> None:
+        """Skips the current token, which must be the given symbol."""
+        if self.input_stream.which_token() != symbol:
+            raise self.unexpected(repr(symbol))
+        self.input_stream.advance()
+
+    def resolve_variable(self, name: str) -> Entry:
+        """Return the symbol table entry of a variable.
+
+        Raises:
+            UndeclaredIdentifier: If no scope declares the name.
+        """
+        # search the name in the current scope, then the enclosing ones
+        entry, _ = self.symTable.resolve(name)
+        if entry is None:
+            raise self.error(UndeclaredIdentifier, f"undeclared identifier {name!r}")
+        return entry
 
-    def get_if_label(self, mes_in: str, mes_out: str) -> tuple[str, str]:
-        """Return unique label names for an if/else pair.
+    def get_if_label(self, *names: str) -> tuple[str, ...]:
+        """Return unique label names for an if/else statement.
 
         Args:
-            mes_in: Base name for the label used when branching into the else clause.
-            mes_out: Base name for the label used to jump out of the if statement.
+            names: Base names of the labels, e.g. the label used when
+                branching into the else clause and the one used to jump out
+                of the if statement.
 
         Returns:
-            (else_label, out_label) where each label is suffixed with a counter.
+            The labels, in order, each suffixed with the same counter.
         """
         self.label_counter_if += 1
-        return f'{mes_in}.{self.label_counter_if}', f'{mes_out}.{self.label_counter_if}'
+        return tuple(f'{name}.{self.label_counter_if}' for name in names)
 
-    def get_while_label(self, mes_in: str, mes_out: str) -> tuple[str, str]:
+    def get_while_label(self, *names: str) -> tuple[str, ...]:
         """Return unique label names for a while loop.
 
         Args:
-            mes_in: Base name for the label at the start of the loop.
-            mes_out: Base name for the label at the end (loop exit).
+            names: Base names of the labels, e.g. the label at the start of
+                the loop and the one at its end (loop exit).
 
         Returns:
-            (in_label, out_label) where each label is suffixed with a counter.
+            The labels, in order, each suffixed with the same counter.
         """
         self.label_counter_while += 1
-        return f'{mes_in}.{self.label_counter_while}', f'{mes_out}.{self.label_counter_while}'
+        return tuple(f'{name}.{self.label_counter_while}' for name in names)
 
     def compile_class(self) -> None:
         """Compiles a complete class."""
@@ -96,17 +179,42 @@ class CompilationEngine:
             self.symTable = SymbolTable()
 
             # check for class variables
-            while self.input_stream.which_token() == "static" or self.input_stream.which_token() == "field":
+            while self.input_stream.which_token() in class_var_kinds:
                 self.compile_class_var_dec()
 
+            self.start_string_pool()
+
             #check for class methods
-            while self.input_stream.which_token() == "constructor" or\
-                self.input_stream.which_token() == "method" or\
-                self.input_stream.which_token() == "function":
+            while self.input_stream.which_token() in subroutine_kinds:
                 self.compile_subroutine()
 
             #skipping }
 
+        self.finish_class()
+
+    def start_string_pool(self) -> None:
+        """Set up the string pool, if any, once the class variables are
+        declared: pooled strings take the static slots after them."""
+        if self.pool_strings is not None:
+            self.string_pool = StringPool(
+                self.class_name, self.symTable.var_count("static"),
+                shared=self.pool_strings == "program")
+
+    def finish_class(self) -> None:
+        """Write the string pool accessors, gather the optimization
+        statistics, and flush the class's code."""
+        if self.string_pool is not None:
+            if not self.string_pool.shared:
+                self.string_pool.write_accessors(self.output_stream)
+            self.report.update(self.string_pool.report(
+                accessors=not self.string_pool.shared))
+        if self.strength_reducer is not None:
+            self.report.update(self.strength_reducer.report())
+        if self.peephole:
+            for rule, removed in Peephole.optimize(self.output_stream.code).items():
+                self.report[f"peephole/{rule}"] = removed
+        self.output_stream.flush()
+
     def compile_class_var_dec(self) -> None:
         """Compiles a static declaration or a field declaration."""
         #retrieving static/field
@@ -123,6 +231,7 @@ class CompilationEngine:
 
         # add class vars to symTable
         self.symTable.define(name, type, kind)
+        self.interface[name] = f"{kind} {type}"
 
         while self.input_stream.which_token() == ",":
             # skip ,
@@ -131,6 +240,7 @@ class CompilationEngine:
             name = self.input_stream.which_token()
             self.input_stream.advance()
             self.symTable.define(name, type, kind)
+            self.interface[name] = f"{kind} {type}"
 
         #skipping ;
         self.input_stream.advance()
@@ -165,7 +275,8 @@ class CompilationEngine:
             self.symTable.define("this", self.class_name, "arg")
 
         #parameter list
-        self.compile_parameter_list()
+        parameter_types = self.compile_parameter_list()
+        self.interface[name] = f"{typeFunc} {typeReturn}({', '.join(parameter_types)})"
 
         # writing )
         # self.print_symbol()
@@ -179,6 +290,23 @@ class CompilationEngine:
         while self.input_stream.which_token() == "var":
             self.compile_var_dec()
 
+        self.write_prologue(typeFunc, name)
+
+        self.compile_statements(typeReturn)
+
+        self.input_stream.advance()
+
+        # Restore the previous (class-level) scope after finishing this subroutine.
+        self.symTable.getNext()
+
+    def write_prologue(self, typeFunc: str, name: str) -> None:
+        """Emit the `function` command of a subroutine whose variables are
+        declared, and its prologue.
+
+        Args:
+            typeFunc: constructor, method or function.
+            name: The subroutine's name.
+        """
         if not self.symTable.isEmpty():
             num_args = self.symTable.var_count("var")
         else:
@@ -191,13 +319,8 @@ class CompilationEngine:
         if typeFunc == "constructor":
             self.output_stream.write_function(f"{self.class_name}.{name}", 0)
 
-            # search x withing current scope
-            cur_sym_table = copy.deepcopy(self.symTable)
-            index = cur_sym_table.var_count("field")
-            while index <= 0:
-            # #if not found, go deeper
-                cur_sym_table.getNext()
-                index = cur_sym_table.var_count("field")
+            # the object size is the field count of the class scope
+            index = self.symTable.resolve_count("field")
             self.output_stream.write_push("const", index)
             self.output_stream.write_call("Memory.alloc", 1)
             self.output_stream.write_pop("pointer", 0)
@@ -208,18 +331,14 @@ class CompilationEngine:
         else:
             self.output_stream.write_function(f"{self.class_name}.{name}", num_args)
 
-
-        self.compile_statements(typeReturn)
-
-        self.input_stream.advance()
-
-        # Restore the previous (class-level) scope after finishing this subroutine.
-        self.symTable.getNext()
-
-    def compile_parameter_list(self) -> None:
+    def compile_parameter_list(self) -> list[str]:
         """Compiles a (possibly empty) parameter list, not including the
         enclosing "()".
+
+        Returns:
+            The parameter types, in order.
         """
+        parameter_types = []
         if self.input_stream.which_token() != ")":
             kind = "arg"
             type = self.input_stream.which_token()
@@ -229,6 +348,7 @@ class CompilationEngine:
             name = self.input_stream.which_token()
 
             self.symTable.define(name, type, kind)
+            parameter_types.append(type)
 
             self.input_stream.advance()
 
@@ -239,7 +359,9 @@ class CompilationEngine:
                 self.input_stream.advance()
                 name = self.input_stream.which_token()
                 self.symTable.define(name, type, kind)
+                parameter_types.append(type)
                 self.input_stream.advance()
+        return parameter_types
 
     def compile_var_dec(self) -> None:
         """Compiles a var declaration."""
@@ -285,18 +407,21 @@ class CompilationEngine:
                 return type. For `void` functions we must push a dummy 0 before
                 emitting `return`.
         """
-        if self.input_stream.which_token() == "if":
+        statement = self.input_stream.which_token()
+        if statement == "if":
             self.compile_if()
-        if self.input_stream.which_token() == "let":
+        elif statement == "let":
             self.compile_let()
-        if self.input_stream.which_token() == "while":
+        elif statement == "while":
             self.compile_while()
-        if self.input_stream.which_token() == "do":
+        elif statement == "do":
             self.compile_do()
-        if self.input_stream.which_token() == "return":
+        elif statement == "return":
             if name == "void":
                 self.output_stream.write_push("const", 0)
             self.compile_return()
+        else:
+            raise self.unexpected("a statement")
 
     def compile_do(self) -> None:
         """Compiles a do statement."""
@@ -306,11 +431,9 @@ class CompilationEngine:
         className = self.input_stream.which_token()
         self.input_stream.advance()
         self.compile_subroutineCall(className)
-        self.input_stream.advance()
+        self.skip(")")
         self.output_stream.write_pop("temp", 0)
-        #printing ;
-
-        self.input_stream.advance()
+        self.skip(";")
 
     def compile_subroutineCall(self, className: str) -> None:
         """Compile a subroutine call starting after the first identifier.
@@ -334,25 +457,22 @@ class CompilationEngine:
             #printing (
             self.input_stream.advance()
 
-            cur_sym_table = copy.deepcopy(self.symTable)
-            inSym = cur_sym_table.isNameInSym(className)
-            while not inSym and cur_sym_table.hasNext():
-                cur_sym_table.getNext()
-                inSym = cur_sym_table.isNameInSym(className)
+            # search the name in the current scope, then the enclosing ones
+            entry, _ = self.symTable.resolve(className)
             #inner method inside the class
             if className == self.class_name and className != "Main" and subName != "new":
                 countArgs = self.compile_expression_list()
                 self.output_stream.write_call(f"{self.class_name}.{subName}", countArgs + 1)
-            elif inSym:
-                segment = cur_sym_table.kind_of(className)
-                index = cur_sym_table.index_of(className)
-                self.output_stream.write_push(segment, index)
+            elif entry is not None:
+                self.output_stream.write_push(entry.kind, entry.index)
                 ##pushing the arguments in the expression list
                 countArgs = self.compile_expression_list()
                 ##call
-                type_arg = cur_sym_table.type_of(className)
-                self.output_stream.write_call(f"{type_arg}.{subName}", countArgs + 1)
+                self.output_stream.write_call(f"{entry.type}.{subName}", countArgs + 1)
+                self.references.setdefault(entry.type, set()).add(subName)
             else:
+                if className != self.class_name:
+                    self.references.setdefault(className, set()).add(subName)
                 countArgs = self.compile_expression_list()
                 self.output_stream.write_call(f"{className}.{subName}", countArgs)
 
@@ -370,16 +490,17 @@ class CompilationEngine:
 
         #skipping var name
         varName = self.input_stream.which_token()
-        segment = self.symTable.kind_of(varName)
-        index = self.symTable.index_of(varName)
+        entry = self.resolve_variable(varName)
+        segment = entry.kind
+        index = entry.index
         self.input_stream.advance()
         # self.output_stream.write_push(segment, index)
         if self.input_stream.which_token() == "[":
             self.output_stream.write_push(segment, index)
             self.input_stream.advance()
             self.compile_expression()
-            self.input_stream.advance()
-            self.input_stream.advance()
+            self.skip("]")
+            self.skip("=")
             self.output_stream.write_arithmetic("add")
             self.compile_expression()
             self.output_stream.write_pop("temp", 0)
@@ -387,26 +508,19 @@ class CompilationEngine:
             self.output_stream.write_push("temp", 0)
             self.output_stream.write_pop("that", 0)
         else:
-        #printing =
-            self.input_stream.advance()
+            self.skip("=")
 
             self.compile_expression()
 
-            # search x withing current scope
-            cur_sym_table = copy.deepcopy(self.symTable)
-            segment = cur_sym_table.kind_of(varName)
-            while segment == None:
-                #if not found, go deeper
-                cur_sym_table.getNext()
-                segment = cur_sym_table.kind_of(varName)
-            index = cur_sym_table.index_of(varName)
-
             self.output_stream.write_pop(segment, index)
 
-        self.input_stream.advance()
+        self.skip(";")
 
     def compile_while(self) -> None:
         """Compiles a while statement."""
+        if self.direct_branches:
+            self.compile_direct_while()
+            return
         in_while, out_while = self.get_while_label("IN_WHILE", "OUT_WHILE")
 
         # printing while
@@ -448,13 +562,15 @@ class CompilationEngine:
         if self.input_stream.which_token() != ";":
             self.compile_expression()
 
-        #printing ;
         self.output_stream.write_return()
 
-        self.input_stream.advance()
+        self.skip(";")
 
     def compile_if(self) -> None:
         """Compiles a if statement, possibly with a trailing else clause."""
+        if self.direct_branches:
+            self.compile_direct_if()
+            return
         if_out, else_in = self.get_if_label("IF_OUT", "ELSE_IN")
 
         #printing if
@@ -494,19 +610,294 @@ class CompilationEngine:
             self.input_stream.advance()
         self.output_stream.write_label(if_out)
 
+    def compile_block(self, emit: bool = True) -> None:
+        """Compiles a "{}"-enclosed sequence of statements.
+
+        Args:
+            emit: If False, the statements are parsed but their code dropped.
+        """
+        # skipping {
+        self.input_stream.advance()
+        if emit:
+            self.compile_statements()
+        else:
+            self.output_stream.start_capture()
+            self.compile_statements()
+            self.output_stream.end_capture()
+        # skipping }
+        self.input_stream.advance()
+
+    def compile_direct_while(self) -> None:
+        """Compiles a while statement with its test at the bottom, so that
+        each iteration takes a single conditional branch:
+
+            goto WHILE_TEST; label WHILE_BODY; body
+            label WHILE_TEST; condition; if-goto WHILE_BODY
+
+        `if-goto` branches on any non-zero value, while the usual
+        `not; if-goto` exit test only stays in the loop for -1. The layouts
+        only agree for boolean conditions, so others keep the usual one.
+        A constant condition leaves an endless loop, or no code at all.
+        """
+        body, test, out = self.get_while_label("WHILE_BODY", "WHILE_TEST", "WHILE_OUT")
+
+        # skipping while (
+        self.input_stream.advance()
+        self.input_stream.advance()
+
+        self.output_stream.start_capture()
+        value, negated = self.compile_condition()
+        condition = self.output_stream.end_capture()
+        boolean = self.boolean
+
+        # skipping )
+        self.input_stream.advance()
+
+        if value is not None:
+            if value == ConstantFolder.TRUE:
+                self.output_stream.write_label(body)
+                self.compile_block()
+                self.output_stream.write_goto(body)
+            else:
+                self.compile_block(emit=False)
+        elif boolean:
+            self.output_stream.write_goto(test)
+            self.output_stream.write_label(body)
+            self.compile_block()
+            self.output_stream.write_label(test)
+            self.output_stream.write_capture(condition)
+            if negated:
+                self.output_stream.write_arithmetic("not")
+            self.output_stream.write_if(body)
+        else:
+            self.output_stream.write_label(body)
+            self.output_stream.write_capture(condition)
+            if not negated:
+                self.output_stream.write_arithmetic("not")
+            self.output_stream.write_if(out)
+            self.compile_block()
+            self.output_stream.write_goto(body)
+            self.output_stream.write_label(out)
+
+    def compile_direct_if(self) -> None:
+        """Compiles an if statement with as few branches as possible:
+        - without an else clause, there is no jump over it;
+        - `if (~e)` branches on e itself, with no `not`;
+        - with an else clause and a boolean condition, the else clause comes
+          first, so the condition branches to the then clause with no `not`;
+        - a constant condition keeps only the clause that runs.
+        """
+        if_then, if_else, if_out = self.get_if_label("IF_THEN", "IF_ELSE", "IF_OUT")
+
+        # skipping if (
+        self.input_stream.advance()
+        self.input_stream.advance()
+
+        value, negated = self.compile_condition()
+        boolean = self.boolean
+
+        # skipping )
+        self.input_stream.advance()
+
+        if value is not None:
+            # like `not; if-goto`, only -1 selects the then clause
+            self.compile_block(emit=value == ConstantFolder.TRUE)
+            if self.input_stream.which_token() == "else":
+                self.input_stream.advance()
+                self.compile_block(emit=value != ConstantFolder.TRUE)
+            return
+
+        self.output_stream.start_capture()
+        self.compile_block()
+        then_code = self.output_stream.end_capture()
+        has_else = self.input_stream.which_token() == "else"
+        if has_else:
+            # skipping else
+            self.input_stream.advance()
+
+        if has_else and boolean and not negated:
+            self.output_stream.write_if(if_then)
+            self.compile_block()
+            self.output_stream.write_goto(if_out)
+            self.output_stream.write_label(if_then)
+            self.output_stream.write_capture(then_code)
+        else:
+            # `not c` is non-zero unless c is -1; for `~e` that is `e` itself.
+            if not negated:
+                self.output_stream.write_arithmetic("not")
+            self.output_stream.write_if(if_else if has_else else if_out)
+            self.output_stream.write_capture(then_code)
+            if has_else:
+                self.output_stream.write_goto(if_out)
+                self.output_stream.write_label(if_else)
+                self.compile_block()
+        self.output_stream.write_label(if_out)
+
+    def compile_condition(self) -> tuple[typing.Optional[int], bool]:
+        """Compiles the condition of an if or while statement. A condition
+        of the form `~term` leaves just the term on the stack.
+
+        Returns:
+            (value, negated): the value of a constant condition, for which no
+            code was emitted (otherwise None), and whether the stack holds
+            the term of a `~term` condition rather than the condition itself.
+        """
+        if self.input_stream.which_token() != "~":
+            return self.compile_expression_value(), False
+        self.input_stream.advance()
+        value = self.compile_term()
+        if value is not None:
+            value = ConstantFolder.fold_unary("~", value)
+        elif self.input_stream.which_token() == ")":
+            return None, True
+        else:
+            # the ~ only applies to the first operand
+            self.output_stream.write_arithmetic("not")
+            # the stack holds ~term now, not what pushing the term gives
+            self.operand = None
+        return self.compile_operations(value), False
+
     def compile_expression(self) -> None:
         """Compiles an expression."""
+        value = self.compile_expression_value()
+        if value is not None:
+            self.write_constant(value)
+
+    def compile_expression_value(self) -> typing.Optional[int]:
+        """Compiles an expression, folding it if all its operands are constant.
 
-        self.compile_term()
+        Returns:
+            The value of a constant expression, for which no code was emitted
+            yet, or None if the code of the expression was emitted.
+        """
+        return self.compile_operations(self.compile_term())
+
+    def compile_operations(self, value: typing.Optional[int]) -> typing.Optional[int]:
+        """Compiles the rest of an expression after its first term: any
+        number of (op term) pairs.
+
+        Args:
+            value: The value of a constant first term, or None if its code
+                was emitted.
+
+        Returns:
+            As `compile_expression_value`.
+        """
+        boolean = self.boolean
         op = self.input_stream.which_token()
         while op in op_list:
             self.input_stream.advance()
-            self.compile_term()
-            self.output_stream.write_arithmetic(self.input_stream.get_arit(op))
+            if value is None:
+                left = self.operand
+                self.write_operation(op, self.compile_right_term(op), left)
+            elif op == "*" and self.strength_reducer is not None \
+                    and self.strength_reducer.reduce(op, value) is not None:
+                # c * x: apply the constant to the right operand instead.
+                right = self.compile_term()
+                if right is None:
+                    self.write_sequence(op, self.strength_reducer.reduce(
+                        op, value, self.operand))
+                value = None if right is None else self.combine(op, value, right)
+            else:
+                # Hold the left operand back until the right one is known.
+                self.pending_constants.append(value)
+                right = self.compile_term()
+                if right is None:
+                    # The right operand emitted the held-back left one first.
+                    self.output_stream.write_arithmetic(self.input_stream.get_arit(op))
+                    value = None
+                else:
+                    value = self.combine(op, self.pending_constants.pop(), right)
+            boolean = op in comparison_ops or (op in "&|" and boolean and self.boolean)
+            self.operand = None
             op = self.input_stream.which_token()
+        self.boolean = boolean
+        return value
+
+    def compile_right_term(self, op: str) -> typing.Optional[int]:
+        """Compiles the right operand of an operation whose left operand is
+        on the stack.
+
+        Returns:
+            As `compile_term`. Without constant folding, strength reduction
+            still gets the value of an integer constant divisor or
+            multiplier, for which no code was emitted.
+        """
+        if not self.fold_constants and self.strength_reducer is not None \
+                and op in "*/" and self.input_stream.token_type() == "INT_CONST":
+            value = self.input_stream.which_token()
+            self.input_stream.advance()
+            self.boolean = value == 0
+            return value
+        return self.compile_term()
+
+    def combine(self, op: str, left: int, right: int) -> typing.Optional[int]:
+        """Folds or emits an operation on two constants.
 
+        Returns:
+            The folded value, or None if the operation was emitted.
+        """
+        if self.fold_constants:
+            value = ConstantFolder.fold_binary(op, left, right)
+            if value is not None:
+                return value
+        self.write_constant(left)
+        self.write_operation(op, right)
+        return None
+
+    def write_operation(self, op: str, right: typing.Optional[int],
+                        left: tuple = None) -> None:
+        """Emits a binary operation whose left operand is on the stack.
+
+        Args:
+            op: The operator.
+            right: The value of a constant right operand, not emitted yet,
+                or None if the right operand is on the stack too.
+            left: The push of the left operand, if it can be repeated (see
+                `self.operand`).
+        """
+        if right is not None:
+            if self.strength_reducer is not None:
+                sequence = self.strength_reducer.reduce(op, right, left)
+                if sequence is not None:
+                    self.write_sequence(op, sequence)
+                    return
+            self.write_constant(right)
+        self.output_stream.write_arithmetic(self.input_stream.get_arit(op))
+
+    def write_sequence(self, op: str, sequence: list[tuple]) -> None:
+        """Emits the strength-reduced replacement of an operation."""
+        self.strength_reducer.record(op)
+        for command in sequence:
+            if command[0] == "push":
+                self.output_stream.write_push(command[1], command[2])
+            elif command[0] == "pop":
+                self.output_stream.write_pop(command[1], command[2])
+            else:
+                self.output_stream.write_arithmetic(command[0])
+
+    def flush_constants(self) -> None:
+        """Emit the constants held back by enclosing expressions, before the
+        code of a non-constant term."""
+        if self.pending_constants:
+            for value in self.pending_constants:
+                self.emit_constant(value)
+            self.pending_constants.clear()
+
+    def write_constant(self, value: int) -> None:
+        """Emit a constant, after any held-back ones."""
+        self.flush_constants()
+        self.emit_constant(value)
+
+    def emit_constant(self, value: int) -> None:
+        """Push a 16-bit value; `push constant` only takes 0..32767."""
+        if value >= 0:
+            self.output_stream.write_push("const", value)
+        else:
+            self.output_stream.write_push("const", ~value)
+            self.output_stream.write_arithmetic("not")
 
-    def compile_term(self) -> None:
+    def compile_term(self) -> typing.Optional[int]:
         """Compiles a term.
         This routine is faced with a slight difficulty when
         trying to decide between some of the alternative parsing rules.
@@ -515,21 +906,36 @@ class CompilationEngine:
         A single look-ahead token, which may be one of "[", "(", or "." suffices
         to distinguish between the three possibilities. Any other token is not
         part of this term and should not be advanced over.
+
+        Returns:
+            When folding constants, the value of a constant term, for which
+            no code was emitted; otherwise None.
         """
-        if self.input_stream.token_type() == "INT_CONST":
-            self.output_stream.write_push("const", self.input_stream.which_token())
+        token_type = self.input_stream.token_type()
+        token = self.input_stream.which_token()
+        # only set once the term is done: its subexpressions set it too
+        self.operand = operand = None
+        if self.fold_constants and (token_type == "INT_CONST" or (
+                token_type == "KEYWORD" and token in keyword_values)):
             self.input_stream.advance()
-        elif self.input_stream.token_type() == "STRING_CONST":
-            token = self.input_stream.which_token()
-            lenS = len(token)
-            self.output_stream.write_push("const", lenS)
-            self.output_stream.write_call("String.new", 1)
-            for i in range (lenS):
-                self.output_stream.write_push("const", ord(token[i]))
-                self.output_stream.write_call("String.appendChar", 2)
+            value = keyword_values.get(token, token)
+            self.boolean = value == ConstantFolder.TRUE or value == ConstantFolder.FALSE
+            return value
+        elif token_type == "INT_CONST":
+            self.output_stream.write_push("const", token)
+            self.input_stream.advance()
+            self.boolean = token == 0
+            operand = ("push", "const", token)
+        elif token_type == "STRING_CONST":
+            self.flush_constants()
+            if self.string_pool is not None:
+                self.output_stream.write_call(self.string_pool.accessor(token), 0)
+            else:
+                self.output_stream.write_string(token)
             self.input_stream.advance()
-        elif self.input_stream.which_token() in keyword_const:
-            token = self.input_stream.which_token()
+            self.boolean = False
+        elif token in keyword_const:
+            self.flush_constants()
             if token == "true":
                 self.output_stream.write_push("const", 0)
                 self.output_stream.write_arithmetic("not")
@@ -538,21 +944,16 @@ class CompilationEngine:
             else:
                 self.output_stream.write_push("const", 0)
             self.input_stream.advance()
-        elif self.input_stream.token_type() == "IDENTIFIER":
-            token = self.input_stream.which_token()
-            segment = self.symTable.kind_of(token)
-
-            if segment != None:
-                index = self.symTable.index_of(token)
-            else:
-                # search x withing current scope
-                cur_sym_table = copy.deepcopy(self.symTable)
-                segment = cur_sym_table.kind_of(token)
-                while segment == None:
-                # #if not found, go deeper
-                    cur_sym_table.getNext()
-                    segment = cur_sym_table.kind_of(token)
-                index = cur_sym_table.index_of(token)
+            self.boolean = token != "this"
+        elif token_type == "IDENTIFIER":
+            self.flush_constants()
+            # search x within the current scope, then the enclosing ones
+            entry, _ = self.symTable.resolve(token)
+            if entry is None and self.input_stream.peek() not in (".", "("):
+                raise self.error(UndeclaredIdentifier,
+                                 f"undeclared identifier {token!r}")
+            segment = entry.kind if entry is not None else None
+            index = entry.index if entry is not None else None
 
             self.input_stream.advance()
 
@@ -564,33 +965,39 @@ class CompilationEngine:
                 self.output_stream.write_arithmetic("add")
                 self.output_stream.write_pop("pointer", 1)
                 self.output_stream.write_push("that", 0)
-                # printing ]
-                self.input_stream.advance()
+                self.skip("]")
             elif self.input_stream.which_token() == ".":
                 self.compile_subroutineCall(token)
-                self.input_stream.advance()
+                self.skip(")")
             elif self.input_stream.which_token() == "(":
                 self.input_stream.advance()
                 count_args = self.compile_expression_list()
                 self.output_stream.write_push("arg", 0)
                 self.output_stream.write_call(token, count_args + 1)
-                self.input_stream.advance()
+                self.skip(")")
             else:
                 self.output_stream.write_push(segment, index)
+                operand = ("push", segment, index)
+            self.boolean = False
 
-
-        elif self.input_stream.which_token() == "(":
+        elif token == "(":
             self.input_stream.advance()
-            self.compile_expression()
+            value = self.compile_expression_value()
+            self.skip(")")
+            return value
 
-            #printing )
+        elif token == "-" or token == "~":
             self.input_stream.advance()
-
-        elif self.input_stream.which_token() == "-" or self.input_stream.which_token() == "~":
-            op = self.input_stream.which_token()
-            self.input_stream.advance()
-            self.compile_term()
-            self.output_stream.write_arithmetic(self.input_stream.get_arit_unary(op))
+            value = self.compile_term()
+            # ~ keeps a boolean a boolean, - does not
+            self.boolean = self.boolean and token == "~"
+            if value is not None:
+                return ConstantFolder.fold_unary(token, value)
+            self.output_stream.write_arithmetic(self.input_stream.get_arit_unary(token))
+        else:
+            raise self.unexpected("a term")
+        self.operand = operand
+        return None
 
     def compile_expression_list(self) -> None:
         """Compiles a (possibly empty) comma-separated list of expressions."""
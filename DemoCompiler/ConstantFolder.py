@@ -0,0 +1,69 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Compile-time evaluation of constant Jack expressions.
+
+Values are Jack `int`s: 16-bit two's complement, so every result wraps
+around to [-32768, 32767]. Comparisons yield `true` (-1) or `false` (0),
+and division truncates towards zero like `Math.divide`.
+"""
+
+import typing
+
+TRUE = -1
+FALSE = 0
+
+
+def to_int16(value: int) -> int:
+    """Wrap an integer to a 16-bit two's complement value."""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def fold_binary(op: str, left: int, right: int) -> typing.Optional[int]:
+    """Evaluate `left op right`.
+
+    Args:
+        op: One of `+ - * / & | < > =`.
+        left: The left operand.
+        right: The right operand.
+
+    Returns:
+        The result, or None when it must be left to run time: division by
+        zero (a run-time error), or division involving -32768, whose result
+        depends on the `Math` implementation.
+    """
+    if op == "+":
+        return to_int16(left + right)
+    elif op == "-":
+        return to_int16(left - right)
+    elif op == "*":
+        return to_int16(left * right)
+    elif op == "/":
+        if right == 0 or left == -32768 or right == -32768:
+            return None
+        quotient = abs(left) // abs(right)
+        return quotient if (left < 0) == (right < 0) else -quotient
+    elif op == "&":
+        return left & right
+    elif op == "|":
+        return left | right
+    elif op == "<":
+        return TRUE if left < right else FALSE
+    elif op == ">":
+        return TRUE if left > right else FALSE
+    elif op == "=":
+        return TRUE if left == right else FALSE
+    return None
+
+
+def fold_unary(op: str, value: int) -> int:
+    """Evaluate `op value` for the unary operators `-` and `~`."""
+    if op == "-":
+        return to_int16(-value)
+    return ~value
@@ -0,0 +1,122 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Structured diagnostics of the in-memory compile API.
+
+`JackCompiler.compile_source` and `JackCompiler.compile_many` report what
+they find as `Diagnostic` objects rather than text, and raise a
+`CompileError` holding them when a class does not compile.
+
+The compiler reports errors in a source as a `SourceError`, which knows
+where in the source it is.
+"""
+
+import typing
+
+ERROR = "error"
+WARNING = "warning"
+
+# Diagnostic kinds other than errors, which are named after the exception.
+CLASS_NAME = "class-name"
+UNDEFINED_MEMBER = "undefined-member"
+UNUSED_LOCAL = "unused-local"
+
+
+class SourceError(ValueError):
+    """An error in a Jack source, at a line and column when they are known."""
+
+    def __init__(self, message: str, line: int = None,
+                 column: int = None) -> None:
+        """
+        Args:
+            message: A one-line description, without the position.
+            line, column: Where the error is, both counted from 1.
+        """
+        super().__init__(message if line is None
+                         else f"line {line}, column {column}: {message}")
+        self.message = message
+        self.line = line
+        self.column = column
+
+
+class UnexpectedToken(SourceError):
+    """A token, or the end of the source, where the grammar has no place
+    for it."""
+
+
+class UndeclaredIdentifier(SourceError):
+    """A variable that no scope declares."""
+
+
+class Diagnostic:
+    """One problem found in one source."""
+    __slots__ = ("path", "severity", "kind", "message", "line", "column")
+
+    def __init__(self, path: str, severity: str, kind: str,
+                 message: str, line: int = None, column: int = None) -> None:
+        """
+        Args:
+            path: The source's name in the batch, or its path.
+            severity: ERROR (the source did not compile) or WARNING.
+            kind: What was found: the exception type of an error, or one of
+                CLASS_NAME, UNDEFINED_MEMBER and UNUSED_LOCAL.
+            message: A one-line description.
+            line, column: Where in the source, if known.
+        """
+        self.path = path
+        self.severity = severity
+        self.kind = kind
+        self.message = message
+        self.line = line
+        self.column = column
+
+    @classmethod
+    def from_exception(cls, path: str, error: Exception) -> "Diagnostic":
+        """Return the error diagnostic of a source that raised `error`."""
+        if isinstance(error, SourceError):
+            return cls(path, ERROR, type(error).__name__, error.message,
+                       error.line, error.column)
+        return cls(path, ERROR, type(error).__name__, str(error))
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        """Return the diagnostic as a JSON-ready dict."""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self) -> str:
+        return (f"Diagnostic({self.path!r}, {self.severity!r}, "
+                f"{self.kind!r}, {self.message!r}, {self.line!r}, "
+                f"{self.column!r})")
+
+    def __str__(self) -> str:
+        if self.line is None:
+            return f"{self.path}: {self.severity}: {self.message}"
+        return (f"{self.path}:{self.line}:{self.column}: {self.severity}: "
+                f"{self.message}")
+
+
+class CompileError(Exception):
+    """Raised when sources held in memory do not all compile."""
+
+    def __init__(self, diagnostics: list[Diagnostic],
+                 outputs: dict[str, str] = None) -> None:
+        """
+        Args:
+            diagnostics: Every diagnostic of the compilation, warnings
+                included.
+            outputs: The VM code of the sources that did compile, by name.
+        """
+        errors = [str(diagnostic) for diagnostic in diagnostics
+                  if diagnostic.severity == ERROR]
+        super().__init__("; ".join(errors))
+        self.diagnostics = diagnostics
+        self.outputs = outputs or {}
+
+    def errors(self) -> list[Diagnostic]:
+        """Return the error diagnostics."""
+        return [diagnostic for diagnostic in self.diagnostics
+                if diagnostic.severity == ERROR]
@@ -0,0 +1,367 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Hack assembly backend.
+
+Translates the VM code of a whole program straight from the in-memory
+instruction lists (`VMCode`) into one Hack assembly file, with no `.vm`
+text in between. The output is much smaller than a per-command
+translation:
+- `call`, `return`, `eq`, `gt` and `lt` jump to shared routines emitted
+  once ($$CALL, $$RETURN, $$EQ, ...) instead of being expanded in place.
+- Runs of commands are fused through the D register: a value is computed
+  into D (`push x; push y; add` -> D = x + y) and handed to its consumer
+  (`pop`, `if-goto`, an operator, a comparison) without touching the
+  stack. An array read `...; pop pointer 1; push that 0` stays in
+  registers, and `eq` followed by `if-goto` is a single jump.
+
+Comparisons are exact for all 16-bit operands; the shared routines do not
+compute x - y when it could overflow.
+
+The program starts at `Sys.init`, or at `Main.main` when the program has
+no `Sys` class (no OS code). Calls to functions that are not part of the
+program are reported by `HackWriter.undefined()`.
+"""
+
+import typing
+import VMCode
+from VMCode import (PUSH, POP, ADD, SUB, NEG, EQ, GT, LT, AND, OR, NOT,
+                    LABEL, GOTO, IF_GOTO, CALL, RETURN, CONSTANT, ARGUMENT,
+                    LOCAL, STATIC, THIS, THAT, POINTER, TEMP, Instruction)
+
+ASM_SUFFIX = ".asm"
+
+STACK_START = 256
+TEMP_BASE = 5
+BASES = {LOCAL: "LCL", ARGUMENT: "ARG", THIS: "THIS", THAT: "THAT"}
+# Slots up to this index are addressed by incrementing A, which keeps D.
+NEAR_INDEX = 3
+
+# x op y, with x in M (the stack) and y in D.
+STACK_OPS = {ADD: "M=D+M", SUB: "M=M-D", AND: "M=D&M", OR: "M=D|M"}
+# x op y, with x in D and y in A or M.
+D_OPS = {ADD: "D=D+{}", SUB: "D=D-{}", AND: "D=D&{}", OR: "D=D|{}"}
+UNARY_OPS = {NEG: "-", NOT: "!"}
+COMPARISONS = {EQ: "$$EQ", GT: "$$GT", LT: "$$LT"}
+
+PUSH_D = ["@SP", "AM=M+1", "A=A-1", "M=D"]
+POP_D = ["@SP", "AM=M-1", "D=M"]
+
+
+def _routines() -> list[str]:
+    """Return the shared call, return and comparison routines."""
+    lines = ["($$CALL)"]
+    # D = return address, R13 = number of arguments + 5, R15 = the function
+    lines += PUSH_D
+    for base in ("LCL", "ARG", "THIS", "THAT"):
+        lines += [f"@{base}", "D=M"] + PUSH_D
+    # A is the new SP - 1
+    lines += ["D=A+1", "@LCL", "M=D", "@R13", "D=D-M", "@ARG", "M=D",
+              "@R15", "A=M", "0;JMP"]
+
+    lines += ["($$RETURN)",
+              # the return address, before the return value overwrites it
+              "@5", "D=A", "@LCL", "A=M-D", "D=M", "@R14", "M=D"]
+    lines += POP_D + ["@ARG", "A=M", "M=D", "D=A+1", "@SP", "M=D"]
+    for base in ("THAT", "THIS", "ARG"):
+        lines += ["@LCL", "AM=M-1", "D=M", f"@{base}", "M=D"]
+    lines += ["@LCL", "A=M-1", "D=M", "@LCL", "M=D", "@R14", "A=M", "0;JMP"]
+
+    # D = return address, R13 = y, x on the stack top; the result replaces
+    # x and is left in D.
+    lines += ["($$EQ)", "@R15", "M=D", "@R13", "D=M", "@SP", "A=M-1",
+              "D=M-D", "@$$TRUE", "D;JEQ", "@$$FALSE", "0;JMP"]
+    for name, jump, x_negative in (("GT", "JGT", "$$FALSE"),
+                                   ("LT", "JLT", "$$TRUE")):
+        x_positive = "$$TRUE" if x_negative == "$$FALSE" else "$$FALSE"
+        lines += [f"($${name})", "@R15", "M=D", "@SP", "A=M-1", "D=M",
+                  f"@$${name}_NEGATIVE", "D;JLT",
+                  # x >= 0: if y < 0, x is the greater
+                  "@R13", "D=M", f"@{x_positive}", "D;JLT",
+                  f"@$${name}_SUBTRACT", "0;JMP",
+                  f"($${name}_NEGATIVE)",
+                  # x < 0: if y >= 0, y is the greater
+                  "@R13", "D=M", f"@{x_negative}", "D;JGE",
+                  # same signs: x - y cannot overflow
+                  f"($${name}_SUBTRACT)",
+                  "@R13", "D=M", "@SP", "A=M-1", "D=M-D", "@$$TRUE",
+                  f"D;{jump}", "@$$FALSE", "0;JMP"]
+    for name, value in (("$$TRUE", "-1"), ("$$FALSE", "0")):
+        lines += [f"({name})", "@SP", "A=M-1", f"M={value}", f"D={value}",
+                  "@R15", "A=M", "0;JMP"]
+    return lines
+
+
+class HackWriter:
+    """Translates the VM code of a program into Hack assembly."""
+
+    def __init__(self) -> None:
+        self.lines: list[str] = []
+        self.defined: set[str] = set()
+        self.called: set[str] = set()
+        self.calls = 0
+        # the function being translated, and the file of its statics
+        self.function = ""
+        self.file_name = ""
+
+    def write_bootstrap(self, entry: str) -> None:
+        """Write the code that sets up the stack and calls the entry point,
+        followed by the shared routines."""
+        self.lines += [f"@{STACK_START}", "D=A", "@SP", "M=D"]
+        self.write_call(entry, 0)
+        self.lines += ["($$HALT)", "@$$HALT", "0;JMP"]
+        self.lines += _routines()
+
+    def write_code(self, code: VMCode.VMCode, file_name: str) -> None:
+        """Translate the code of one class.
+
+        Args:
+            code: The code.
+            file_name: The name of its `.vm` file, which names its statics.
+        """
+        self.file_name = file_name
+        for function in code.functions:
+            self.function = code.function_name(function)
+            self.defined.add(self.function)
+            self.lines.append(f"({self.function})")
+            self.write_locals(function.n_locals)
+            self.write_body(code, function.instructions())
+
+    def undefined(self) -> list[str]:
+        """Return the functions called but not translated, e.g. of the OS."""
+        return sorted(self.called - self.defined)
+
+    def instruction_count(self) -> int:
+        """Return the number of instructions written (labels excluded)."""
+        return sum(1 for line in self.lines if not line.startswith("("))
+
+    def text(self) -> str:
+        """Return the assembly written so far."""
+        return "\n".join(self.lines) + "\n"
+
+    def write_locals(self, n_locals: int) -> None:
+        """Push the zeroed local variables of a function."""
+        if n_locals == 1:
+            self.lines += ["@SP", "AM=M+1", "A=A-1", "M=0"]
+        elif n_locals > 1:
+            self.lines += ["@SP", "A=M", "M=0"]
+            self.lines += ["A=A+1", "M=0"] * (n_locals - 1)
+            self.lines += ["D=A+1", "@SP", "M=D"]
+
+    def write_call(self, callee: str, n_args: int) -> None:
+        """Call a function through the shared $$CALL routine."""
+        self.called.add(callee)
+        self.calls += 1
+        label = f"{self.function or '$$BOOT'}$ret.{self.calls}"
+        self.lines += [f"@{n_args + 5}", "D=A", "@R13", "M=D"]
+        self.lines += [f"@{callee}", "D=A", "@R15", "M=D",
+                       f"@{label}", "D=A", "@$$CALL", "0;JMP", f"({label})"]
+
+    def write_compare(self, opcode: int) -> None:
+        """Compare the stack top with D, through a shared routine."""
+        self.calls += 1
+        label = f"{self.function}$ret.{self.calls}"
+        self.lines += ["@R13", "M=D", f"@{label}", "D=A",
+                       f"@{COMPARISONS[opcode]}", "0;JMP", f"({label})"]
+
+    def label(self, code: VMCode.VMCode, operand: int) -> str:
+        """Return the assembly name of a VM label of the current function."""
+        return f"{self.function}${code.names[operand]}"
+
+    def address(self, segment: int, index: int) -> typing.Optional[list[str]]:
+        """Return instructions that point A at a slot and keep D, or None
+        if the slot is too far from its base for that."""
+        if segment == STATIC:
+            return [f"@{self.file_name}.{index}"]
+        if segment == TEMP:
+            return [f"@R{TEMP_BASE + index}"]
+        if segment == POINTER:
+            return ["@THAT" if index else "@THIS"]
+        if index > NEAR_INDEX:
+            return None
+        base = [f"@{BASES[segment]}"]
+        if index == 0:
+            return base + ["A=M"]
+        return base + ["A=M+1"] + ["A=A+1"] * (index - 1)
+
+    def load(self, segment: int, index: int) -> list[str]:
+        """Return instructions that set D to the value of a slot."""
+        if segment == CONSTANT:
+            return [f"@{index}", "D=A"]
+        address = self.address(segment, index)
+        if address is None:
+            return [f"@{index}", "D=A", f"@{BASES[segment]}", "A=D+M", "D=M"]
+        return address + ["D=M"]
+
+    def operand(self, segment: int, index: int) -> typing.Optional[tuple[list[str], str]]:
+        """Return instructions that make a slot the A or M operand without
+        touching D, and that operand, or None if they would need D."""
+        if segment == CONSTANT:
+            return [f"@{index}"], "A"
+        address = self.address(segment, index)
+        return None if address is None else (address, "M")
+
+    def produce(self, body: list[Instruction], i: int) -> tuple[list[str], int]:
+        """Return instructions computing the value pushed by the commands at
+        body[i] into D instead, and the number of commands they replace;
+        ([], 0) when body[i] pushes nothing."""
+        opcode, segment, index = body[i]
+        if opcode != PUSH:
+            return [], 0
+        if i + 2 < len(body) and body[i + 1][0] == PUSH \
+                and body[i + 2][0] in D_OPS:
+            _, right_segment, right_index = body[i + 1]
+            operation = body[i + 2][0]
+            operand = self.operand(right_segment, right_index)
+            if operand is not None:
+                lines = self.load(segment, index)
+                if right_segment == CONSTANT and right_index <= 1 \
+                        and operation in (ADD, SUB):
+                    if right_index:
+                        lines.append("D=D+1" if operation == ADD else "D=D-1")
+                    return lines, 3
+                instructions, register = operand
+                return (lines + instructions
+                        + [D_OPS[operation].format(register)]), 3
+        return self.load(segment, index), 1
+
+    def consume(self, code: VMCode.VMCode, body: list[Instruction],
+                i: int) -> int:
+        """Hand the value in D to the command(s) at body[i], or push it.
+
+        Returns:
+            The number of commands translated.
+        """
+        opcode, segment, index = body[i] if i < len(body) else (None, 0, 0)
+        following = body[i + 1][0] if i + 1 < len(body) else None
+        if opcode == NOT and following == IF_GOTO:
+            # !D != 0 exactly when D != -1
+            self.lines += ["D=D+1", f"@{self.label(code, body[i + 1][2])}",
+                           "D;JNE"]
+            return 2
+        if opcode == IF_GOTO:
+            self.lines += [f"@{self.label(code, index)}", "D;JNE"]
+            return 1
+        if opcode == POP:
+            address = self.address(segment, index)
+            if address is not None:
+                self.lines += address + ["M=D"]
+                return 1
+        if opcode in STACK_OPS:
+            self.lines += ["@SP", "A=M-1", STACK_OPS[opcode]]
+            return 1
+        branch = following == IF_GOTO or (
+            following == NOT and i + 2 < len(body)
+            and body[i + 2][0] == IF_GOTO)
+        if opcode == EQ and branch:
+            # x - y cannot overflow into 0, so no routine is needed
+            negated = following == NOT
+            label = self.label(code, body[i + 1 + negated][2])
+            self.lines += ["@SP", "AM=M-1", "D=M-D", f"@{label}",
+                           "D;JNE" if negated else "D;JEQ"]
+            return 2 + negated
+        if opcode in COMPARISONS:
+            self.write_compare(opcode)
+            # the result is in D as well, and is 0 or -1
+            if branch:
+                negated = following == NOT
+                label = self.label(code, body[i + 1 + negated][2])
+                self.lines += ["@SP", "M=M-1", f"@{label}",
+                               "D;JEQ" if negated else "D;JNE"]
+                return 2 + negated
+            return 1
+        self.lines += PUSH_D
+        return 0
+
+    def write_body(self, code: VMCode.VMCode, body: list[Instruction]) -> None:
+        """Translate the commands of one function."""
+        i = 0
+        while i < len(body):
+            lines, produced = self.produce(body, i)
+            if not produced:
+                self.write_command(code, body[i])
+                i += 1
+                continue
+            start = len(self.lines)
+            self.lines += lines
+            i += produced
+            transformed = False
+            while i < len(body):
+                opcode, segment, index = body[i]
+                if opcode in UNARY_OPS and not (
+                        opcode == NOT and i + 1 < len(body)
+                        and body[i + 1][0] == IF_GOTO):
+                    self.lines.append(f"D={UNARY_OPS[opcode]}D")
+                elif body[i] == (POP, POINTER, 1) and i + 1 < len(body) \
+                        and body[i + 1] == (PUSH, THAT, 0):
+                    # array read: keep the address, then the element, in D
+                    self.lines += ["@THAT", "M=D", "A=D", "D=M"]
+                    i += 1
+                else:
+                    break
+                i += 1
+                transformed = True
+            consumed = self.consume(code, body, i)
+            if not consumed and not transformed and produced == 1:
+                # a plain push is as short, or shorter for constants 0 / 1
+                del self.lines[start:]
+                self.write_command(code, body[i - 1])
+            i += consumed
+
+    def write_command(self, code: VMCode.VMCode, instruction: Instruction) -> None:
+        """Translate one command on its own."""
+        opcode, arg, operand = instruction
+        if opcode == PUSH:
+            if arg == CONSTANT and operand <= 1:
+                self.lines += ["@SP", "AM=M+1", "A=A-1", f"M={operand}"]
+            else:
+                self.lines += self.load(arg, operand) + PUSH_D
+        elif opcode == POP:
+            address = self.address(arg, operand)
+            if address is not None:
+                self.lines += POP_D + address + ["M=D"]
+            else:
+                self.lines += [f"@{operand}", "D=A", f"@{BASES[arg]}",
+                               "D=D+M", "@R13", "M=D"] + POP_D \
+                              + ["@R13", "A=M", "M=D"]
+        elif opcode in STACK_OPS:
+            self.lines += POP_D + ["A=A-1", STACK_OPS[opcode]]
+        elif opcode in UNARY_OPS:
+            self.lines += ["@SP", "A=M-1", f"M={UNARY_OPS[opcode]}M"]
+        elif opcode in COMPARISONS:
+            self.lines += POP_D
+            self.write_compare(opcode)
+        elif opcode == LABEL:
+            self.lines.append(f"({self.label(code, operand)})")
+        elif opcode == GOTO:
+            self.lines += [f"@{self.label(code, operand)}", "0;JMP"]
+        elif opcode == IF_GOTO:
+            self.lines += POP_D + [f"@{self.label(code, operand)}", "D;JNE"]
+        elif opcode == CALL:
+            self.write_call(code.names[operand], arg)
+        elif opcode == RETURN:
+            self.lines += ["@$$RETURN", "0;JMP"]
+
+
+def translate(codes: dict[str, VMCode.VMCode]) -> HackWriter:
+    """Translate a whole program.
+
+    Args:
+        codes: The code of each class, by `.vm` file name (the class name).
+
+    Returns:
+        The writer, holding the assembly.
+    """
+    writer = HackWriter()
+    defined = {code.function_name(function) for code in codes.values()
+               for function in code.functions}
+    writer.write_bootstrap("Sys.init" if "Sys.init" in defined
+                           else "Main.main")
+    for file_name, code in codes.items():
+        writer.write_code(code, file_name)
+    return writer
@@ -0,0 +1,239 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Whole-program inlining of small leaf subroutines.
+
+A subroutine can be inlined when it calls nothing, is at most `threshold`
+instructions long, and keeps the VM stack balanced. Getters such as
+
+    function Point.getX 0
+    push argument 0
+    pop pointer 0
+    push this 0
+    return
+
+qualify. At each `call` of such a subroutine, the arguments are popped
+into `temp 2` and up (temp 0 and 1 are the compiler's scratch slots), the
+receiver of a method into `pointer 1`, and the body follows with:
+- `argument i` -> its temp slot (the receiver -> `pointer 1`),
+- `local i` -> a temp slot after the arguments, zeroed first,
+- `this i` -> `that i`, `pointer 0` -> `pointer 1`,
+- labels renamed apart, and `return` -> a jump to the end of the body.
+A getter call thus becomes `pop pointer 1; push that 0`.
+
+This is sound because the compiler never keeps a value in `pointer 1` /
+`that` or in temp slots across a call, and an inlined body calls nothing.
+Bodies that use `that` themselves are not inlined, nor bodies using
+`static` into another class, whose statics they are not.
+"""
+
+import typing
+import VMCode
+from VMCode import (PUSH, POP, ADD, SUB, EQ, GT, LT, AND, OR, LABEL, GOTO,
+                    IF_GOTO, CALL, RETURN, ARGUMENT, LOCAL, STATIC, THIS,
+                    THAT, POINTER, TEMP, Instruction)
+
+DEFAULT_THRESHOLD = 8
+# temp 0 and 1 are scratch slots of the compiler; inlined code gets the rest.
+FIRST_TEMP = 2
+TEMP_SLOTS = 6
+
+BINARY = (ADD, SUB, EQ, GT, LT, AND, OR)
+
+
+class Inlinee:
+    """The body of a subroutine that calls can be replaced with."""
+    __slots__ = ("name", "method", "n_args", "n_locals", "body", "static")
+
+    def __init__(self, name: str, method: bool, n_args: int, n_locals: int,
+                 body: list[tuple[int, int, typing.Any]], static: bool) -> None:
+        """
+        Args:
+            name: The subroutine's name, e.g. "Point.getX".
+            method: Whether it is a method; its prologue is not in the body.
+            n_args: The number of arguments it reads, receiver included.
+            n_locals: The number of its local variables.
+            body: Its instructions, with label names instead of label ids.
+            static: Whether it uses its class's statics.
+        """
+        self.name = name
+        self.method = method
+        self.n_args = n_args
+        self.n_locals = n_locals
+        self.body = body
+        self.static = static
+
+
+def _balanced(body: list[tuple[int, int, typing.Any]]) -> bool:
+    """Return True if the stack has the same depth on every path to a label
+    and holds exactly the return value at every return."""
+    depth = 0
+    labels: dict[typing.Any, int] = {}
+    reachable = True
+    for opcode, arg, operand in body:
+        if opcode == LABEL:
+            if reachable and labels.setdefault(operand, depth) != depth:
+                return False
+            depth = labels.setdefault(operand, depth)
+            reachable = True
+            continue
+        if not reachable:
+            continue
+        if opcode == PUSH:
+            depth += 1
+        elif opcode == POP or opcode in BINARY or opcode == IF_GOTO:
+            depth -= 1
+        if depth < 0:
+            return False
+        if opcode == GOTO or opcode == IF_GOTO:
+            if labels.setdefault(operand, depth) != depth:
+                return False
+        if opcode == RETURN:
+            if depth != 1:
+                return False
+            depth = 0
+        reachable = opcode != GOTO and opcode != RETURN
+    return not reachable
+
+
+def candidate(code: VMCode.VMCode, function: VMCode.VMFunction,
+              threshold: int) -> typing.Optional[Inlinee]:
+    """Return the function as an `Inlinee`, or None if it cannot be inlined.
+
+    Args:
+        code: The code holding the function.
+        function: The function.
+        threshold: The longest body, in instructions, to inline.
+    """
+    instructions = function.instructions()
+    method = instructions[:2] == [(PUSH, ARGUMENT, 0), (POP, POINTER, 0)]
+    body = instructions[2:] if method else instructions
+    if len(body) > threshold:
+        return None
+    n_args = 1 if method else 0
+    static = False
+    named = []
+    for opcode, arg, operand in body:
+        if opcode == CALL:
+            return None
+        if opcode == PUSH or opcode == POP:
+            if arg == THAT or (arg == POINTER and operand == 1) \
+                    or (arg == TEMP and operand >= FIRST_TEMP):
+                return None
+            if arg == POINTER and (opcode == POP or not method):
+                return None
+            if arg == THIS and not method:
+                return None
+            if arg == ARGUMENT:
+                if method and operand == 0 and opcode == POP:
+                    return None
+                n_args = max(n_args, operand + 1)
+            static = static or arg == STATIC
+        if opcode == LABEL or opcode == GOTO or opcode == IF_GOTO:
+            operand = code.names[operand]
+        named.append((opcode, arg, operand))
+    slots = n_args - (1 if method else 0) + function.n_locals
+    if slots > TEMP_SLOTS or not _balanced(named):
+        return None
+    return Inlinee(code.function_name(function), method, n_args,
+                   function.n_locals, named, static)
+
+
+def collect(codes: typing.Iterable[VMCode.VMCode],
+            threshold: int = DEFAULT_THRESHOLD) -> dict[str, Inlinee]:
+    """Return the inlinable subroutines of a program, by name."""
+    inlinees = {}
+    for code in codes:
+        for function in code.functions:
+            inlinee = candidate(code, function, threshold)
+            if inlinee is not None:
+                inlinees[inlinee.name] = inlinee
+    return inlinees
+
+
+def _expand(code: VMCode.VMCode, inlinee: Inlinee, n_args: int,
+            site: int) -> list[Instruction]:
+    """Return the instructions that replace `call inlinee n_args`."""
+    first = 1 if inlinee.method else 0
+    # arguments are on the stack, the last one on top
+    result = [(POP, TEMP, FIRST_TEMP + i - first)
+              for i in reversed(range(first, n_args))]
+    if inlinee.method:
+        result.append((POP, POINTER, 1))
+    local_slot = FIRST_TEMP + n_args - first
+    for i in range(inlinee.n_locals):
+        result += [(PUSH, VMCode.CONSTANT, 0), (POP, TEMP, local_slot + i)]
+
+    end = code.name_id(f"INLINE_END.{site}")
+    returns = 0
+    for opcode, arg, operand in inlinee.body:
+        if opcode == PUSH or opcode == POP:
+            if arg == ARGUMENT:
+                if inlinee.method and operand == 0:
+                    arg, operand = POINTER, 1
+                else:
+                    arg, operand = TEMP, FIRST_TEMP + operand - first
+            elif arg == LOCAL:
+                arg, operand = TEMP, local_slot + operand
+            elif arg == THIS:
+                arg = THAT
+            elif arg == POINTER:
+                operand = 1
+        elif opcode == LABEL or opcode == GOTO or opcode == IF_GOTO:
+            operand = code.name_id(f"{operand}$inline.{site}")
+        elif opcode == RETURN:
+            opcode, operand = GOTO, end
+            returns += 1
+        result.append((opcode, arg, operand))
+    if result[-1] == (GOTO, 0, end):
+        result.pop()
+        returns -= 1
+    if returns:
+        result.append((LABEL, 0, end))
+    return result
+
+
+def _fits(inlinee: Inlinee, n_args: int, class_name: str) -> bool:
+    """Return True if a call with n_args arguments, from the given class,
+    can be replaced with the inlinee."""
+    slots = n_args - (1 if inlinee.method else 0) + inlinee.n_locals
+    return (inlinee.n_args <= n_args and slots <= TEMP_SLOTS
+            and (not inlinee.static
+                 or inlinee.name.split(".")[0] == class_name))
+
+
+def inline(code: VMCode.VMCode, inlinees: dict[str, Inlinee],
+           class_name: str) -> int:
+    """Replace the calls of inlinable subroutines in the code.
+
+    Args:
+        code: The code of one class.
+        inlinees: The inlinable subroutines of the program.
+        class_name: The class of the code.
+
+    Returns:
+        The number of calls replaced.
+    """
+    count = 0
+    for function in code.functions:
+        result = []
+        changed = False
+        for instruction in function.instructions():
+            opcode, n_args, operand = instruction
+            inlinee = None
+            if opcode == CALL:
+                inlinee = inlinees.get(code.names[operand])
+            if inlinee is None or not _fits(inlinee, n_args, class_name):
+                result.append(instruction)
+                continue
+            count += 1
+            changed = True
+            result.extend(_expand(code, inlinee, n_args, count))
+        if changed:
+            function.replace(result)
+    return count
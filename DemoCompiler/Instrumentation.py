@@ -0,0 +1,101 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Timing and call-count instrumentation for `--timings`.
+
+`instrument(engine)` wraps the `compile_*` methods of one engine, as
+instance attributes, to count calls; recursive calls go through `self`, so
+they are counted too, and engines that are not instrumented pay nothing.
+It also times the writes of the engine's `VMWriter`, so that writing can
+be told apart from parsing and code generation.
+
+`format_timings` and `total` turn the per-file numbers (see
+`JackCompiler.compile_file`) into a report.
+"""
+
+import functools
+import time
+import typing
+
+STAGES = ("tokenize", "compile", "write")
+
+
+def _counted(method: typing.Callable, counts: dict[str, int],
+             name: str) -> typing.Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        counts[name] += 1
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def _timed(method: typing.Callable, seconds: dict[str, float],
+           stage: str) -> typing.Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            seconds[stage] += time.perf_counter() - start
+    return wrapper
+
+
+def instrument(engine: typing.Any) -> tuple[dict[str, int], dict[str, float]]:
+    """Count the calls of each `compile_*` method of an engine, and time
+    the flushes of its VM writer.
+
+    Returns:
+        (calls, seconds): calls per method name, and the seconds spent
+        writing under "write"; both are updated as the engine runs.
+    """
+    calls: dict[str, int] = {}
+    for name in dir(type(engine)):
+        if name.startswith("compile_"):
+            calls[name] = 0
+            setattr(engine, name, _counted(getattr(engine, name), calls, name))
+    seconds = {"write": 0.0}
+    writer = engine.output_stream
+    writer.flush = _timed(writer.flush, seconds, "write")
+    return calls, seconds
+
+
+def total(timings: typing.Iterable[dict[str, typing.Any]]) -> dict[str, typing.Any]:
+    """Sum the timings of several files."""
+    result: dict[str, typing.Any] = {"calls": {}}
+    for timing in timings:
+        for key, value in timing.items():
+            if key == "calls":
+                for name, count in value.items():
+                    result["calls"][name] = result["calls"].get(name, 0) + count
+            else:
+                result[key] = result.get(key, 0) + value
+    return result
+
+
+def format_timings(timings: dict[str, dict[str, typing.Any]]) -> str:
+    """Return a table of per-file timings, their total, and the calls per
+    `compile_*` method that ran, busiest first."""
+    header = (f"{'file':30}{'tokens':>8}{'tokenize':>10}{'compile':>10}"
+              f"{'write':>8}{'lookups':>9}{'walks':>8}")
+    lines = [header]
+    rows = dict(timings)
+    rows["total"] = total(timings.values())
+    for name, timing in rows.items():
+        lines.append(
+            f"{name[-30:]:30}{timing.get('tokens', 0):>8}"
+            + "".join(f"{timing.get(f'{stage}_ms', 0):>{width}.2f}"
+                      for stage, width in zip(STAGES, (10, 10, 8)))
+            + f"{timing.get('symbol_lookups', 0):>9}"
+              f"{timing.get('scope_walks', 0):>8}")
+    lines.append("calls:")
+    calls = rows["total"]["calls"]
+    for name in sorted(calls, key=lambda name: (-calls[name], name)):
+        if calls[name]:
+            lines.append(f"  {name:28}{calls[name]:>10}")
+    return "\n".join(lines)
@@ -0,0 +1,82 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Thin client of the compile daemon (`JackDaemon.py`).
+
+Takes the same command line as `JackCompiler.py` and sends it to the
+daemon, which compiles in a warm process; the output and exit status are
+the same. When no daemon is running, it compiles in-process instead.
+The compiler is only imported then, so that a client talking to a daemon
+starts quickly.
+
+The socket is $JACK_DAEMON_SOCKET, or a per-user default.
+
+Usage:
+    python JackClient.py <JackCompiler arguments>
+"""
+
+import json
+import os
+import socket
+import sys
+import tempfile
+import typing
+
+SOCKET_VARIABLE = "JACK_DAEMON_SOCKET"
+
+
+def default_socket_path() -> str:
+    """Return the socket path used when none is given: one per user."""
+    return os.environ.get(SOCKET_VARIABLE) or os.path.join(
+        tempfile.gettempdir(), f"jackcompiler-{os.getuid()}.sock")
+
+
+def request(message: dict[str, typing.Any],
+            socket_path: str = None) -> dict[str, typing.Any]:
+    """Send one request to the daemon and return its response.
+
+    Raises:
+        OSError: If no daemon answers on the socket.
+    """
+    with socket.socket(socket.AF_UNIX) as connection:
+        connection.connect(socket_path or default_socket_path())
+        connection.sendall(json.dumps(message).encode() + b"\n")
+        with connection.makefile("rb") as responses:
+            line = responses.readline()
+    if not line:
+        raise ConnectionError("the daemon closed the connection")
+    return json.loads(line)
+
+
+def main(argv: list[str] = None) -> int:
+    """Command-line entry point.
+
+    Returns:
+        The process exit status.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        if "--watch" in argv:
+            # long-running anyway, and the daemon serves one request at a time
+            raise ConnectionRefusedError
+        response = request({"argv": argv, "cwd": os.getcwd()})
+    except OSError:
+        import JackCompiler
+        return JackCompiler.main(argv)
+    sys.stdout.write(response.get("stdout", ""))
+    sys.stderr.write(response.get("stderr", ""))
+    if "stderr" not in response:
+        # The daemon failed before it could run the command.
+        for diagnostic in response.get("diagnostics", []):
+            print(f"{diagnostic.get('path') or 'JackDaemon'}: "
+                  f"{diagnostic['message']}", file=sys.stderr)
+    return response["status"]
+
+
+if "__main__" == __name__:
+    sys.exit(main())
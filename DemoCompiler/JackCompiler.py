@@ -14,55 +14,944 @@ compilation engine (`CompilationEngine`). It can compile either:
 - All `.jack` files in a directory.
 
 Output is written as `.vm` files in the same directory as the input.
+Files are independent, so a directory is compiled by a pool of worker
+processes (`--jobs`, all cores by default).
+
+Builds are incremental: a `BuildCache` next to the outputs skips classes
+whose source, options and referenced class interfaces are unchanged.
+
+`--timings` reports where compilation time goes, per file and stage, and
+`--profile` runs the whole build under cProfile. Both compile every class,
+even those the build cache holds up to date, which would not be measured.
+
+`--asm` translates the whole program to one Hack assembly file instead of
+`.vm` files (see HackWriter.py).
+
+`--watch` keeps running after the build, and rebuilds whenever a source
+changes; see `watch`.
+
+`compile_source` and `compile_many` compile sources held in memory, for
+programs that embed the compiler; they never touch the filesystem.
 """
 
+import argparse
+import functools
+import io
+import json
 import os
 import sys
+import time
 import typing
+import Diagnostics
+import HackWriter
+import Inliner
+import Instrumentation
+import Peephole
+import StringPool
+import SyntaxTree
+import TreeShaker
+import VMCode
+from StrengthReducer import CostModel, StrengthReducer
+from BuildCache import BuildCache
+from Diagnostics import CompileError, Diagnostic
 from CompilationEngine import CompilationEngine
 from JackTokenizer import JackTokenizer
 from SymbolTable import SymbolTable
 from VMWriter import VMWriter
 
+# Part of every build cache key: bump it whenever generated code changes.
+__version__ = "1.1.0"
+
+# Seconds between two scans of the sources in --watch mode.
+WATCH_INTERVAL = 0.2
+
 
 def compile_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.TextIO,
+        streaming: bool = False, buffered: bool = True,
+        ir: bool = False, peephole: bool = False,
+        fold_constants: bool = False,
+        pool_strings: str = None, reduce_strength: bool = False,
+        cost_model: dict[str, int] = None,
+        direct_branches: bool = False,
+        timings: bool = False,
+        syntax_tree: bool = False) -> CompilationEngine:
     """Compiles a single file.
 
     Args:
         input_file (typing.TextIO): the file to compile.
         output_file (typing.TextIO): writes all output to this file.
+        streaming (bool): tokenize the input lazily instead of reading it
+            all up front.
+        buffered (bool): write the VM code in large chunks rather than one
+            command at a time.
+        ir (bool): build the VM code as an in-memory instruction list first.
+        peephole (bool): run the peephole optimizer over the VM code.
+        fold_constants (bool): evaluate constant expressions at compile time.
+        pool_strings (str): build each string constant once, per "class" or
+            for the whole "program" (see StringPool.py).
+        reduce_strength (bool): lower `*` and `/` by constants to cheaper
+            sequences (see StrengthReducer.py).
+        cost_model (dict): `CostModel` parameters for reduce_strength.
+        direct_branches (bool): compile if / while with fewer branches.
+        timings (bool): time the tokenize, compile and write stages and
+            count tokens, symbol lookups and `compile_*` calls, into the
+            engine's `timings` (see Instrumentation.py).
+        syntax_tree (bool): parse the class into a syntax tree first, kept
+            as the engine's `syntax_tree`, and generate the code from the
+            tree; the code is the same (see SyntaxTree.py).
+
+    Returns:
+        CompilationEngine: the engine, holding the class's name, interface
+        and references.
     """
-    tokenizer = JackTokenizer(input_file)
-    engine = CompilationEngine(tokenizer, output_file)
+    start = time.perf_counter()
+    tokenizer = JackTokenizer(input_file, streaming)
+    tree = None
+    if syntax_tree:
+        tree = SyntaxTree.parse(tokenizer)
+    # building the tree is part of the tokenize stage
+    tokenized = time.perf_counter()
+    reducer = None
+    if reduce_strength:
+        reducer = StrengthReducer(CostModel(**(cost_model or {})))
+    arguments = (tokenizer, output_file, buffered, ir, peephole, fold_constants,
+                 pool_strings, reducer, direct_branches)
+    if tree is None:
+        engine = CompilationEngine(*arguments)
+    else:
+        engine = SyntaxTree.TreeCompiler(tree, *arguments)
+    engine.syntax_tree = tree
+    if tree is not None:
+        engine.report.update(SyntaxTree.report(tree))
+    if not timings:
+        engine.compile_class()
+        return engine
+    calls, seconds = Instrumentation.instrument(engine)
+    compile_start = time.perf_counter()
     engine.compile_class()
+    compiled = time.perf_counter()
+    # A streaming tokenizer reads as it goes: its time is part of compiling.
+    engine.timings = {
+        "tokens": tokenizer.total_count,
+        "tokenize_ms": (tokenized - start) * 1000,
+        "compile_ms": (compiled - compile_start - seconds["write"]) * 1000,
+        "write_ms": seconds["write"] * 1000,
+        "symbol_lookups": engine.symTable.lookups,
+        "scope_walks": engine.symTable.scope_walks,
+        "calls": calls,
+    }
+    return engine
 
 
-if "__main__" == __name__:
-    # Parses the input path and calls compile_file on each input file.
-    # This opens both the input and the output files!
-    # Both are closed automatically when the code finishes running.
-    # If the output file does not exist, it is created automatically in the
-    # correct path, using the correct filename.
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: JackCompiler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+# The name of the source of `compile_source` in its diagnostics.
+SOURCE_NAME = "<source>"
+
+
+def compile_source(source: str,
+                   diagnostics: list[Diagnostic] = None,
+                   **options: typing.Any) -> str:
+    """Compiles one class held in memory; see `compile_many`.
+
+    Args:
+        source: The Jack source of the class.
+        diagnostics: If given, every diagnostic is appended to it.
+        **options: Passed on to `compile_file`, except for
+            pool_strings="program", whose pool only `compile_many` returns.
+
+    Returns:
+        The VM code of the class.
+
+    Raises:
+        CompileError: If the class does not compile.
+    """
+    if options.get("pool_strings") == "program":
+        raise ValueError("a program-wide string pool needs compile_many")
+    return compile_many({SOURCE_NAME: source}, diagnostics,
+                        **options)[SOURCE_NAME]
+
+
+def compile_many(sources: dict[str, str],
+                 diagnostics: list[Diagnostic] = None,
+                 **options: typing.Any) -> dict[str, str]:
+    """Compiles classes held in memory, without touching the filesystem.
+
+    The classes are compiled one after the other in this process, so they
+    share its tables, built once (see `JackTokenizer`), and the interfaces
+    they declare are checked against the calls between them: a call to a
+    subroutine that a class of the batch does not declare is a warning.
+    So is a class declared under another name, and with
+    syntax_tree=True, a local variable that is never read.
+
+    Args:
+        sources: The source of each class, by name, e.g. its file name.
+        diagnostics: If given, every diagnostic is appended to it, warnings
+            included.
+        **options: Passed on to `compile_file`. With pool_strings="program",
+            the shared pool is compiled too, under `StringPool.POOL_CLASS`.
+
+    Returns:
+        The VM code of each class, by name.
+
+    Raises:
+        CompileError: If a class does not compile; it holds all the
+            diagnostics, and the code of the classes that did compile.
+    """
+    found = [] if diagnostics is None else diagnostics
+    outputs: dict[str, str] = {}
+    engines: dict[str, CompilationEngine] = {}
+    for name, source in sources.items():
+        output = io.StringIO()
+        try:
+            engine = compile_file(io.StringIO(source), output, **options)
+        except Exception as error:
+            found.append(Diagnostic.from_exception(name, error))
+            continue
+        engines[name] = engine
+        outputs[name] = output.getvalue()
+    found.extend(batch_diagnostics(engines))
+    if options.get("pool_strings") == "program":
+        pool = io.StringIO()
+        StringPool.write_pool(pool, [string for engine in engines.values()
+                                     for string in engine.string_pool.slots])
+        outputs[StringPool.POOL_CLASS] = pool.getvalue()
+    if any(diagnostic.severity == Diagnostics.ERROR for diagnostic in found):
+        raise CompileError(found, outputs)
+    return outputs
+
+
+def batch_diagnostics(engines: dict[str, CompilationEngine]) -> list[Diagnostic]:
+    """Return the warnings about classes compiled together, by name."""
+    interfaces = {engine.class_name: engine.interface
+                  for engine in engines.values()}
+    found = []
+    for name, engine in engines.items():
+        stem = os.path.splitext(os.path.basename(name))[0]
+        if stem.isidentifier() and stem != engine.class_name:
+            found.append(Diagnostic(
+                name, Diagnostics.WARNING, Diagnostics.CLASS_NAME,
+                f"declares class {engine.class_name}, not {stem}"))
+        for class_name, members in sorted(engine.references.items()):
+            interface = interfaces.get(class_name)
+            if interface is None:
+                continue
+            for member in sorted(members):
+                kind = interface.get(member, "").split(" ")[0]
+                if kind not in SyntaxTree.SUBROUTINE_KINDS:
+                    found.append(Diagnostic(
+                        name, Diagnostics.WARNING, Diagnostics.UNDEFINED_MEMBER,
+                        f"calls {class_name}.{member}, which {class_name} "
+                        "does not declare"))
+        if engine.syntax_tree is not None:
+            for subroutine, variable in SyntaxTree.unused_locals(
+                    engine.syntax_tree):
+                found.append(Diagnostic(
+                    name, Diagnostics.WARNING, Diagnostics.UNUSED_LOCAL,
+                    f"{engine.class_name}.{subroutine}: local variable "
+                    f"{variable} is never read"))
+    return found
+
+
+def jack_files(argument_path: str) -> list[str]:
+    """Return the `.jack` files to compile for a command-line path.
+
+    Args:
+        argument_path: A `.jack` file or a directory containing them.
+
+    Returns:
+        The matching files, sorted so that runs are deterministic.
+    """
     # If a directory was provided, compile every .jack file inside it.
     # Otherwise, compile the single file path.
     if os.path.isdir(argument_path):
-        files_to_assemble = [
+        paths = [
             os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
+            for filename in sorted(os.listdir(argument_path))]
+    else:
+        paths = [argument_path]
+    # Skip non-Jack files when a directory is given.
+    return [path for path in paths
+            if os.path.splitext(path)[1].lower() == ".jack"]
+
+
+def output_path_for(input_path: str) -> str:
+    """Return the `.vm` path written for a `.jack` source."""
+    return os.path.splitext(input_path)[0] + ".vm"
+
+
+def compile_path(input_path: str, **options: typing.Any) -> CompilationEngine:
+    """Compiles a `.jack` file into a `.vm` file next to it.
+
+    Args:
+        input_path: The file to compile.
+        **options: Passed on to `compile_file`.
+
+    Returns:
+        The engine that compiled the file.
+    """
+    output = io.StringIO()
+    with open(input_path, 'r') as input_file:
+        engine = compile_file(input_file, output, **options)
+    # Only a successful compile replaces the `.vm` file, and atomically, so
+    # a failed one never leaves an empty or partial file behind.
+    start = time.perf_counter()
+    output_path = output_path_for(input_path)
+    temp_path = output_path + ".tmp"
+    try:
+        with open(temp_path, 'w') as output_file:
+            output_file.write(output.getvalue())
+        os.replace(temp_path, output_path)
+    except OSError:
+        # e.g. a full disk: do not leave a partial file next to the sources
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    if options.get("timings"):
+        engine.timings["write_ms"] += (time.perf_counter() - start) * 1000
+    return engine
+
+
+def compile_job(input_path: str, keep_code: bool = False,
+                **options: typing.Any) -> dict[str, typing.Any]:
+    """Worker entry point: like `compile_path`, but reports failures.
+
+    Args:
+        input_path: The file to compile.
+        keep_code: Return the VM code as a `VMCode` ("code") instead of
+            writing the `.vm` file.
+        **options: Passed on to `compile_file`.
+
+    Returns:
+        A picklable summary with the keys "error" (None on success, otherwise
+        a one-line description of the error), "class", "interface",
+        "references", "report" and "strings" (the pooled string constants),
+        and "timings" when timed.
+    """
+    try:
+        if keep_code:
+            with open(input_path, 'r') as input_file:
+                engine = compile_file(input_file, None, ir=True, **options)
+        else:
+            engine = compile_path(input_path, **options)
+    except Exception as error:
+        return {"error": f"{type(error).__name__}: {error}"}
+    summary = {
+        "error": None,
+        "class": engine.class_name,
+        "interface": engine.interface,
+        "references": {name: sorted(members)
+                       for name, members in engine.references.items()},
+        "report": engine.report,
+        "strings": list(engine.string_pool.slots)
+                   if engine.string_pool is not None else [],
+    }
+    if keep_code:
+        summary["code"] = engine.output_stream.code
+    if options.get("timings"):
+        summary["timings"] = engine.timings
+    return summary
+
+
+def compile_all(input_paths: list[str], jobs: int = None,
+                **options: typing.Any) -> dict[str, dict[str, typing.Any]]:
+    """Compiles several files, in parallel when more than one job is allowed.
+
+    Args:
+        input_paths: The `.jack` files to compile.
+        jobs: Number of worker processes; defaults to the number of cores.
+        **options: Passed on to `compile_job`.
+
+    Returns:
+        The `compile_job` summary of each file, in input order.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    job = functools.partial(compile_job, **options)
+    if jobs == 1 or len(input_paths) < 2:
+        results = [job(path) for path in input_paths]
+    else:
+        # importing it costs more than a small compile: only when needed
+        from concurrent.futures import ProcessPoolExecutor
+        jobs = min(jobs, len(input_paths))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            # map() keeps results in input order whatever order workers finish.
+            results = list(pool.map(
+                job, input_paths,
+                chunksize=max(1, len(input_paths) // (jobs * 4))))
+    return dict(zip(input_paths, results))
+
+
+def build(input_paths: list[str], jobs: int = None, use_cache: bool = True,
+          roots: list[str] = None, inline: int = None, asm: bool = False,
+          caches: dict[tuple, BuildCache] = None, rebuild: bool = False,
+          **options: typing.Any) -> dict[str, dict[str, typing.Any]]:
+    """Compiles the files that are out of date with respect to the build
+    cache of their directory.
+
+    Classes whose source or options changed are compiled first. Then every
+    other class that calls a member whose signature changed is compiled too.
+
+    Args:
+        input_paths: The `.jack` files of the build.
+        jobs: Number of worker processes; defaults to the number of cores.
+        use_cache: If False, compile everything and leave the cache alone.
+        roots: If given, compile the files as one program, keeping only the
+            subroutines reachable from these (see `compile_program`).
+        inline: If given, compile the files as one program, inlining leaf
+            subroutines of at most this many instructions.
+        asm: Compile the files as one program, into Hack assembly.
+        caches: If given, the loaded caches are kept here between builds,
+            by directory and options, and only reloaded when their file
+            changes; a long-running process thus skips re-reading them.
+        rebuild: Compile every file, as if none were up to date, and
+            record them in the cache as usual.
+        **options: Passed on to `compile_file`.
+
+    Returns:
+        The `compile_job` summary of each file that was compiled.
+    """
+    if roots is not None or inline is not None or asm:
+        return compile_program(input_paths, roots, jobs, inline, asm,
+                               **options)
+    pool_strings = options.get("pool_strings") == "program"
+    if not use_cache:
+        compiled = compile_all(input_paths, jobs, **options)
+        if pool_strings:
+            strings: dict[str, list[str]] = {}
+            for input_path, result in compiled.items():
+                strings.setdefault(os.path.dirname(input_path), []).extend(
+                    result.get("strings", []))
+            for directory, directory_strings in strings.items():
+                compiled[pool_path_for(directory)] = write_string_pool(
+                    directory, directory_strings)
+        return compiled
+
+    compiled = {}
+    directories: dict[str, list[str]] = {}
+    for input_path in input_paths:
+        directories.setdefault(os.path.dirname(input_path), []).append(input_path)
+    for directory, paths in directories.items():
+        # neither timing a build nor streaming its sources changes the output
+        cache_options = {name: value for name, value in options.items()
+                         if name not in ("timings", "streaming")}
+        if caches is None:
+            cache = BuildCache(directory, __version__, cache_options)
+        else:
+            cache_key = (directory, json.dumps(cache_options, sort_keys=True))
+            cache = caches.get(cache_key)
+            if cache is None or cache.is_stale():
+                cache = caches[cache_key] = BuildCache(
+                    directory, __version__, cache_options)
+        cache.prune(paths)
+        # taken before compiling: a source saved meanwhile stays out of date
+        states = {path: cache.source_state(path) for path in paths}
+        changed = paths if rebuild else [
+            path for path in paths if not cache.is_fresh(path, states[path])]
+        results = compile_all(changed, jobs, **options)
+        for path in changed:
+            cache.forget(path)
+
+        interfaces = cache.interfaces()
+        for result in results.values():
+            if result["error"] is None:
+                interfaces[result["class"]] = result["interface"]
+        affected = [path for path in paths if path not in results
+                    and not cache.references_current(path, interfaces)]
+        results.update(compile_all(affected, jobs, **options))
+
+        for path in paths:
+            result = results.get(path)
+            if result is None:
+                continue
+            compiled[path] = result
+            if result["error"] is not None:
+                cache.forget(path)
+            else:
+                cache.record(path, states[path], output_path_for(path),
+                             result["class"], result["interface"],
+                             result["references"], interfaces,
+                             result["strings"])
+        if pool_strings and (results or not os.path.exists(
+                pool_path_for(directory))):
+            compiled[pool_path_for(directory)] = write_string_pool(
+                directory, cache.strings())
+        cache.save()
+    return compiled
+
+
+def compile_program(input_paths: list[str],
+                    roots: typing.Iterable[str] = None, jobs: int = None,
+                    inline: int = None, asm: bool = False,
+                    **options: typing.Any) -> dict[str, dict[str, typing.Any]]:
+    """Compiles the files as one program: inlines small leaf subroutines
+    into their callers, then writes only the subroutines reachable from the
+    roots, as `.vm` files or as one Hack assembly file.
+
+    Every file is compiled, whatever the build cache says: the code of a
+    class depends on all the other classes.
+
+    Args:
+        input_paths: The `.jack` files of the program.
+        roots: The entry points, e.g. "Main.main"; None keeps everything.
+        jobs: Number of worker processes; defaults to the number of cores.
+        inline: Inline leaf subroutines of at most this many instructions;
+            None disables inlining.
+        asm: Write the program as Hack assembly, to `asm_path_for` its
+            directory, instead of `.vm` files. The `.vm` files found there
+            without a `.jack` source, e.g. of the OS, are part of the program.
+        **options: Passed on to `compile_file`.
+
+    Returns:
+        The `compile_job` summary of each file, with the names of its
+        removed subroutines under "removed" and the file holding its code
+        under "output". If the program defines none of the roots, nothing
+        is written: there is an error under each directory instead, next to
+        the files that failed to compile.
+    """
+    results = compile_all(input_paths, jobs, keep_code=True, **options)
+    codes = {path: result.pop("code") for path, result in results.items()
+             if result["error"] is None}
+
+    if inline is not None:
+        inlinees = Inliner.collect(codes.values(), inline)
+        for path, code in codes.items():
+            report = results[path]["report"]
+            report["inline/calls"] = Inliner.inline(
+                code, inlinees, results[path]["class"])
+            if options.get("peephole") and report["inline/calls"]:
+                # inlined bodies open up new peephole opportunities
+                for rule, removed in Peephole.optimize(code).items():
+                    report[f"peephole/{rule}"] += removed
+
+    pool_strings = options.get("pool_strings") == "program"
+    libraries: dict[str, dict[str, VMCode.VMCode]] = {}
+    failed: dict[str, dict[str, typing.Any]] = {}
+    if asm:
+        if roots is not None:
+            # the entry point of a program with the OS
+            roots = list(roots) + ["Sys.init"]
+        sources: dict[str, list[str]] = {}
+        for path in input_paths:
+            sources.setdefault(os.path.dirname(path), []).append(
+                os.path.splitext(os.path.basename(path))[0])
+        for directory, classes in sources.items():
+            if pool_strings:
+                classes.append(StringPool.POOL_CLASS)
+            try:
+                libraries[directory] = read_libraries(directory, classes)
+            except (OSError, ValueError) as error:
+                libraries[directory] = {}
+                failed[directory] = {"error": f"{type(error).__name__}: {error}"}
+
+    graph: dict[str, set[str]] = {}
+    for code in codes.values():
+        graph.update(TreeShaker.call_graph(code))
+    for directory_libraries in libraries.values():
+        for code in directory_libraries.values():
+            graph.update(TreeShaker.call_graph(code))
+    if roots is not None and not any(root in graph for root in roots):
+        # e.g. a library: shaking would leave nothing of it
+        failed = {path: result for path, result in results.items()
+                  if result["error"] is not None}
+        for directory in dict.fromkeys(map(os.path.dirname, input_paths)):
+            failed[directory] = {"error": "the program defines none of the "
+                                 f"roots {', '.join(roots)}; nothing was written"}
+        return failed
+    live = set(graph) if roots is None else TreeShaker.reachable(graph, roots)
+    for directory_libraries in libraries.values():
+        for code in directory_libraries.values():
+            TreeShaker.shake(code, live)
+
+    for path, code in codes.items():
+        size = sum(len(function) + 1 for function in code.functions)
+        removed = TreeShaker.shake(code, live)
+        results[path]["removed"] = removed
+        if roots is not None:
+            results[path]["report"]["tree-shake/functions"] = len(removed)
+            results[path]["report"]["tree-shake/commands"] = size - sum(
+                len(function) + 1 for function in code.functions)
+        if asm:
+            results[path]["output"] = asm_path_for(os.path.dirname(path))
+            continue
+        start = time.perf_counter()
+        try:
+            with open(output_path_for(path), 'w') as output_file:
+                output_file.write(code.to_text())
+        except OSError as error:
+            results[path] = {"error": f"{type(error).__name__}: {error}"}
+            continue
+        results[path]["output"] = output_path_for(path)
+        if "timings" in results[path]:
+            results[path]["timings"]["write_ms"] += \
+                (time.perf_counter() - start) * 1000
+
+    strings: dict[str, list[str]] = {}
+    if pool_strings:
+        # Only the literals that live subroutines use make it into the pool.
+        pool = StringPool.StringPool(StringPool.POOL_CLASS, shared=True)
+        called = set().union(*(graph[name] for name in live))
+        for path, result in results.items():
+            strings.setdefault(os.path.dirname(path), []).extend(
+                string for string in result.get("strings", [])
+                if pool.accessor_name(string, 0) in called)
+        if not asm:
+            for directory, directory_strings in strings.items():
+                results[pool_path_for(directory)] = write_string_pool(
+                    directory, directory_strings)
+    if asm:
+        for directory, directory_libraries in libraries.items():
+            program = {results[path]["class"]: code
+                       for path, code in codes.items()
+                       if os.path.dirname(path) == directory
+                       and results[path]["error"] is None}
+            if pool_strings:
+                program[StringPool.POOL_CLASS] = StringPool.pool_code(
+                    strings.get(directory, []))
+            program.update(directory_libraries)
+            results[asm_path_for(directory)] = failed.get(directory) \
+                or write_asm(directory, program)
+    return results
+
+
+def asm_path_for(directory: str) -> str:
+    """Return the Hack assembly path written for a program directory."""
+    return os.path.join(directory, os.path.basename(directory)
+                        + HackWriter.ASM_SUFFIX)
+
+
+def read_libraries(directory: str,
+                   classes: typing.Iterable[str]) -> dict[str, VMCode.VMCode]:
+    """Return the code of the `.vm` files of a directory, by class, except
+    those of the given classes (compiled from source).
+
+    Raises:
+        ValueError: If a file is not valid VM code.
+    """
+    skip = set(classes)
+    libraries = {}
+    for filename in sorted(os.listdir(directory)):
+        class_name, extension = os.path.splitext(filename)
+        if extension == ".vm" and class_name not in skip:
+            with open(os.path.join(directory, filename)) as vm_file:
+                try:
+                    libraries[class_name] = VMCode.parse(vm_file.read())
+                except ValueError as error:
+                    raise ValueError(f"{filename}: {error}") from None
+    return libraries
+
+
+def write_asm(directory: str,
+              program: dict[str, VMCode.VMCode]) -> dict[str, typing.Any]:
+    """Translate a program into Hack assembly, in `asm_path_for(directory)`.
+
+    Args:
+        directory: The program's directory.
+        program: The code of each of its classes, by class name.
+
+    Returns:
+        A `compile_job`-like summary of the assembly file; it is an error to
+        call functions that are not part of the program.
+    """
+    writer = HackWriter.translate(program)
+    try:
+        with open(asm_path_for(directory), "w") as output_file:
+            output_file.write(writer.text())
+    except OSError as error:
+        return {"error": f"{type(error).__name__}: {error}"}
+    undefined = writer.undefined()
+    return {"error": f"undefined functions: {', '.join(undefined)}"
+                     if undefined else None,
+            "class": None, "interface": {}, "references": {},
+            "report": {"asm/instructions": writer.instruction_count()},
+            "strings": []}
+
+
+def pool_path_for(directory: str) -> str:
+    """Return the path of the shared string pool of a directory."""
+    return os.path.join(directory, StringPool.POOL_CLASS + ".vm")
+
+
+def write_string_pool(directory: str,
+                      strings: typing.Iterable[str]) -> dict[str, typing.Any]:
+    """Writes the shared `StringPool` class of a directory.
+
+    Args:
+        directory: The directory of the program.
+        strings: The string constants its classes use.
+
+    Returns:
+        A summary of the pool, in the form of `compile_job`'s.
+    """
+    try:
+        with open(pool_path_for(directory), "w") as output_file:
+            report = StringPool.write_pool(output_file, strings)
+    except OSError as error:
+        return {"error": f"{type(error).__name__}: {error}"}
+    return {"error": None, "class": StringPool.POOL_CLASS, "interface": {},
+            "references": {}, "report": report, "strings": []}
+
+
+def print_report(results: dict[str, dict[str, typing.Any]]) -> None:
+    """Print the optimization statistics of a build, summed over its files."""
+    totals: dict[str, int] = {}
+    for result in results.values():
+        for name, count in result.get("report", {}).items():
+            totals[name] = totals.get(name, 0) + count
+    print(f"compiled {len(results)} file(s)")
+    for name, count in totals.items():
+        print(f"  {name}: {count}")
+    removed = [name for result in results.values()
+               for name in result.get("removed", ())]
+    if removed:
+        print(f"  removed: {', '.join(removed)}")
+
+
+def write_timings(results: dict[str, dict[str, typing.Any]],
+                  destination: str) -> None:
+    """Print the timings of a build, or write them as JSON.
+
+    Args:
+        results: The `compile_job` summaries of the build.
+        destination: "-" to print a table, otherwise a JSON file path.
+    """
+    timings = {os.path.relpath(path): result["timings"]
+               for path, result in results.items() if "timings" in result}
+    if destination == "-":
+        print(Instrumentation.format_timings(timings))
+        return
+    with open(destination, "w") as timings_file:
+        json.dump({"files": timings,
+                   "total": Instrumentation.total(timings.values())},
+                  timings_file, indent=2)
+        timings_file.write("\n")
+
+
+def positive_int(text: str) -> int:
+    """argparse type of a count that must be at least 1."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"not a positive integer: {text}")
+    return value
+
+
+def parse_arguments(argv: list[str] = None) -> argparse.Namespace:
+    """Parse the command line; exits with a usage message on errors."""
+    parser = argparse.ArgumentParser(
+        prog="JackCompiler",
+        description="Compiles a .jack file, or every .jack file in a "
+                    "directory, into .vm files next to the sources.")
+    parser.add_argument("path", help="a .jack file or a directory")
+    parser.add_argument("-j", "--jobs", type=positive_int, default=None,
+                        help="number of worker processes (default: all cores)")
+    parser.add_argument("--stream", action="store_true",
+                        help="tokenize sources lazily, line by line")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="recompile everything and do not touch the "
+                             "build cache")
+    parser.add_argument("--peephole", action="store_true",
+                        help="run the peephole optimizer over the VM code")
+    parser.add_argument("--fold-constants", action="store_true",
+                        help="evaluate constant expressions at compile time")
+    parser.add_argument("--pool-strings", choices=StringPool.SCOPES,
+                        default=None,
+                        help="build each string constant once, per class or "
+                             "in a StringPool shared by the program")
+    parser.add_argument("--reduce-strength", action="store_true",
+                        help="replace multiplication and division by "
+                             "constants with cheaper VM sequences")
+    parser.add_argument("--cost", action="append", default=[],
+                        metavar="NAME=VALUE",
+                        help="set a strength reduction cost parameter: "
+                             "multiply_cost, divide_cost, max_length, "
+                             "max_growth or growth_cost")
+    parser.add_argument("--direct-branches", action="store_true",
+                        help="test while loops at the bottom and branch on "
+                             "if conditions without extra not / goto")
+    parser.add_argument("--tree-shake", action="store_true",
+                        help="compile the files as one program and drop the "
+                             "subroutines that cannot be reached from the "
+                             "roots")
+    parser.add_argument("--root", action="append", default=[],
+                        metavar="CLASS.SUBROUTINE",
+                        help="an extra entry point for --tree-shake "
+                             "(Main.main always is one)")
+    parser.add_argument("--inline", type=int, nargs="?", default=None,
+                        const=Inliner.DEFAULT_THRESHOLD, metavar="SIZE",
+                        help="compile the files as one program and inline "
+                             "leaf subroutines of at most SIZE instructions "
+                             f"(default {Inliner.DEFAULT_THRESHOLD})")
+    parser.add_argument("--asm", action="store_true",
+                        help="compile the files as one program into a Hack "
+                             "assembly file, DIR/DIR.asm, instead of .vm "
+                             "files; .vm files without a .jack source there "
+                             "(e.g. of the OS) are included")
+    parser.add_argument("--syntax-tree", action="store_true",
+                        help="parse each class into a syntax tree before "
+                             "generating code (same output; --report adds "
+                             "tree statistics)")
+    parser.add_argument("--report", action="store_true",
+                        help="print optimization statistics")
+    parser.add_argument("--timings", nargs="?", const="-", default=None,
+                        metavar="FILE",
+                        help="report per-file stage times, token counts, "
+                             "symbol lookups and compile_* calls; printed, "
+                             "or written to FILE as JSON (compiles every "
+                             "class, up to date or not)")
+    parser.add_argument("--watch", action="store_true",
+                        help="after building, keep rebuilding the sources "
+                             "that change, and their dependents, until "
+                             "interrupted")
+    parser.add_argument("--profile", nargs="?", const="-", default=None,
+                        metavar="FILE",
+                        help="compile every class in one process under "
+                             "cProfile; print the stats by cumulative time, "
+                             "or dump them to FILE")
+    args = parser.parse_args(argv)
+    cost_model = {}
+    for setting in args.cost:
+        name, _, value = setting.partition("=")
+        if name not in ("multiply_cost", "divide_cost", "max_length",
+                        "max_growth", "growth_cost") \
+                or not value.isdigit():
+            parser.error(f"invalid cost setting: {setting}")
+        cost_model[name] = int(value)
+    args.cost_model = cost_model or None
+    return args
+
+
+def run(args: argparse.Namespace,
+        caches: dict[tuple, BuildCache] = None) -> dict[str, dict[str, typing.Any]]:
+    """Build what the command line asks for, profiling it if asked to.
+
+    Args:
+        args: The parsed command line (see `parse_arguments`).
+        caches: Build caches to reuse across runs (see `build`).
+
+    Returns:
+        The `build` results.
+    """
+    roots = None
+    if args.tree_shake:
+        roots = list(TreeShaker.DEFAULT_ROOTS) + args.root
+
+    argument_path = os.path.abspath(args.path)
+    # worker processes would escape the profiler
+    jobs = 1 if args.profile is not None else args.jobs
+    run_build = functools.partial(
+        build, jack_files(argument_path), jobs,
+        use_cache=not args.no_cache, roots=roots, asm=args.asm,
+        # measuring a build only tells something if every class is compiled
+        rebuild=args.timings is not None or args.profile is not None,
+        caches=caches,
+        inline=args.inline,
+        streaming=args.stream,
+        peephole=args.peephole,
+        fold_constants=args.fold_constants,
+        pool_strings=args.pool_strings,
+        reduce_strength=args.reduce_strength,
+        cost_model=args.cost_model,
+        direct_branches=args.direct_branches,
+        timings=args.timings is not None,
+        syntax_tree=args.syntax_tree)
+    if args.profile is None:
+        return run_build()
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    results = profiler.runcall(run_build)
+    if args.profile == "-":
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
     else:
-        files_to_assemble = [argument_path]
+        profiler.dump_stats(args.profile)
+    return results
 
-    for input_path in files_to_assemble:
-        # Skip non-Jack files when a directory is given.
 
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".jack":
+def finish(args: argparse.Namespace,
+           results: dict[str, dict[str, typing.Any]]) -> int:
+    """Report the errors of a build, and its statistics if asked to.
+
+    Returns:
+        The process exit status.
+    """
+    errors = {path: result["error"] for path, result in results.items()
+              if result["error"] is not None}
+    for input_path, error in errors.items():
+        print(f"{input_path}: {error}", file=sys.stderr)
+    if args.report:
+        print_report(results)
+    if args.timings is not None:
+        write_timings(results, args.timings)
+    return 1 if errors else 0
+
+
+def snapshot(argument_path: str) -> dict[str, tuple[int, int]]:
+    """Return the mtime and size of every source of a command-line path."""
+    stamps = {}
+    for input_path in jack_files(argument_path):
+        try:
+            stat = os.stat(input_path)
+        except OSError:
+            # deleted while listing
             continue
-        output_path = filename + ".vm"
-        with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            compile_file(input_file, output_file)  
+        stamps[input_path] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+def watch(args: argparse.Namespace) -> int:
+    """Build, then rebuild whenever a source is added, saved or removed,
+    until interrupted.
+
+    Sources are polled for their mtime and size every `WATCH_INTERVAL`
+    seconds, and again right after each rebuild, so that a source saved
+    while it ran is rebuilt at once. Each rebuild goes through the build
+    cache, which is kept loaded, so only the changed classes and the
+    classes calling members whose signature changed are compiled.
+
+    Returns:
+        The exit status of the last build.
+    """
+    argument_path = os.path.abspath(args.path)
+    caches: dict[tuple, BuildCache] = {}
+    stamps: dict[str, tuple[int, int]] = None
+    status = 0
+    try:
+        while True:
+            # taken before building: a save during the build shows up next
+            current = snapshot(argument_path)
+            if current == stamps:
+                time.sleep(WATCH_INTERVAL)
+                continue
+            previous = stamps or {}
+            changed = [path for path in current.keys() | previous.keys()
+                       if current.get(path) != previous.get(path)]
+            stamps = current
+            start = time.perf_counter()
+            results = run(args, caches)
+            status = finish(args, results)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"[{time.strftime('%H:%M:%S')}] "
+                  f"{len(changed)} source(s) changed, "
+                  f"compiled {len(results)} file(s) in {elapsed:.1f} ms",
+                  flush=True)
+    except KeyboardInterrupt:
+        return status
+
+
+def main(argv: list[str] = None) -> int:
+    """Command-line entry point.
+
+    Returns:
+        The process exit status.
+    """
+    args = parse_arguments(argv)
+    if args.watch:
+        return watch(args)
+    return finish(args, run(args))
+
+
+if "__main__" == __name__:
+    sys.exit(main())
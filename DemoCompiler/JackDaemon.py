@@ -0,0 +1,231 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Persistent compile daemon.
+
+The daemon listens on a local Unix socket and compiles in a warm process:
+modules are imported, class-level tables built and build caches loaded
+once, and then reused by every request (see `JackCompiler.build`).
+
+The protocol is one JSON object per line, each way. Requests:
+- {"argv": [...], "cwd": DIR}: runs `JackCompiler` with this command line,
+  from DIR. The response has "status" (the exit status), "stdout" and
+  "stderr" (what the command would have printed), "diagnostics" (a list
+  of {"path", "message"}) and "outputs" (the files written).
+- {"source": TEXT, "options": {...}}: compiles one class held in memory,
+  with `compile_file` options. The response has "status", "diagnostics",
+  "class" and "code" (the VM code).
+- {"sources": {NAME: TEXT, ...}, "options": {...}}: compiles classes held
+  in memory together (`JackCompiler.compile_many`). The response has
+  "status", "diagnostics" and "code" (the VM code of each class, by name,
+  for those that compiled).
+The diagnostics of in-memory requests also have "severity", "kind", and
+the "line" and "column" of an error in the source, or null (see
+Diagnostics.py).
+- {"command": "ping"} or {"command": "shutdown"}.
+
+Requests are served one at a time, so they never share the caches or the
+working directory. `JackClient.py` is the matching client.
+
+Usage:
+    python JackDaemon.py [--socket PATH] [--stop]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import typing
+import JackClient
+import JackCompiler
+from Diagnostics import CompileError, Diagnostic
+
+
+def compile_command(argv: list[str], cwd: str,
+                    caches: dict) -> dict[str, typing.Any]:
+    """Run a `JackCompiler` command line, as if from the given directory."""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    response: dict[str, typing.Any] = {"diagnostics": [], "outputs": []}
+    previous = os.getcwd()
+    try:
+        os.chdir(cwd)
+        with contextlib.redirect_stdout(stdout), \
+                contextlib.redirect_stderr(stderr):
+            try:
+                args = JackCompiler.parse_arguments(argv)
+                if args.watch:
+                    # it would never answer
+                    print("JackDaemon: --watch is not served by the daemon",
+                          file=sys.stderr)
+                    raise SystemExit(2)
+                results = JackCompiler.run(args, caches)
+                response["status"] = JackCompiler.finish(args, results)
+            except SystemExit as error:
+                # usage errors, --help
+                response["status"] = error.code or 0
+                results = {}
+    finally:
+        os.chdir(previous)
+    for path, result in results.items():
+        if result["error"] is not None:
+            response["diagnostics"].append(
+                {"path": path, "message": result["error"]})
+        elif path.endswith(".jack"):
+            output = result.get("output", JackCompiler.output_path_for(path))
+            if output not in response["outputs"]:
+                response["outputs"].append(output)
+        else:
+            response["outputs"].append(path)
+    response["stdout"] = stdout.getvalue()
+    response["stderr"] = stderr.getvalue()
+    return response
+
+
+def compile_source(source: str,
+                   options: dict[str, typing.Any]) -> dict[str, typing.Any]:
+    """Compile one class held in memory."""
+    output = io.StringIO()
+    try:
+        engine = JackCompiler.compile_file(io.StringIO(source), output,
+                                           **options)
+    except Exception as error:
+        return {"status": 1, "class": None, "code": "", "diagnostics": [
+            Diagnostic.from_exception(None, error).to_dict()]}
+    return {"status": 0, "class": engine.class_name,
+            "code": output.getvalue(), "diagnostics": []}
+
+
+def compile_sources(sources: dict[str, str],
+                    options: dict[str, typing.Any]) -> dict[str, typing.Any]:
+    """Compile classes held in memory together."""
+    diagnostics: list[Diagnostic] = []
+    try:
+        code = JackCompiler.compile_many(sources, diagnostics, **options)
+        status = 0
+    except CompileError as error:
+        code = error.outputs
+        status = 1
+    return {"status": status, "code": code,
+            "diagnostics": [diagnostic.to_dict() for diagnostic in diagnostics]}
+
+
+class CompileHandler(socketserver.StreamRequestHandler):
+    """Serves the requests of one connection, one JSON line each."""
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            request: dict[str, typing.Any] = {}
+            try:
+                request = json.loads(line)
+                response = self.server.dispatch(request)
+            except Exception as error:
+                response = {"status": 1, "diagnostics": [
+                    {"path": None,
+                     "message": f"{type(error).__name__}: {error}"}]}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+            if request.get("command") == "shutdown":
+                return
+
+
+class CompileServer(socketserver.UnixStreamServer):
+    """A Unix socket server holding warm compiler state."""
+
+    def __init__(self, socket_path: str) -> None:
+        # the build caches of every directory and options compiled so far
+        self.caches: dict[tuple, typing.Any] = {}
+        self.stopping = False
+        super().__init__(socket_path, CompileHandler)
+
+    def dispatch(self, request: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        """Serve one request and return its response."""
+        command = request.get("command")
+        if command == "ping":
+            return {"status": 0, "pid": os.getpid()}
+        if command == "shutdown":
+            self.stopping = True
+            return {"status": 0}
+        if "argv" in request:
+            return compile_command(request["argv"], request["cwd"],
+                                   self.caches)
+        if "sources" in request:
+            return compile_sources(request["sources"],
+                                   request.get("options", {}))
+        if "source" in request:
+            return compile_source(request["source"],
+                                  request.get("options", {}))
+        raise ValueError("unknown request")
+
+
+def claim_socket(socket_path: str) -> None:
+    """Remove a socket file left behind by a server that died.
+
+    Raises:
+        OSError: If a server is listening on the socket.
+    """
+    if os.path.exists(socket_path):
+        probe = socket.socket(socket.AF_UNIX)
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.unlink(socket_path)
+        else:
+            probe.close()
+            raise OSError(f"a server is already listening on {socket_path}")
+
+
+def serve(socket_path: str) -> None:
+    """Serve compile requests on a Unix socket until asked to shut down.
+
+    Raises:
+        OSError: If another daemon is listening on the socket.
+    """
+    claim_socket(socket_path)
+    server = CompileServer(socket_path)
+    try:
+        while not server.stopping:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+
+
+def main(argv: list[str] = None) -> int:
+    """Command-line entry point.
+
+    Returns:
+        The process exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="JackDaemon",
+        description="Serves Jack compile requests on a Unix socket.")
+    parser.add_argument("--socket", default=JackClient.default_socket_path(),
+                        help="the socket path (default: $"
+                             f"{JackClient.SOCKET_VARIABLE} or %(default)s)")
+    parser.add_argument("--stop", action="store_true",
+                        help="ask the running daemon to shut down")
+    args = parser.parse_args(argv)
+    try:
+        if args.stop:
+            JackClient.request({"command": "shutdown"}, args.socket)
+        else:
+            serve(args.socket)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if "__main__" == __name__:
+    sys.exit(main())
@@ -0,0 +1,473 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Asyncio compile service.
+
+`compile_async` is the asyncio counterpart of `JackCompiler.compile_source`
+and `JackCompiler.compile_many`: it compiles without blocking the event
+loop, in the worker processes of a `CompileService`, or by default in a
+worker process of its own. Either way a deadline bounds the compilation,
+so untrusted sources are safe to compile.
+
+A `CompileService` keeps a pool of worker processes, each compiling one
+request at a time. Requests wait in a bounded queue for a free worker; a
+request that finds the queue full is rejected at once (`asyncio.QueueFull`).
+Each request has a deadline, queueing included (`TimeoutError`). A worker
+that misses it is killed and replaced: the compiler can loop forever on
+malformed input, so a worker cannot simply be left to finish.
+`CompileService.metrics` reports the queue depth and latency percentiles.
+
+`serve` exposes a service on a Unix socket, and optionally on a local TCP
+port, with the JSON-line protocol of `JackDaemon` for in-memory sources:
+- {"source": TEXT, "options": {...}} and
+  {"sources": {NAME: TEXT, ...}, "options": {...}}: the response has
+  "status", "code" (the VM code, by name for "sources") and "diagnostics"
+  (see Diagnostics.py).
+- {"command": "metrics"}, {"command": "ping"} or {"command": "shutdown"}.
+Requests on one connection are answered in order; concurrent clients open
+a connection each. `request_async` is a matching client.
+
+Usage:
+    python JackService.py [--socket PATH] [--port N] [--workers N]
+                          [--queue N] [--timeout SECONDS]
+    python JackService.py --metrics | --stop
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import typing
+import Diagnostics
+import JackCompiler
+from Diagnostics import CompileError, Diagnostic
+
+SOCKET_VARIABLE = "JACK_SERVICE_SOCKET"
+DEFAULT_QUEUE = 64
+DEFAULT_TIMEOUT = 10.0
+# The longest request or response line, e.g. the VM code of a large batch.
+LINE_LIMIT = 64 * 1024 * 1024
+# Latencies kept for the percentiles.
+LATENCY_WINDOW = 1000
+PERCENTILES = (50, 90, 99)
+
+
+def default_socket_path() -> str:
+    """Return the socket path used when none is given: one per user."""
+    return os.environ.get(SOCKET_VARIABLE) or os.path.join(
+        tempfile.gettempdir(), f"jackservice-{os.getuid()}.sock")
+
+
+def compile_request(request: dict[str, typing.Any]) -> dict[str, typing.Any]:
+    """Serve one compile request, in a worker process.
+
+    Returns:
+        The response: "status", "code" and "diagnostics".
+    """
+    diagnostics: list[Diagnostic] = []
+    batch = "sources" in request
+    code: typing.Any = {} if batch else ""
+    status = 1
+    try:
+        if batch:
+            code = JackCompiler.compile_many(
+                request["sources"], diagnostics, **request.get("options", {}))
+        else:
+            code = JackCompiler.compile_source(
+                request["source"], diagnostics, **request.get("options", {}))
+        status = 0
+    except CompileError as error:
+        if batch:
+            code = error.outputs
+    except Exception as error:
+        # e.g. unknown options
+        diagnostics.append(Diagnostic.from_exception(None, error))
+    return {"status": status, "code": code,
+            "diagnostics": [diagnostic.to_dict() for diagnostic in diagnostics]}
+
+
+def work() -> None:
+    """Worker process loop: one JSON request per line of stdin, one JSON
+    response per line of stdout."""
+    for line in sys.stdin:
+        sys.stdout.write(json.dumps(compile_request(json.loads(line))) + "\n")
+        sys.stdout.flush()
+
+
+class Worker:
+    """A worker process, serving one request at a time over pipes."""
+
+    def __init__(self, process: asyncio.subprocess.Process) -> None:
+        self.process = process
+
+    @classmethod
+    async def start(cls) -> "Worker":
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--worker",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            limit=LINE_LIMIT)
+        return cls(process)
+
+    async def request(self, message: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        """Send one request and return the response.
+
+        Raises:
+            ConnectionError: If the process died.
+        """
+        self.process.stdin.write(json.dumps(message).encode() + b"\n")
+        await self.process.stdin.drain()
+        line = await self.process.stdout.readline()
+        if not line:
+            raise ConnectionError("the worker process died")
+        return json.loads(line)
+
+    async def stop(self) -> None:
+        """Kill the process and wait for it."""
+        if self.process.returncode is None:
+            self.process.kill()
+        await self.process.wait()
+
+
+def percentile(ordered: list[float], rank: float) -> float:
+    """Return the nearest-rank percentile of sorted values (0 if none)."""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(rank / 100 * len(ordered)) - 1)]
+
+
+class CompileService:
+    """A pool of compile worker processes behind a bounded queue.
+
+    Use it as an async context manager, which starts and stops the workers.
+    """
+
+    def __init__(self, workers: int = None, max_queue: int = DEFAULT_QUEUE,
+                 timeout: float = DEFAULT_TIMEOUT) -> None:
+        """
+        Args:
+            workers: Number of worker processes; defaults to the number of
+                cores.
+            max_queue: How many requests may wait for a worker; more are
+                rejected. With 0, a request is only served if a worker is
+                idle.
+            timeout: Seconds a request may take, waiting included.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.idle: asyncio.Queue = asyncio.Queue()
+        self.busy: set[Worker] = set()
+        self.replacing: set[asyncio.Task] = set()
+        self.waiting = 0
+        self.counts = dict.fromkeys(
+            ("requests", "failed", "timeouts", "rejected", "restarts"), 0)
+        self.latencies: collections.deque = collections.deque(
+            maxlen=LATENCY_WINDOW)
+
+    async def __aenter__(self) -> "CompileService":
+        for worker in await asyncio.gather(
+                *(Worker.start() for _ in range(self.workers))):
+            self.idle.put_nowait(worker)
+        return self
+
+    async def __aexit__(self, *exc_info: typing.Any) -> None:
+        await asyncio.gather(*self.replacing)
+        workers = list(self.busy)
+        while not self.idle.empty():
+            workers.append(self.idle.get_nowait())
+        await asyncio.gather(*(worker.stop() for worker in workers))
+
+    async def compile(self, request: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        """Compile a {"source"} or {"sources"} request in a worker.
+
+        Returns:
+            The response (see `compile_request`).
+
+        Raises:
+            asyncio.QueueFull: If no worker is idle and `max_queue` requests
+                are already waiting.
+            TimeoutError: If the request takes more than `timeout` seconds.
+        """
+        if self.idle.empty() and self.waiting >= self.max_queue:
+            self.counts["rejected"] += 1
+            raise asyncio.QueueFull(
+                f"{self.waiting} requests are already waiting")
+        start = time.perf_counter()
+        self.counts["requests"] += 1
+        try:
+            response = await self.run(request, start + self.timeout)
+        except asyncio.TimeoutError:
+            self.counts["failed"] += 1
+            self.counts["timeouts"] += 1
+            raise
+        except ConnectionError:
+            self.counts["failed"] += 1
+            raise
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+        if response["status"]:
+            self.counts["failed"] += 1
+        return response
+
+    async def run(self, request: dict[str, typing.Any],
+                  deadline: float) -> dict[str, typing.Any]:
+        """Wait for a free worker and have it serve the request, both by
+        the deadline. A worker that misses it, or dies, is replaced."""
+        if self.waiting == 0 and not self.idle.empty():
+            worker = self.idle.get_nowait()
+        else:
+            self.waiting += 1
+            try:
+                worker = await asyncio.wait_for(
+                    self.idle.get(), deadline - time.perf_counter())
+            finally:
+                self.waiting -= 1
+        self.busy.add(worker)
+        try:
+            response = await asyncio.wait_for(
+                worker.request(request), deadline - time.perf_counter())
+        except BaseException:
+            self.busy.discard(worker)
+            self.counts["restarts"] += 1
+            # replace it in the background: the caller is done waiting
+            task = asyncio.get_running_loop().create_task(self.replace(worker))
+            self.replacing.add(task)
+            task.add_done_callback(self.replacing.discard)
+            raise
+        self.busy.discard(worker)
+        self.idle.put_nowait(worker)
+        return response
+
+    async def replace(self, worker: Worker) -> None:
+        await worker.stop()
+        self.idle.put_nowait(await Worker.start())
+
+    def metrics(self) -> dict[str, typing.Any]:
+        """Return the service's counters, queue depth and latencies (ms,
+        over the last `LATENCY_WINDOW` requests)."""
+        ordered = sorted(self.latencies)
+        latency_ms = {f"p{rank}": percentile(ordered, rank) * 1000
+                      for rank in PERCENTILES}
+        latency_ms["max"] = ordered[-1] * 1000 if ordered else 0.0
+        return {"workers": self.workers, "busy": len(self.busy),
+                "queue_depth": self.waiting, "queue_limit": self.max_queue,
+                **self.counts, "latency_ms": latency_ms}
+
+
+async def compile_async(sources: typing.Union[str, dict[str, str]],
+                        service: CompileService = None,
+                        diagnostics: list[Diagnostic] = None,
+                        timeout: float = DEFAULT_TIMEOUT,
+                        **options: typing.Any) -> typing.Union[str, dict[str, str]]:
+    """Compile without blocking the event loop.
+
+    Args:
+        sources: One class's source, compiled as `compile_source` does, or
+            sources by name, compiled together as `compile_many` does.
+        service: Compile in its worker processes, by its timeout; by
+            default, in a worker process started for this call. Never in
+            a thread: that could not be stopped if the compiler looped.
+        diagnostics: If given, every diagnostic is appended to it.
+        timeout: Seconds the compilation may take without a service.
+        **options: Passed on to `compile_file`.
+
+    Returns:
+        As `compile_source` or `compile_many`.
+
+    Raises:
+        CompileError: If a class does not compile.
+        asyncio.QueueFull, TimeoutError: As `CompileService.compile`.
+    """
+    if service is None:
+        async with CompileService(workers=1, timeout=timeout) as service:
+            return await compile_async(sources, service, diagnostics, **options)
+    batch = isinstance(sources, dict)
+    response = await service.compile(
+        {"sources" if batch else "source": sources, "options": options})
+    found = [Diagnostic(**diagnostic) for diagnostic in response["diagnostics"]]
+    if diagnostics is not None:
+        diagnostics.extend(found)
+    if response["status"]:
+        raise CompileError(found, response["code"] if batch else {})
+    return response["code"]
+
+
+def error_response(error: BaseException, message: str = None) -> dict[str, typing.Any]:
+    """Return the response to a request that failed with `error`."""
+    diagnostic = Diagnostic.from_exception(None, error)
+    if message is not None:
+        diagnostic.message = message
+    return {"status": 1, "diagnostics": [diagnostic.to_dict()]}
+
+
+async def serve(socket_path: str, port: int = None,
+                **settings: typing.Any) -> None:
+    """Serve compile requests until asked to shut down.
+
+    Args:
+        socket_path: The Unix socket to listen on.
+        port: If given, also listen on this TCP port of 127.0.0.1.
+        **settings: Passed on to `CompileService`.
+
+    Raises:
+        OSError: If another server is listening on the socket.
+    """
+    # only the server needs it, not the workers
+    import JackDaemon
+    JackDaemon.claim_socket(socket_path)
+    stopping = asyncio.Event()
+    async with CompileService(**settings) as service:
+
+        async def respond(request: dict[str, typing.Any]) -> dict[str, typing.Any]:
+            command = request.get("command")
+            if command == "ping":
+                return {"status": 0, "pid": os.getpid()}
+            if command == "metrics":
+                return {"status": 0, "metrics": service.metrics()}
+            if command == "shutdown":
+                stopping.set()
+                return {"status": 0}
+            if "source" not in request and "sources" not in request:
+                raise ValueError("unknown request")
+            try:
+                return await service.compile(request)
+            except asyncio.TimeoutError as error:
+                return error_response(
+                    error, f"compiling took more than {service.timeout} s")
+
+        async def handle(reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter) -> None:
+            try:
+                while not stopping.is_set():
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        response = await respond(json.loads(line))
+                    except Exception as error:
+                        response = error_response(error)
+                    writer.write(json.dumps(response).encode() + b"\n")
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        servers = [await asyncio.start_unix_server(
+            handle, socket_path, limit=LINE_LIMIT)]
+        try:
+            if port is not None:
+                servers.append(await asyncio.start_server(
+                    handle, "127.0.0.1", port, limit=LINE_LIMIT))
+            await stopping.wait()
+        finally:
+            for server in servers:
+                server.close()
+            os.unlink(socket_path)
+
+
+async def request_async(message: dict[str, typing.Any],
+                        socket_path: str = None) -> dict[str, typing.Any]:
+    """Send one request to a service and return its response.
+
+    Raises:
+        OSError: If no service answers on the socket.
+    """
+    reader, writer = await asyncio.open_unix_connection(
+        socket_path or default_socket_path(), limit=LINE_LIMIT)
+    try:
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        line = await reader.readline()
+    finally:
+        writer.close()
+    if not line:
+        raise ConnectionError("the service closed the connection")
+    return json.loads(line)
+
+
+def non_negative_int(text: str) -> int:
+    """argparse type of a count that may be 0."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = -1
+    if value < 0:
+        raise argparse.ArgumentTypeError(f"not a non-negative integer: {text}")
+    return value
+
+
+def positive_float(text: str) -> float:
+    """argparse type of a duration that must be more than 0."""
+    try:
+        value = float(text)
+    except ValueError:
+        value = 0.0
+    if not 0 < value < math.inf:
+        raise argparse.ArgumentTypeError(f"not a positive number: {text}")
+    return value
+
+
+def main(argv: list[str] = None) -> int:
+    """Command-line entry point.
+
+    Returns:
+        The process exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="JackService",
+        description="Serves asyncio Jack compile requests on a Unix socket.")
+    parser.add_argument("--socket", default=default_socket_path(),
+                        help=f"the socket path (default: ${SOCKET_VARIABLE} "
+                             "or %(default)s)")
+    parser.add_argument("--port", type=int, default=None,
+                        help="also listen on this TCP port of 127.0.0.1")
+    parser.add_argument("--workers", type=JackCompiler.positive_int,
+                        default=None,
+                        help="worker processes (default: all cores)")
+    parser.add_argument("--queue", type=non_negative_int, default=DEFAULT_QUEUE,
+                        help="requests that may wait for a worker "
+                             "(default %(default)s)")
+    parser.add_argument("--timeout", type=positive_float, default=DEFAULT_TIMEOUT,
+                        help="seconds a request may take "
+                             "(default %(default)s)")
+    parser.add_argument("--metrics", action="store_true",
+                        help="print the metrics of the running service")
+    parser.add_argument("--stop", action="store_true",
+                        help="ask the running service to shut down")
+    parser.add_argument("--worker", action="store_true",
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        work()
+        return 0
+    try:
+        if args.metrics or args.stop:
+            command = "metrics" if args.metrics else "shutdown"
+            response = asyncio.run(request_async({"command": command},
+                                                 args.socket))
+            if args.metrics:
+                print(json.dumps(response["metrics"], indent=2))
+        else:
+            asyncio.run(serve(args.socket, args.port, workers=args.workers,
+                              max_queue=args.queue, timeout=args.timeout))
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if "__main__" == __name__:
+    sys.exit(main())
@@ -16,35 +16,103 @@ It handles:
 
 The public API matches the nand2tetris spec: `has_more_tokens`, `advance`,
 `token_type`, and token accessors (`keyword`, `symbol`, etc.).
+
+Every token is classified once, when the tokenizer is built, into the
+parallel `type_codes` / `values` arrays, so all accessors are O(1).
+
+In streaming mode the input is instead scanned lazily, line by line, by
+`scan_tokens`, keeping only the current line and one token of lookahead in
+memory. It accepts text/binary files as well as `mmap` buffers.
+
+`position` locates the current token in the source, for error messages:
+the streaming scanner notes where each token starts, while an up-front
+tokenizer keeps the source and scans it again, only when asked.
 """
 
+import io
 import typing
 import re
+import sys
+import mmap
+from array import array
 
 NOTES = "//#*"
+
+# Token type codes stored in `JackTokenizer.type_codes`.
+# INVALID marks a token that matches no lexical element (token_type() is None).
+INVALID, KEYWORD, SYMBOL, IDENTIFIER, INT_CONST, STRING_CONST = range(6)
+TOKEN_TYPES = (None, "KEYWORD", "SYMBOL", "IDENTIFIER", "INT_CONST", "STRING_CONST")
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+# VM commands of the binary and unary operators.
+ARITHMETIC = {'+': 'add', '-': 'sub', '*': 'call Math.multiply 2',
+              '/': 'call Math.divide 2', '&': 'and', '|': 'or', '<': 'lt',
+              '>': 'gt', '=': 'eq'}
+UNARY_ARITHMETIC = {'~': "not", '-': "neg"}
+
+# Used by the streaming scanner. Groups: 1 = line comment, 2 = block comment
+# start, 3 = string constant (quotes kept), 4 = symbol, 5 = any other word.
+_SYMBOLS = re.escape("{}()[].,;+-*/&|<>=~^#")
+SCAN_PATTERN = re.compile(
+    r'\s*(?:(//)|(/\*)|("[^"\n]*"?)|([' + _SYMBOLS + r'])|([^\s"' + _SYMBOLS + r']+))')
+
+# Used by `split_keep_delimiters`: quoted substrings, and symbols.
+QUOTED_PATTERN = re.compile(r'"(.*?)"')
+DELIMITER_PATTERN = re.compile(r'([' + _SYMBOLS + r'])')
+BLOCK_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+
 class JackTokenizer:
 
     keyword_list = ["class", "constructor", "function", "method", "field", "static", "var", "int", "char", "boolean", "void", "true", "false", "null",
                         "this", "let", "do", "if", "else", "while", "return"]
     symbol_list = ["{", "}", "(", ")", "[", "]", ".", ",", ";", "+", "-", "*", "/", "&", "|", "<", ">", "=", "~", "^", "#"]
     geresh = '"'
+    keyword_set = frozenset(keyword_list)
+    symbol_set = frozenset(symbol_list)
 
-    def __init__(self, input_stream: typing.TextIO) -> None:
+    def __init__(self, input_stream: typing.TextIO, streaming: bool = False) -> None:
         """Opens the input stream and gets ready to tokenize it.
 
         Args:
             input_stream (typing.TextIO): input stream.
+            streaming (bool): scan the input lazily instead of tokenizing it
+                all up front.
         """
         self.total_count = 0
         self.cur_count = -1
         self.cur_token:str = None
+        self.cur_type: int = INVALID
+        self.cur_value: typing.Any = None
         self.all_words = list()
-        text = input_stream.read()
+        self.type_codes = array("B")
+        self.values = list()
+        self.token_stream: typing.Iterator[str] = None
+        self.lookahead: str = None
+        # The source, up front, or where the scanner's tokens start, streaming.
+        self.source: str = None
+        self.scan_line = self.scan_column = 0
+        self.cur_line: int = None
+        self.cur_column: int = None
+
+        if streaming:
+            self.token_stream = self.scan_tokens(input_stream)
+            self.lookahead = next(self.token_stream, None)
+            # The real count is only known once the scanner runs dry.
+            self.total_count = sys.maxsize if self.lookahead is not None else 0
+        else:
+            self.load_tokens(input_stream)
+
+    def load_tokens(self, input_stream: typing.TextIO) -> None:
+        """Tokenize and classify the whole input up front.
+
+        Args:
+            input_stream: The Jack source to read.
+        """
+        text = self.source = input_stream.read()
         text = self.remove_block_comments(text)
         lines = text.splitlines()
         self.input_lines = list()
-        self.words = []
-
 
         for i in range (0, len(lines)): # striping each line from useless spaces
             lines[i] = lines[i].strip()
@@ -58,15 +126,42 @@ class JackTokenizer:
         self.remove_line_comments()
 
         for i in range (len(self.input_lines)):
-            line = []
-            cur_words = self.split_keep_delimiters(self.input_lines[i])
-            for word in cur_words:
-                self.all_words.append(word)
-            line.append(cur_words)
-            self.words.append(line)
+            self.all_words.extend(self.split_keep_delimiters(self.input_lines[i]))
 
         self.total_count = len(self.all_words)
 
+        # Classify every token once; the accessors only index these arrays.
+        for i in range(self.total_count):
+            code, value = self.classify(self.all_words[i])
+            if code == KEYWORD or code == SYMBOL or code == IDENTIFIER:
+                self.all_words[i] = value
+            self.type_codes.append(code)
+            self.values.append(value)
+
+    def classify(self, token: str) -> tuple[int, typing.Any]:
+        """Classify a raw token.
+
+        Args:
+            token: A token as produced by `split_keep_delimiters`.
+
+        Returns:
+            (type_code, value) where value is what `which_token` returns for
+            this token: the keyword/symbol/identifier text (interned), the
+            integer value, or the string constant without its quotes.
+        """
+        if token in self.keyword_set:
+            return KEYWORD, sys.intern(token)
+        elif token in self.symbol_set:
+            return SYMBOL, sys.intern(token)
+        elif token[0] == self.geresh:
+            return STRING_CONST, token.strip('"\n')
+        elif token.isdigit() and 0 <= int(token) <= 32767:
+            return INT_CONST, int(token)
+        elif IDENTIFIER_PATTERN.fullmatch(token):
+            return IDENTIFIER, sys.intern(token)
+        else:
+            return INVALID, None
+
     def split_keep_delimiters(self, cur_string: str) -> list[str]:
         """Split a source line into tokens while keeping symbols as tokens.
 
@@ -81,13 +176,8 @@ class JackTokenizer:
             A list of tokens (keywords, identifiers, symbols, integer constants,
             and string constants).
         """
-        # Regular expression to match quoted substrings
-        quoted_pattern = r'"(.*?)"'
-        # Regular expression to match delimiters
-        delimiter_pattern = r'([' + ''.join(re.escape(delimiter) for delimiter in self.symbol_list) + '])'
-
         # Split the string on quoted substrings
-        parts = re.split(quoted_pattern, cur_string)
+        parts = QUOTED_PATTERN.split(cur_string)
 
         new_parts = list()
         inside_quote = False
@@ -98,7 +188,7 @@ class JackTokenizer:
                 new_parts.append('"' + part + '"')
             else:
                 # Split non-quoted part by delimiters
-                sub_parts = re.split(delimiter_pattern, part)
+                sub_parts = DELIMITER_PATTERN.split(part)
                 for sub_part in sub_parts:
                     sub_part = sub_part.strip()
                     if sub_part:
@@ -122,7 +212,6 @@ class JackTokenizer:
         new_lines = []
 
         for line in self.input_lines:
-            new_line = ""
             i = 0
             while i < len(line):
                 if line[i] == '"' or line[i] == "'":
@@ -130,21 +219,81 @@ class JackTokenizer:
                         in_string = line[i]
                     elif in_string == line[i]:
                         in_string = False
-                    new_line += line[i]
                 elif line[i:i+2] == '//' and not in_string:
                     break
-                else:
-                    new_line += line[i]
                 i += 1
-            new_lines.append(new_line.strip())
+            new_lines.append(line[:i].strip())
 
         self.input_lines = new_lines
 
     def remove_block_comments(self, text: str) -> str:
         """Remove all block comments (/* ... */) from the text."""
-        pattern = r'/\*.*?\*/'
-        return re.sub(pattern, '', text, flags=re.DOTALL)
+        return BLOCK_COMMENT_PATTERN.sub('', text)
+
 
+    def scan_tokens(self, input_stream: typing.Any) -> typing.Iterator[str]:
+        """Lazily split the input into raw tokens, one line at a time.
+
+        This is a plain Jack lexer: it skips whitespace, `//` and `/* ... */`
+        comments (which may span lines), and yields string constants with
+        their quotes, symbols, and maximal runs of any other characters,
+        exactly like `split_keep_delimiters` does for a single line. As in
+        `load_tokens`, a line whose first token (block comments aside)
+        starts with one of `NOTES` is dropped.
+
+        Args:
+            input_stream: A text or binary file, or an `mmap` buffer.
+
+        Yields:
+            Raw tokens, to be classified by `classify`. `scan_line` and
+            `scan_column` hold where the last one starts.
+        """
+        if isinstance(input_stream, mmap.mmap):
+            lines = iter(input_stream.readline, b"")
+        else:
+            lines = input_stream
+        in_comment = False
+        skipping = False
+        for number, line in enumerate(lines, 1):
+            if isinstance(line, bytes):
+                line = line.decode()
+            self.scan_line = number
+            if not in_comment:
+                # A block comment spanning lines joins them into one line.
+                line_start, skipping = True, False
+            pos = 0
+            end = len(line)
+            while pos < end:
+                if in_comment:
+                    close = line.find("*/", pos)
+                    if close < 0:
+                        break
+                    pos = close + 2
+                    in_comment = False
+                    continue
+                if skipping:
+                    # Drop the rest of the line, but still follow comments.
+                    start = line.find("/*", pos)
+                    if start < 0:
+                        break
+                    pos = start + 2
+                    in_comment = True
+                    continue
+                match = SCAN_PATTERN.match(line, pos)
+                if match is None or match.group(1) is not None:
+                    # Only whitespace, or a line comment, is left.
+                    break
+                elif match.group(2) is not None:
+                    in_comment = True
+                else:
+                    token = match.group(match.lastindex)
+                    if line_start and token[0] in NOTES:
+                        skipping = True
+                    else:
+                        self.scan_column = match.start(match.lastindex) + 1
+                        yield token
+                    line_start = False
+                pos = match.end()
 
     def has_more_tokens(self) -> bool:
         """Do we have more tokens in the input?
@@ -160,11 +309,51 @@ class JackTokenizer:
         Initially there is no current token.
         """
         self.cur_count += 1
-        if self.cur_count == 0:
+        if self.token_stream is not None:
+            if self.lookahead is not None:
+                self.cur_type, self.cur_value = self.classify(self.lookahead)
+                if self.cur_type == KEYWORD or self.cur_type == SYMBOL or self.cur_type == IDENTIFIER:
+                    self.cur_token = self.cur_value
+                else:
+                    self.cur_token = self.lookahead
+                self.cur_line = self.scan_line
+                self.cur_column = self.scan_column
+                self.lookahead = next(self.token_stream, None)
+                if self.lookahead is None:
+                    self.total_count = self.cur_count + 1
+        elif self.cur_count < self.total_count:
             self.cur_token = self.all_words[self.cur_count]
+            self.cur_type = self.type_codes[self.cur_count]
+            self.cur_value = self.values[self.cur_count]
 
-        elif self.has_more_tokens():
-            self.cur_token = self.all_words[self.cur_count]
+    def position(self) -> typing.Optional[tuple[int, int]]:
+        """
+        Returns:
+            (line, column) of the current token in the source, both counted
+            from 1; past the end, those of the last token. None before the
+            first token, or if there is none.
+        """
+        if self.token_stream is not None:
+            return None if self.cur_line is None else (self.cur_line, self.cur_column)
+        if self.cur_count < 0 or self.total_count == 0:
+            return None
+        # the scanner yields the same tokens as `load_tokens`
+        scanner = JackTokenizer(io.StringIO(self.source), streaming=True)
+        for _ in range(min(self.cur_count, self.total_count - 1) + 1):
+            scanner.advance()
+        return scanner.position()
+
+    def peek(self) -> typing.Any:
+        """
+        Returns:
+            the value of the token after the current one, as `which_token`
+            would return it, or None at the end of the input.
+        """
+        if self.token_stream is not None:
+            return None if self.lookahead is None else self.classify(self.lookahead)[1]
+        if self.cur_count + 1 < self.total_count:
+            return self.values[self.cur_count + 1]
+        return None
 
     def token_type(self) -> str:
         """
@@ -172,31 +361,24 @@ class JackTokenizer:
             str: the type of the current token, can be
             "KEYWORD", "SYMBOL", "IDENTIFIER", "INT_CONST", "STRING_CONST"
         """
-        if self.cur_token in self.keyword_list:
-            return "KEYWORD"
-        elif self.cur_token in self.symbol_list:
-            return "SYMBOL"
-        elif self.cur_token[0] == self.geresh:
-            return "STRING_CONST"
-        elif self.cur_token.isdigit() and 0 <= int(self.cur_token) <= 32767:
-            return "INT_CONST"
-        elif self.check_identifier():
-            return "IDENTIFIER"
-        else:
-            ""
-
-    def which_token(self) -> str:
-        token_type = self.token_type()
-        if token_type == "KEYWORD":
-            return self.keyword().lower()
-        elif token_type == "SYMBOL":
-            return self.symbol()
-        elif token_type == "IDENTIFIER":
-            return self.identifier()
-        elif token_type == "INT_CONST":
-            return self.int_val()
-        elif token_type == "STRING_CONST":
-            return self.string_val()
+        return TOKEN_TYPES[self.cur_type]
+
+    def token_code(self) -> int:
+        """
+        Returns:
+            int: the type code of the current token (`KEYWORD`, `SYMBOL`,
+            `IDENTIFIER`, `INT_CONST`, `STRING_CONST` or `INVALID`).
+        """
+        return self.cur_type
+
+    def which_token(self) -> typing.Any:
+        """
+        Returns:
+            the value of the current token: keywords, symbols and identifiers
+            as text, integer constants as int, and string constants without
+            their quotes.
+        """
+        return self.cur_value
 
     def check_identifier(self) -> bool:
         """Validate that the current token is a legal Jack identifier.
@@ -206,13 +388,7 @@ class JackTokenizer:
         - May NOT start with a digit.
         - Keywords are handled separately before this check.
         """
-        numbers_l = "1234567890"
-        if self.cur_token[0] in numbers_l:
-            return False
-        for letter in self.cur_token:
-            if not ('a' <= letter <= 'z') and not ('A' <= letter <= 'Z') and not (letter == "_") and letter not in numbers_l:
-                return False
-        return True
+        return IDENTIFIER_PATTERN.fullmatch(self.cur_token) is not None
 
     def keyword(self) -> str:
         """
@@ -223,9 +399,8 @@ class JackTokenizer:
             "BOOLEAN", "CHAR", "VOID", "VAR", "STATIC", "FIELD", "LET", "DO", 
             "IF", "ELSE", "WHILE", "RETURN", "TRUE", "FALSE", "NULL", "THIS"
         """
-        if self.token_type() == "KEYWORD":
-            if self.cur_token in self.keyword_list:
-                return self.cur_token.upper()
+        if self.cur_type == KEYWORD:
+            return self.cur_token.upper()
 
     def symbol(self) -> str:
         """
@@ -236,9 +411,8 @@ class JackTokenizer:
             symbol: '{' | '}' | '(' | ')' | '[' | ']' | '.' | ',' | ';' | '+' | 
               '-' | '*' | '/' | '&' | '|' | '<' | '>' | '=' | '~' | '^' | '#'
         """
-        if self.token_type() == "SYMBOL":
-            if self.cur_token in self.symbol_list:
-                return self.cur_token
+        if self.cur_type == SYMBOL:
+            return self.cur_value
 
     def identifier(self) -> str:
         """
@@ -250,8 +424,8 @@ class JackTokenizer:
                   starting with a digit. You can assume keywords cannot be
                   identifiers, so 'self' cannot be an identifier, etc'.
         """
-        if self.token_type() == "IDENTIFIER":
-            return self.cur_token
+        if self.cur_type == IDENTIFIER:
+            return self.cur_value
 
     def int_val(self) -> int:
         """
@@ -261,8 +435,8 @@ class JackTokenizer:
             Recall that integerConstant was defined in the grammar like so:
             integerConstant: A decimal number in the range 0-32767.
         """
-        if self.token_type() == "INT_CONST":
-            return int(self.cur_token)
+        if self.cur_type == INT_CONST:
+            return self.cur_value
 
     def string_val(self) -> str:
         """
@@ -273,19 +447,15 @@ class JackTokenizer:
             StringConstant: '"' A sequence of Unicode characters not including 
                       double quote or newline '"'
         """
-        if self.token_type() == "STRING_CONST":
-            return self.cur_token.strip('"\n')
+        if self.cur_type == STRING_CONST:
+            return self.cur_value
 
     def get_token(self) -> str:
         """gets the current token"""
         return self.cur_token
 
     def get_arit(self, arit: str) -> str:
-        op_dict1 = {'+': 'add', '-': 'sub','*': 'call Math.multiply 2', '/': 'call Math.divide 2', '&': 'and', '|': 'or','<': 'lt','>': 'gt','=': 'eq'}
-        if arit in op_dict1:
-            return op_dict1[arit]
-    
+        return ARITHMETIC.get(arit)
+
     def get_arit_unary(self, arit: str) -> str:
-        op_dict2 = {'~': "not", '-': "neg"}
-        if arit in op_dict2:
-            return op_dict2[arit]
\ No newline at end of file
+        return UNARY_ARITHMETIC.get(arit)
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Peephole optimizer over the `VMCode` instruction list.
+
+Each subroutine is rewritten until no rule applies. Window rules replace a
+short run of instructions (see `WINDOW_RULES`); function rules look at the
+whole subroutine (`FUNCTION_RULES`). Every rule preserves behavior, given
+how the compiler uses `temp 0`: only as a scratch slot that is always
+written before it is read.
+
+Some redundant-looking sequences are kept on purpose: the `pop temp 0`
+after a `do` discards the value every VM call returns, and `not; if-goto`
+cannot be folded into a single branch because `if-goto` tests for any
+non-zero value, not just `true`.
+"""
+
+import typing
+import VMCode
+from VMCode import (PUSH, POP, ADD, SUB, NEG, OR, NOT, LABEL, GOTO, IF_GOTO,
+                    RETURN, CONSTANT, THAT, POINTER, TEMP, Instruction)
+
+
+def _double_negation(window: list[Instruction]) -> list[Instruction]:
+    # not; not  /  neg; neg
+    if window[0][0] == window[1][0] and window[0][0] in (NOT, NEG):
+        return []
+
+
+def _constant_branch(window: list[Instruction]) -> list[Instruction]:
+    # push constant k; if-goto L  ->  nothing (k = 0) or goto L (k != 0)
+    (opcode, segment, value), (branch, _, label) = window
+    if opcode == PUSH and segment == CONSTANT and branch == IF_GOTO:
+        return [(GOTO, 0, label)] if value != 0 else []
+
+
+def _true_branch(window: list[Instruction]) -> list[Instruction]:
+    # push constant 0; not; if-goto L  ->  goto L
+    (opcode, segment, value), (negate, _, _), (branch, _, label) = window
+    if (opcode == PUSH and segment == CONSTANT and value == 0
+            and negate == NOT and branch == IF_GOTO):
+        return [(GOTO, 0, label)]
+
+
+def _neutral_constant(window: list[Instruction]) -> list[Instruction]:
+    # push constant 0; add|sub|or  ->  nothing
+    (opcode, segment, value), (operation, _, _) = window
+    if (opcode == PUSH and segment == CONSTANT and value == 0
+            and operation in (ADD, SUB, OR)):
+        return []
+
+
+def _push_pop(window: list[Instruction]) -> list[Instruction]:
+    # push x; pop x  ->  nothing
+    (first, segment, index), (second, segment2, index2) = window
+    if (first == PUSH and second == POP and segment == segment2
+            and index == index2):
+        return []
+
+
+def _array_store(window: list[Instruction]) -> list[Instruction]:
+    # push x; pop temp 0; pop pointer 1; push temp 0; pop that 0
+    #   ->  pop pointer 1; push x; pop that 0
+    # unless x is read through (or is) the pointer being overwritten.
+    value, save, address, restore, store = window
+    if (value[0] == PUSH and value[1] != THAT
+            and value[1:] != (POINTER, 1)
+            and save == (POP, TEMP, 0) and address == (POP, POINTER, 1)
+            and restore == (PUSH, TEMP, 0) and store == (POP, THAT, 0)):
+        return [address, value, store]
+
+
+def _remove_jumps_to_next(instructions: list[Instruction]) -> list[Instruction]:
+    """Drop a goto to one of the labels that directly follow it."""
+    result = []
+    for i, instruction in enumerate(instructions):
+        if instruction[0] == GOTO:
+            j = i + 1
+            while j < len(instructions) and instructions[j][0] == LABEL:
+                if instructions[j][2] == instruction[2]:
+                    break
+                j += 1
+            if j < len(instructions) and instructions[j][0] == LABEL:
+                continue
+        result.append(instruction)
+    return result
+
+
+def _remove_unreachable(instructions: list[Instruction]) -> list[Instruction]:
+    """Drop instructions after a goto or return, up to the next label."""
+    result = []
+    reachable = True
+    for instruction in instructions:
+        if instruction[0] == LABEL:
+            reachable = True
+        if reachable:
+            result.append(instruction)
+            if instruction[0] == GOTO or instruction[0] == RETURN:
+                reachable = False
+    return result
+
+
+def _remove_unused_labels(instructions: list[Instruction]) -> list[Instruction]:
+    """Drop labels that no goto / if-goto refers to."""
+    targets = {operand for opcode, _, operand in instructions
+               if opcode == GOTO or opcode == IF_GOTO}
+    return [instruction for instruction in instructions
+            if instruction[0] != LABEL or instruction[2] in targets]
+
+
+def _thread_jumps(instructions: list[Instruction]) -> list[Instruction]:
+    """Retarget jumps to a label that is directly followed by a goto."""
+    forward = {}
+    for i in range(len(instructions) - 1):
+        if instructions[i][0] == LABEL and instructions[i + 1][0] == GOTO:
+            forward[instructions[i][2]] = instructions[i + 1][2]
+    if not forward:
+        return instructions
+    result = []
+    for opcode, arg, operand in instructions:
+        if opcode == GOTO or opcode == IF_GOTO:
+            seen = {operand}
+            while operand in forward and forward[operand] not in seen:
+                operand = forward[operand]
+                seen.add(operand)
+        result.append((opcode, arg, operand))
+    return result
+
+
+# (name, window size, rule): a rule returns the replacement of its window,
+# or None when it does not apply.
+WINDOW_RULES: tuple[tuple[str, int, typing.Callable], ...] = (
+    ("double-negation", 2, _double_negation),
+    ("constant-branch", 2, _constant_branch),
+    ("true-branch", 3, _true_branch),
+    ("neutral-constant", 2, _neutral_constant),
+    ("push-pop", 2, _push_pop),
+    ("array-store", 5, _array_store),
+)
+
+# (name, rule): a rule maps a whole subroutine body to its rewrite.
+FUNCTION_RULES: tuple[tuple[str, typing.Callable], ...] = (
+    ("jump-threading", _thread_jumps),
+    ("jump-to-next", _remove_jumps_to_next),
+    ("unused-label", _remove_unused_labels),
+    ("unreachable-code", _remove_unreachable),
+)
+
+
+def optimize_function(function: VMCode.VMFunction,
+                      report: dict[str, int]) -> None:
+    """Rewrite one subroutine in place until no rule applies.
+
+    Args:
+        function: The subroutine to optimize.
+        report: Instructions removed so far, per rule name; updated.
+    """
+    instructions = function.instructions()
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        i = 0
+        while i < len(instructions):
+            for name, size, rule in WINDOW_RULES:
+                window = instructions[i:i + size]
+                if len(window) < size:
+                    continue
+                replacement = rule(window)
+                if replacement is not None:
+                    result.extend(replacement)
+                    report[name] = report.get(name, 0) + size - len(replacement)
+                    i += size
+                    changed = True
+                    break
+            else:
+                result.append(instructions[i])
+                i += 1
+        instructions = result
+        for name, rule in FUNCTION_RULES:
+            result = rule(instructions)
+            if result != instructions:
+                report[name] = report.get(name, 0) + len(instructions) - len(result)
+                instructions = result
+                changed = True
+    function.replace(instructions)
+
+
+def optimize(code: VMCode.VMCode) -> dict[str, int]:
+    """Run the peephole optimizer over every subroutine of the code.
+
+    Returns:
+        The number of instructions each rule removed.
+    """
+    report = {name: 0 for name, _, _ in WINDOW_RULES}
+    report.update((name, 0) for name, _ in FUNCTION_RULES)
+    for function in code.functions:
+        optimize_function(function, report)
+    return report
@@ -0,0 +1,173 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Strength reduction of multiplication and division by constants.
+
+`x * c` and `x / c` compile to calls of `Math.multiply` / `Math.divide`,
+which run a loop over all 16 bits of their operands. When one operand is a
+constant, `StrengthReducer.reduce` gives an equivalent straight-line
+sequence to apply to the other operand, already on the stack:
+- `x * 0`:  `pop temp 0; push constant 0` (x is still evaluated).
+- `x * 1`, `x / 1`:  nothing.
+- `x * -1`:  `neg`.
+- `x * 2`:  `pop temp 0; push temp 0; push temp 0; add`, or `push x; add`
+  when x is a variable or a constant, which can simply be pushed again.
+- `x * c`:  an add chain, doubling and adding x once per bit of |c|
+  (followed by `neg` for c < 0).
+
+x is kept in `temp 0` and the running product, while doubling, in
+`temp 1`. Both are only used as scratch slots, written before they are
+read. Multiplication wraps around like `Math.multiply`, so the results are
+the same.
+
+A `CostModel` decides which sequences are worth it. A call executes some
+450 (`Math.multiply`) or 650 (`Math.divide`) VM commands in the Jack OS
+(as measured on benchmarks/os/Math.jack), so every sequence is faster.
+Longer ones grow the code, though: a sequence is taken when the commands it
+saves outweigh the commands it adds, each of which is worth `growth_cost`
+executed ones, within a size limit. By default that takes the add chains
+of small multipliers, e.g. x * 3, x * 4 and x * 8.
+"""
+
+import typing
+
+# One VM command: ("push" | "pop", segment, index), or (arithmetic command,).
+Command = tuple
+
+
+class CostModel:
+    """Decides whether a reduced sequence beats the call it replaces."""
+
+    def __init__(self, multiply_cost: int = 450, divide_cost: int = 650,
+                 max_length: int = 24, max_growth: int = 12,
+                 growth_cost: int = 20) -> None:
+        """
+        Args:
+            multiply_cost: VM commands that a `Math.multiply` call executes.
+            divide_cost: VM commands that a `Math.divide` call executes.
+            max_length: The longest sequence to emit.
+            max_growth: How many VM commands longer than the call it
+                replaces a sequence may be; 0 keeps the code from growing.
+            growth_cost: The executed VM commands that a sequence must save
+                for each VM command it adds to the code.
+        """
+        self.multiply_cost = multiply_cost
+        self.divide_cost = divide_cost
+        self.max_length = max_length
+        self.max_growth = max_growth
+        self.growth_cost = growth_cost
+
+    def call_length(self, constant: int) -> int:
+        """Return the VM commands of `push constant c; call Math.<op> 2`; a
+        negative c takes a `not` more."""
+        return 3 if constant < 0 else 2
+
+    def call_cost(self, op: str, constant: int) -> int:
+        """Return the VM commands that the call executes."""
+        return self.call_length(constant) + (
+            self.multiply_cost if op == "*" else self.divide_cost)
+
+    def accepts(self, op: str, constant: int,
+                sequence: list[Command]) -> bool:
+        """Return True if the sequence should replace the call: it is
+        within the size limits, and what it saves in executed commands
+        outweighs what it adds to the code."""
+        # a sequence runs straight through: it executes each command once
+        length = len(sequence)
+        growth = length - self.call_length(constant)
+        saved = self.call_cost(op, constant) - length
+        return (length <= self.max_length and growth <= self.max_growth
+                and saved > 0 and saved >= growth * self.growth_cost)
+
+
+def multiply_sequence(constant: int,
+                      operand: Command = None) -> typing.Optional[list[Command]]:
+    """Return the commands that multiply the top of the stack by a constant,
+    or None if there is no reduction for it.
+
+    Args:
+        constant: The multiplier.
+        operand: The push that put the top of the stack there, if it can
+            be repeated; otherwise the value is saved in `temp 0`.
+    """
+    if constant == 0:
+        return [("pop", "temp", 0), ("push", "const", 0)]
+    if constant == -32768:
+        return None
+    magnitude = abs(constant)
+    sequence: list[Command] = []
+    if magnitude != 1:
+        if operand is None:
+            sequence += [("pop", "temp", 0), ("push", "temp", 0)]
+            operand = ("push", "temp", 0)
+        doubled = False
+        for bit in bin(magnitude)[3:]:
+            if not doubled:
+                # the running product is still x
+                sequence += [operand, ("add",)]
+                doubled = True
+            else:
+                sequence += [("pop", "temp", 1), ("push", "temp", 1),
+                             ("push", "temp", 1), ("add",)]
+            if bit == "1":
+                sequence += [operand, ("add",)]
+    if constant < 0:
+        sequence.append(("neg",))
+    return sequence
+
+
+def divide_sequence(constant: int) -> typing.Optional[list[Command]]:
+    """Return the commands that divide the top of the stack by a constant,
+    or None if there is no reduction for it."""
+    # x / -1 is not reduced to `neg`: Math.divide treats -32768 specially.
+    return [] if constant == 1 else None
+
+
+class StrengthReducer:
+    """Lowers `*` and `/` with a constant operand, under a cost model."""
+
+    def __init__(self, cost_model: CostModel = None) -> None:
+        self.cost_model = cost_model if cost_model is not None else CostModel()
+        # Calls replaced, per operator.
+        self.reduced: dict[str, int] = {"*": 0, "/": 0}
+
+    def reduce(self, op: str, constant: int,
+               operand: Command = None) -> typing.Optional[list[Command]]:
+        """Return the commands that replace `push constant c; call ...`.
+
+        Args:
+            op: The operator; only `*` and `/` are reduced.
+            constant: The constant operand. For `*` it may be either
+                operand; for `/` it must be the divisor.
+            operand: The push of the other operand, if it is a variable or
+                a constant, which can be pushed again (see
+                `multiply_sequence`).
+
+        Returns:
+            The commands to apply to the other operand, or None to keep the
+            call.
+        """
+        if op == "*":
+            sequence = multiply_sequence(constant, operand)
+        elif op == "/":
+            sequence = divide_sequence(constant)
+        else:
+            return None
+        if sequence is None or not self.cost_model.accepts(op, constant,
+                                                           sequence):
+            return None
+        return sequence
+
+    def record(self, op: str) -> None:
+        """Count a reduction that was emitted."""
+        self.reduced[op] += 1
+
+    def report(self) -> dict[str, int]:
+        """Return the number of calls replaced, per operator."""
+        return {"strength/multiply": self.reduced["*"],
+                "strength/divide": self.reduced["/"]}
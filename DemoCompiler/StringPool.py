@@ -0,0 +1,169 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""String constant pooling.
+
+Without pooling, every evaluation of a string constant builds a new
+`String` with one `String.appendChar` call per character. With pooling,
+each distinct literal gets a static slot and a generated accessor
+function, and every use becomes a single call of the accessor:
+
+    function Main.string$0 0
+    push static 3
+    if-goto STRING_READY
+    ...                      (String.new / appendChar, as before)
+    pop static 3
+    label STRING_READY
+    push static 3
+    return
+
+The string is built on the first call only; statics start out as 0.
+
+Two scopes are supported:
+- "class": the accessors and slots live in the class itself, after its
+  declared statics.
+- "program": the accessors live in a generated `StringPool` class (see
+  `write_pool`), shared by every class of the directory. Accessors are
+  named after a hash of the literal, so classes can be compiled apart.
+
+Pooled strings are shared by all uses of a literal, so a program that
+modifies (`setCharAt`, `appendChar`, ...) or disposes of a string constant
+behaves differently with pooling on.
+"""
+
+import hashlib
+import typing
+import VMCode
+from VMWriter import VMWriter
+
+POOL_CLASS = "StringPool"
+SCOPES = ("class", "program")
+
+
+def inline_size(string: str) -> int:
+    """Return the number of VM commands that build a string in place."""
+    return 2 + 2 * len(string)
+
+
+def accessor_size(string: str) -> int:
+    """Return the number of VM commands of a string's accessor function."""
+    return inline_size(string) + 7
+
+
+class StringPool:
+    """The string constants of a class, in order of first use."""
+
+    def __init__(self, class_name: str, first_static: int = 0,
+                 shared: bool = False) -> None:
+        """
+        Args:
+            class_name: The class holding the accessors and slots.
+            first_static: The static index of the first slot.
+            shared: Name the accessors after the literals, for a pool shared
+                by several classes, instead of after their index.
+        """
+        self.class_name = class_name
+        self.first_static = first_static
+        self.shared = shared
+        # literal -> index of its slot, relative to first_static
+        self.slots: dict[str, int] = {}
+        self.uses = 0
+        self.inline_size = 0
+
+    def accessor(self, string: str) -> str:
+        """Record a use of a string constant.
+
+        Returns:
+            The name of the function that returns the pooled string.
+        """
+        self.uses += 1
+        self.inline_size += inline_size(string)
+        index = self.slots.setdefault(string, len(self.slots))
+        return self.accessor_name(string, index)
+
+    def accessor_name(self, string: str, index: int) -> str:
+        """Return the name of the accessor of a literal."""
+        if self.shared:
+            digest = hashlib.sha1(string.encode()).hexdigest()[:12]
+            return f"{POOL_CLASS}.s${digest}"
+        return f"{self.class_name}.string${index}"
+
+    def write_accessors(self, writer: VMWriter) -> None:
+        """Write the accessor function of every pooled literal."""
+        for string, index in self.slots.items():
+            slot = self.first_static + index
+            writer.write_function(self.accessor_name(string, index), 0)
+            writer.write_push("static", slot)
+            writer.write_if("STRING_READY")
+            writer.write_string(string)
+            writer.write_pop("static", slot)
+            writer.write_label("STRING_READY")
+            writer.write_push("static", slot)
+            writer.write_return()
+
+    def report(self, accessors: bool = True) -> dict[str, int]:
+        """Return the size statistics of the pool.
+
+        Args:
+            accessors: Count the accessor functions in the pooled size; False
+                when they are written elsewhere (see `write_pool`).
+
+        Returns:
+            "strings/uses" and "strings/literals" (distinct), and the VM
+            commands the uses would take inline ("strings/inline-size") and
+            take pooled ("strings/pooled-size").
+        """
+        pooled = self.uses
+        if accessors:
+            pooled += sum(map(accessor_size, self.slots))
+        return {
+            "strings/uses": self.uses,
+            "strings/literals": len(self.slots) if accessors else 0,
+            "strings/inline-size": self.inline_size,
+            "strings/pooled-size": pooled,
+        }
+
+
+def _shared_pool(strings: typing.Iterable[str]) -> StringPool:
+    """Return the shared pool of the given string constants."""
+    pool = StringPool(POOL_CLASS, shared=True)
+    for string in sorted(set(strings)):
+        pool.slots[string] = len(pool.slots)
+    return pool
+
+
+def pool_code(strings: typing.Iterable[str]) -> VMCode.VMCode:
+    """Return the code of the shared `StringPool` class, as `write_pool`
+    would write it."""
+    writer = VMWriter(None, ir=True)
+    _shared_pool(strings).write_accessors(writer)
+    writer.flush()
+    return writer.code
+
+
+def write_pool(output_file: typing.TextIO,
+               strings: typing.Iterable[str]) -> dict[str, int]:
+    """Write the shared `StringPool` class of a program.
+
+    Args:
+        output_file: The `.vm` file of the pool.
+        strings: The string constants of all the program's classes.
+
+    Returns:
+        The size of the pool, in the form of `StringPool.report`.
+    """
+    pool = _shared_pool(strings)
+    writer = VMWriter(output_file, buffered=True)
+    pool.write_accessors(writer)
+    writer.flush()
+    return {
+        "strings/uses": 0,
+        "strings/literals": len(pool.slots),
+        "strings/inline-size": 0,
+        "strings/pooled-size": sum(map(accessor_size, pool.slots)),
+    }
@@ -16,6 +16,11 @@ This implementation models scopes as a linked list of `SymbolNode`s.
 `start_subroutine()` pushes a new scope node whose `next` points to the
 previous scope. `getNext()` pops the current scope.
 
+Each scope indexes its entries by name in a dict and keeps a running
+counter per kind, so `define` and all lookups are O(1). The table counts
+its lookups, and the steps `resolve` / `resolve_count` take out to an
+enclosing scope (`scope_walks`), for `--timings`.
+
 Note: Some methods return 0 when the table is empty (instead of None) to
 match behavior expected by the surrounding project code.
 """
@@ -27,34 +32,44 @@ class Entry:
 
     Stores the identifier's name, type, kind and running index.
     """
+    __slots__ = ("name", "type", "kind", "index")
+
     def __init__(self, name, type, kind, num):
-        self.__name: str = name
-        self.__type: str = type
-        self.__kind: str = kind
-        self.__num: int = num
+        self.name: str = name
+        self.type: str = type
+        self.kind: str = kind
+        self.index: int = num
     def getName(self)->str:
-        return self.__name
+        return self.name
     def getType(self)->str:
-        return self.__type
+        return self.type
     def getKind(self)->str:
-        return self.__kind
+        return self.kind
     def getNum(self)->int:
-        return self.__num
+        return self.index
 
 
 class SymbolNode:
     """A scope node in the symbol table chain.
 
-    Each node holds a list of `Entry` objects for one scope. The `next`
-    pointer refers to the enclosing (outer) scope.
+    Each node maps names to their `Entry` for one scope, and counts how many
+    entries of each kind were defined. The `next` pointer refers to the
+    enclosing (outer) scope.
     """
+    __slots__ = ("entries", "counts", "next")
+
     def __init__(self, head: list[Entry] = None, next: typing.Any = None):
-            self.head = head if head is not None else []
+            self.entries: dict[str, Entry] = {}
+            self.counts: dict[str, int] = {}
             self.next = next
+            for entry in head or ():
+                self.addEntry(entry)
     def addEntry(self, entry: Entry):
-        self.head.append(entry)
+        # Like a linear scan would, keep the first definition of a name.
+        self.entries.setdefault(entry.name, entry)
+        self.counts[entry.kind] = self.counts.get(entry.kind, 0) + 1
     def getHead(self):
-        return self.head
+        return list(self.entries.values())
     def getNext(self):
         return self.next
 
@@ -67,10 +82,12 @@ class SymbolTable:
     def __init__(self) -> None:
         """Creates a new empty symbol table."""
         self.__symTable = SymbolNode()
+        self.lookups = 0
+        self.scope_walks = 0
 
     def isEmpty(self) -> bool:
-        """Return True if the current scope has no entries."""
-        return self.__symTable == None or self.__symTable.getHead() == None
+        """Return True if there is no current scope."""
+        return self.__symTable is None
 
     def getNext(self) -> None:
         """Pop the current scope and move to the enclosing scope."""
@@ -113,17 +130,66 @@ class SymbolTable:
             int: the number of variables of the given kind already defined in 
             the current scope.
         """
-        count = -1
-        scope_list = self.__symTable.getHead()
         if self.isEmpty():
-            return count + 1
-        count += 1
-        for i in range (len(scope_list)):
-            cur_kind = scope_list[i].getKind()
-            if cur_kind == kind:
-                count += 1
-        return count
+            return 0
+        return self.__symTable.counts.get(kind, 0)
+
+    def lookup(self, name: str) -> Entry:
+        """
+        Args:
+            name (str): name of an identifier.
+
+        Returns:
+            Entry: the entry (kind, type and index) of the named identifier in
+            the current scope, or None if it is unknown in the current scope.
+        """
+        if self.isEmpty():
+            return None
+        self.lookups += 1
+        return self.__symTable.entries.get(name)
 
+    def resolve(self, name: str) -> tuple[Entry, SymbolNode]:
+        """Find a name in the current scope or, failing that, the enclosing
+        scopes. Unlike walking with `getNext()`, this leaves the table as is.
+
+        Args:
+            name (str): name of an identifier.
+
+        Returns:
+            (entry, scope): the innermost entry for the name and the scope
+            that defines it, or (None, None) if no scope knows the name.
+        """
+        self.lookups += 1
+        scope = self.__symTable
+        while scope is not None:
+            entry = scope.entries.get(name)
+            if entry is not None:
+                return entry, scope
+            scope = scope.next
+            if scope is not None:
+                self.scope_walks += 1
+        return None, None
+
+    def resolve_count(self, kind: str) -> int:
+        """
+        Args:
+            kind (str): can be "STATIC", "FIELD", "ARG", "VAR".
+
+        Returns:
+            int: the number of variables of the given kind in the innermost
+            scope, searching outwards from the current one, that defines
+            any; 0 if none does.
+        """
+        self.lookups += 1
+        scope = self.__symTable
+        while scope is not None:
+            count = scope.counts.get(kind, 0)
+            if count > 0:
+                return count
+            scope = scope.next
+            if scope is not None:
+                self.scope_walks += 1
+        return 0
 
     def kind_of(self, name: str) -> str:
         """
@@ -136,12 +202,8 @@ class SymbolTable:
         """
         if self.isEmpty():
             return 0
-        scope_list = self.__symTable.getHead()
-        for i in range (len(scope_list)):
-            cur_name = scope_list[i].getName()
-            if cur_name == name:
-                return scope_list[i].getKind()
-        return None
+        entry = self.__symTable.entries.get(name)
+        return entry.kind if entry is not None else None
 
     def type_of(self, name: str) -> str:
         """
@@ -153,12 +215,8 @@ class SymbolTable:
         """
         if self.isEmpty():
             return 0
-        scope_list = self.__symTable.getHead()
-        for i in range(len(scope_list)):
-            cur_name = scope_list[i].getName()
-            if cur_name == name:
-                return scope_list[i].getType()
-        return None
+        entry = self.__symTable.entries.get(name)
+        return entry.type if entry is not None else None
 
     def index_of(self, name: str) -> int:
         """
@@ -170,19 +228,10 @@ class SymbolTable:
         """
         if self.isEmpty():
             return 0
-        scope_list = self.__symTable.getHead()
-        for i in range(len(scope_list)):
-            cur_name = scope_list[i].getName()
-            if cur_name == name:
-                return scope_list[i].getNum()
-        return None
+        entry = self.__symTable.entries.get(name)
+        return entry.index if entry is not None else None
 
     def isNameInSym(self, name: str) -> bool:
         if self.isEmpty():
             return 0
-        scope_list = self.__symTable.getHead()
-        for i in range(len(scope_list)):
-            cur_name = scope_list[i].getName()
-            if cur_name == name:
-                return True
-        return False
+        return name in self.__symTable.entries
@@ -0,0 +1,809 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Compact syntax tree of a Jack class (`--syntax-tree`).
+
+`parse` reads a class from a `JackTokenizer` into a tree of small
+`__slots__` nodes: a `Class` of `VarDec`s and `Subroutine`s, statements
+(`Let`, `If`, `While`, `Do`, `Return`) and expressions. An `Expression`
+holds its terms in a tuple and its operators in a string (Jack has no
+precedence), and sequences are tuples, so the tree costs a few dozen bytes
+per token (see benchmarks/tree.py).
+
+Unlike `CompilationEngine`, which sees one token at a time, analyses of
+the tree can look ahead and revisit code: `unused_locals`, `call_counts`.
+
+`TreeCompiler` generates code from the tree, in a separate walk: it is a
+`CompilationEngine` whose `compile_*` routines take nodes instead of
+reading tokens, so a class compiled from its tree is byte-identical to one
+compiled from its source, with any options.
+"""
+
+import typing
+import ConstantFolder
+from CompilationEngine import CompilationEngine, comparison_ops, keyword_values
+from Diagnostics import SourceError, UnexpectedToken, UndeclaredIdentifier
+from JackTokenizer import JackTokenizer, KEYWORD, IDENTIFIER, INT_CONST, STRING_CONST
+from SymbolTable import SymbolTable
+
+OPERATORS = frozenset("+-*/&|<>=")
+UNARY_OPERATORS = frozenset("-~")
+KEYWORD_CONSTANTS = frozenset({"true", "false", "null", "this"})
+PRIMITIVE_TYPES = frozenset({"int", "char", "boolean"})
+CLASS_VAR_KINDS = frozenset({"static", "field"})
+SUBROUTINE_KINDS = frozenset({"constructor", "method", "function"})
+
+
+class Node:
+    """Base class of the tree nodes. A node's fields are its `__slots__`;
+    sequences of nodes are tuples."""
+    __slots__ = ()
+
+    def __init__(self, *values: typing.Any) -> None:
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(repr(getattr(self, field)) for field in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Class(Node):
+    __slots__ = ("name", "variables", "subroutines")
+
+
+class VarDec(Node):
+    """A static, field or var declaration of one or more names."""
+    __slots__ = ("kind", "type", "names")
+
+
+class Subroutine(Node):
+    """`parameters` holds (type, name) pairs."""
+    __slots__ = ("kind", "return_type", "name", "parameters", "variables",
+                 "statements")
+
+
+class Let(Node):
+    """`index` is the subscript expression of an array element, or None."""
+    __slots__ = ("name", "index", "value")
+
+
+class If(Node):
+    """`otherwise` is None without an else clause (an empty one is ())."""
+    __slots__ = ("condition", "then", "otherwise")
+
+
+class While(Node):
+    __slots__ = ("condition", "body")
+
+
+class Do(Node):
+    __slots__ = ("call",)
+
+
+class Return(Node):
+    """`value` is None in a `return;`."""
+    __slots__ = ("value",)
+
+
+class Expression(Node):
+    """`terms[0] operators[0] terms[1] operators[1] ...`, left to right."""
+    __slots__ = ("terms", "operators")
+
+
+class Constant(Node):
+    """An integer constant."""
+    __slots__ = ("value",)
+
+
+class String(Node):
+    __slots__ = ("value",)
+
+
+class Keyword(Node):
+    """true, false, null or this."""
+    __slots__ = ("word",)
+
+
+class Variable(Node):
+    __slots__ = ("name",)
+
+
+class Subscript(Node):
+    """An array element, `name[index]`."""
+    __slots__ = ("name", "index")
+
+
+class Call(Node):
+    """`receiver.name(arguments)`; `receiver` is a class or variable name,
+    or None for `name(arguments)`."""
+    __slots__ = ("receiver", "name", "arguments")
+
+
+class Group(Node):
+    """A parenthesized expression."""
+    __slots__ = ("expression",)
+
+
+class Unary(Node):
+    __slots__ = ("operator", "term")
+
+
+class Parser:
+    """Recursive-descent parser from a `JackTokenizer` to a `Class`."""
+
+    def __init__(self, tokenizer: JackTokenizer) -> None:
+        self.tokenizer = tokenizer
+        # The variables of the class and of the subroutine being parsed.
+        self.declared: set[str] = set()
+
+    def error(self, expected: str) -> UnexpectedToken:
+        return UnexpectedToken(
+            f"unexpected {self.tokenizer.get_token()!r}, expected {expected}",
+            *(self.tokenizer.position() or ()))
+
+    def undeclared(self, name: str) -> UndeclaredIdentifier:
+        return UndeclaredIdentifier(f"undeclared identifier {name!r}",
+                                    *(self.tokenizer.position() or ()))
+
+    def token(self) -> typing.Any:
+        """Return the current token; there must be one."""
+        # called for every token, so it reads the tokenizer's state directly
+        tokenizer = self.tokenizer
+        if tokenizer.cur_count >= tokenizer.total_count:
+            raise UnexpectedToken("unexpected end of input",
+                                  *(tokenizer.position() or ()))
+        return tokenizer.cur_value
+
+    def expect(self, symbol: str) -> None:
+        """Skip the current token, which must be the given keyword or symbol."""
+        if self.token() != symbol:
+            raise self.error(repr(symbol))
+        self.tokenizer.advance()
+
+    def name(self) -> str:
+        """Return and skip the current token, which must be an identifier."""
+        token = self.token()
+        if self.tokenizer.token_code() != IDENTIFIER:
+            raise self.error("a name")
+        self.tokenizer.advance()
+        return token
+
+    def type(self, allow_void: bool = False) -> str:
+        """Return and skip the current token, which must be a type."""
+        token = self.token()
+        if self.tokenizer.token_code() == KEYWORD and (
+                token in PRIMITIVE_TYPES or allow_void and token == "void"):
+            self.tokenizer.advance()
+            return token
+        return self.name()
+
+    def variable(self) -> str:
+        """Return and skip the current token, which must be a declared
+        variable."""
+        token = self.token()
+        if token not in self.declared and self.tokenizer.token_code() == IDENTIFIER:
+            raise self.undeclared(token)
+        return self.name()
+
+    def parse_class(self) -> Class:
+        self.tokenizer.advance()
+        self.expect("class")
+        name = self.name()
+        self.expect("{")
+        variables = []
+        while self.token() in CLASS_VAR_KINDS:
+            variables.append(self.parse_var_dec())
+        class_variables = {name for variable in variables for name in variable.names}
+        subroutines = []
+        while self.token() in SUBROUTINE_KINDS:
+            self.declared = set(class_variables)
+            subroutines.append(self.parse_subroutine())
+        self.expect("}")
+        return Class(name, tuple(variables), tuple(subroutines))
+
+    def parse_var_dec(self) -> VarDec:
+        kind = self.token()
+        self.tokenizer.advance()
+        type = self.type()
+        names = [self.name()]
+        while self.token() == ",":
+            self.tokenizer.advance()
+            names.append(self.name())
+        self.expect(";")
+        return VarDec(kind, type, tuple(names))
+
+    def parse_subroutine(self) -> Subroutine:
+        kind = self.token()
+        self.tokenizer.advance()
+        return_type = self.type(allow_void=True)
+        name = self.name()
+        self.expect("(")
+        parameters = []
+        if self.token() != ")":
+            parameters.append((self.type(), self.name()))
+            while self.token() == ",":
+                self.tokenizer.advance()
+                parameters.append((self.type(), self.name()))
+        self.expect(")")
+        self.expect("{")
+        variables = []
+        while self.token() == "var":
+            variables.append(self.parse_var_dec())
+        self.declared.update(name for _, name in parameters)
+        self.declared.update(name for variable in variables
+                             for name in variable.names)
+        statements = self.parse_statements()
+        self.expect("}")
+        return Subroutine(kind, return_type, name, tuple(parameters),
+                          tuple(variables), statements)
+
+    def parse_statements(self) -> tuple:
+        """Parse statements up to, not including, the closing "}"."""
+        statements = []
+        while self.token() != "}":
+            statements.append(self.parse_statement())
+        return tuple(statements)
+
+    def parse_block(self) -> tuple:
+        self.expect("{")
+        statements = self.parse_statements()
+        self.expect("}")
+        return statements
+
+    def parse_statement(self) -> Node:
+        statement = self.token()
+        if statement == "let":
+            self.tokenizer.advance()
+            name = self.variable()
+            index = None
+            if self.token() == "[":
+                self.tokenizer.advance()
+                index = self.parse_expression()
+                self.expect("]")
+            self.expect("=")
+            value = self.parse_expression()
+            self.expect(";")
+            return Let(name, index, value)
+        elif statement == "if":
+            condition = self.parse_condition()
+            then = self.parse_block()
+            otherwise = None
+            if self.tokenizer.has_more_tokens() and self.token() == "else":
+                self.tokenizer.advance()
+                otherwise = self.parse_block()
+            return If(condition, then, otherwise)
+        elif statement == "while":
+            condition = self.parse_condition()
+            return While(condition, self.parse_block())
+        elif statement == "do":
+            self.tokenizer.advance()
+            call = self.parse_call(self.name())
+            self.expect(";")
+            return Do(call)
+        elif statement == "return":
+            self.tokenizer.advance()
+            value = None
+            if self.token() != ";":
+                value = self.parse_expression()
+            self.expect(";")
+            return Return(value)
+        raise self.error("a statement")
+
+    def parse_condition(self) -> Expression:
+        """Parse the parenthesized condition after `if` or `while`."""
+        self.tokenizer.advance()
+        self.expect("(")
+        condition = self.parse_expression()
+        self.expect(")")
+        return condition
+
+    def parse_expression(self) -> Expression:
+        terms = [self.parse_term()]
+        operators = []
+        while self.token() in OPERATORS:
+            operators.append(self.token())
+            self.tokenizer.advance()
+            terms.append(self.parse_term())
+        return Expression(tuple(terms), "".join(operators))
+
+    def parse_term(self) -> Node:
+        token = self.token()
+        code = self.tokenizer.token_code()
+        if code == INT_CONST:
+            self.tokenizer.advance()
+            return Constant(token)
+        elif code == STRING_CONST:
+            self.tokenizer.advance()
+            return String(token)
+        elif code == KEYWORD and token in KEYWORD_CONSTANTS:
+            self.tokenizer.advance()
+            return Keyword(token)
+        elif code == IDENTIFIER:
+            if token not in self.declared \
+                    and self.tokenizer.peek() not in (".", "("):
+                raise self.undeclared(token)
+            self.tokenizer.advance()
+            following = self.token()
+            if following == "[":
+                self.tokenizer.advance()
+                index = self.parse_expression()
+                self.expect("]")
+                return Subscript(token, index)
+            elif following == "." or following == "(":
+                return self.parse_call(token)
+            return Variable(token)
+        elif token == "(":
+            self.tokenizer.advance()
+            expression = self.parse_expression()
+            self.expect(")")
+            return Group(expression)
+        elif token in UNARY_OPERATORS:
+            self.tokenizer.advance()
+            return Unary(token, self.parse_term())
+        raise self.error("a term")
+
+    def parse_call(self, first: str) -> Call:
+        """Parse the rest of a call whose first name was just read."""
+        receiver = None
+        name = first
+        if self.token() == ".":
+            self.tokenizer.advance()
+            receiver, name = first, self.name()
+        self.expect("(")
+        arguments = []
+        if self.token() != ")":
+            arguments.append(self.parse_expression())
+            while self.token() == ",":
+                self.tokenizer.advance()
+                arguments.append(self.parse_expression())
+        self.expect(")")
+        return Call(receiver, name, tuple(arguments))
+
+
+def parse(tokenizer: JackTokenizer) -> Class:
+    """Parse a class from a tokenizer that has not been advanced yet.
+
+    Raises:
+        UnexpectedToken: If the tokens are not a Jack class.
+        UndeclaredIdentifier: If it uses a variable that it does not declare.
+    """
+    return Parser(tokenizer).parse_class()
+
+
+class TreeCompiler(CompilationEngine):
+    """Generates the code of a class from its syntax tree.
+
+    Each `compile_*` routine takes the node to compile instead of reading
+    tokens, and emits the same code as the `CompilationEngine` routine of
+    the same name, with any options.
+    """
+
+    def __init__(self, tree: Class, *args: typing.Any, **kwargs: typing.Any) -> None:
+        """
+        Args:
+            tree: The class to compile.
+            args, kwargs: As `CompilationEngine`; the input stream is the
+                tokenizer the tree was parsed from.
+        """
+        super().__init__(*args, **kwargs)
+        self.tree = tree
+
+    def error(self, error_type: type, message: str) -> SourceError:
+        # nodes do not keep their position; `Parser` reports what it can
+        return error_type(message)
+
+    def compile_class(self) -> None:
+        tree = self.tree
+        self.class_name = tree.name
+        self.symTable = SymbolTable()
+        for variable in tree.variables:
+            self.compile_class_var_dec(variable)
+        self.start_string_pool()
+        for subroutine in tree.subroutines:
+            self.compile_subroutine(subroutine)
+        self.finish_class()
+
+    def compile_class_var_dec(self, variable: VarDec) -> None:
+        for name in variable.names:
+            self.symTable.define(name, variable.type, variable.kind)
+            self.interface[name] = f"{variable.kind} {variable.type}"
+
+    def compile_subroutine(self, subroutine: Subroutine) -> None:
+        self.symTable.start_subroutine()
+        if subroutine.kind == "method":
+            self.symTable.define("this", self.class_name, "arg")
+        parameter_types = self.compile_parameter_list(subroutine.parameters)
+        self.interface[subroutine.name] = (f"{subroutine.kind} {subroutine.return_type}"
+                                           f"({', '.join(parameter_types)})")
+        for variable in subroutine.variables:
+            self.compile_var_dec(variable)
+        self.write_prologue(subroutine.kind, subroutine.name)
+        self.compile_statements(subroutine.statements, subroutine.return_type)
+        self.symTable.getNext()
+
+    def compile_parameter_list(self, parameters: tuple) -> list[str]:
+        for type, name in parameters:
+            self.symTable.define(name, type, "arg")
+        return [type for type, _ in parameters]
+
+    def compile_var_dec(self, variable: VarDec) -> None:
+        for name in variable.names:
+            self.symTable.define(name, variable.type, "var")
+
+    def compile_statements(self, statements: tuple, name: str = None) -> None:
+        for statement in statements:
+            self.compile_statement(statement, name)
+
+    def compile_statement(self, statement: Node, name: str = None) -> None:
+        if isinstance(statement, If):
+            self.compile_if(statement)
+        elif isinstance(statement, Let):
+            self.compile_let(statement)
+        elif isinstance(statement, While):
+            self.compile_while(statement)
+        elif isinstance(statement, Do):
+            self.compile_do(statement)
+        else:
+            if name == "void":
+                self.output_stream.write_push("const", 0)
+            self.compile_return(statement)
+
+    def compile_do(self, statement: Do) -> None:
+        self.compile_subroutineCall(statement.call)
+        self.output_stream.write_pop("temp", 0)
+
+    def compile_subroutineCall(self, call: Call) -> None:
+        if call.receiver is None:
+            self.output_stream.write_push("pointer", 0)
+            count = self.compile_expression_list(call.arguments)
+            self.output_stream.write_call(f"{self.class_name}.{call.name}", count + 1)
+            return
+        receiver = call.receiver
+        entry, _ = self.symTable.resolve(receiver)
+        if receiver == self.class_name and receiver != "Main" and call.name != "new":
+            count = self.compile_expression_list(call.arguments)
+            self.output_stream.write_call(f"{self.class_name}.{call.name}", count + 1)
+        elif entry is not None:
+            self.output_stream.write_push(entry.kind, entry.index)
+            count = self.compile_expression_list(call.arguments)
+            self.output_stream.write_call(f"{entry.type}.{call.name}", count + 1)
+            self.references.setdefault(entry.type, set()).add(call.name)
+        else:
+            if receiver != self.class_name:
+                self.references.setdefault(receiver, set()).add(call.name)
+            count = self.compile_expression_list(call.arguments)
+            self.output_stream.write_call(f"{receiver}.{call.name}", count)
+
+    def compile_let(self, statement: Let) -> None:
+        entry = self.resolve_variable(statement.name)
+        segment = entry.kind
+        index = entry.index
+        if statement.index is not None:
+            self.output_stream.write_push(segment, index)
+            self.compile_expression(statement.index)
+            self.output_stream.write_arithmetic("add")
+            self.compile_expression(statement.value)
+            self.output_stream.write_pop("temp", 0)
+            self.output_stream.write_pop("pointer", 1)
+            self.output_stream.write_push("temp", 0)
+            self.output_stream.write_pop("that", 0)
+        else:
+            self.compile_expression(statement.value)
+            self.output_stream.write_pop(segment, index)
+
+    def compile_while(self, statement: While) -> None:
+        if self.direct_branches:
+            self.compile_direct_while(statement)
+            return
+        in_while, out_while = self.get_while_label("IN_WHILE", "OUT_WHILE")
+        self.output_stream.write_label(in_while)
+        self.compile_expression(statement.condition)
+        self.output_stream.write_arithmetic("not")
+        self.output_stream.write_if(out_while)
+        self.compile_statements(statement.body)
+        self.output_stream.write_goto(in_while)
+        self.output_stream.write_label(out_while)
+
+    def compile_return(self, statement: Return) -> None:
+        if statement.value is not None:
+            self.compile_expression(statement.value)
+        self.output_stream.write_return()
+
+    def compile_if(self, statement: If) -> None:
+        if self.direct_branches:
+            self.compile_direct_if(statement)
+            return
+        if_out, else_in = self.get_if_label("IF_OUT", "ELSE_IN")
+        self.compile_expression(statement.condition)
+        self.output_stream.write_arithmetic("not")
+        self.output_stream.write_if(else_in)
+        self.compile_statements(statement.then)
+        self.output_stream.write_goto(if_out)
+        self.output_stream.write_label(else_in)
+        if statement.otherwise is not None:
+            self.compile_statements(statement.otherwise)
+        self.output_stream.write_label(if_out)
+
+    def compile_block(self, statements: tuple, emit: bool = True) -> None:
+        if emit:
+            self.compile_statements(statements)
+        else:
+            self.output_stream.start_capture()
+            self.compile_statements(statements)
+            self.output_stream.end_capture()
+
+    def compile_direct_while(self, statement: While) -> None:
+        body, test, out = self.get_while_label("WHILE_BODY", "WHILE_TEST", "WHILE_OUT")
+        self.output_stream.start_capture()
+        value, negated = self.compile_condition(statement.condition)
+        condition = self.output_stream.end_capture()
+        boolean = self.boolean
+
+        if value is not None:
+            if value == ConstantFolder.TRUE:
+                self.output_stream.write_label(body)
+                self.compile_block(statement.body)
+                self.output_stream.write_goto(body)
+            else:
+                self.compile_block(statement.body, emit=False)
+        elif boolean:
+            self.output_stream.write_goto(test)
+            self.output_stream.write_label(body)
+            self.compile_block(statement.body)
+            self.output_stream.write_label(test)
+            self.output_stream.write_capture(condition)
+            if negated:
+                self.output_stream.write_arithmetic("not")
+            self.output_stream.write_if(body)
+        else:
+            self.output_stream.write_label(body)
+            self.output_stream.write_capture(condition)
+            if not negated:
+                self.output_stream.write_arithmetic("not")
+            self.output_stream.write_if(out)
+            self.compile_block(statement.body)
+            self.output_stream.write_goto(body)
+            self.output_stream.write_label(out)
+
+    def compile_direct_if(self, statement: If) -> None:
+        if_then, if_else, if_out = self.get_if_label("IF_THEN", "IF_ELSE", "IF_OUT")
+        value, negated = self.compile_condition(statement.condition)
+        boolean = self.boolean
+        has_else = statement.otherwise is not None
+
+        if value is not None:
+            self.compile_block(statement.then, emit=value == ConstantFolder.TRUE)
+            if has_else:
+                self.compile_block(statement.otherwise,
+                                   emit=value != ConstantFolder.TRUE)
+            return
+
+        self.output_stream.start_capture()
+        self.compile_block(statement.then)
+        then_code = self.output_stream.end_capture()
+
+        if has_else and boolean and not negated:
+            self.output_stream.write_if(if_then)
+            self.compile_block(statement.otherwise)
+            self.output_stream.write_goto(if_out)
+            self.output_stream.write_label(if_then)
+            self.output_stream.write_capture(then_code)
+        else:
+            if not negated:
+                self.output_stream.write_arithmetic("not")
+            self.output_stream.write_if(if_else if has_else else if_out)
+            self.output_stream.write_capture(then_code)
+            if has_else:
+                self.output_stream.write_goto(if_out)
+                self.output_stream.write_label(if_else)
+                self.compile_block(statement.otherwise)
+        self.output_stream.write_label(if_out)
+
+    def compile_condition(self, condition: Expression) -> tuple[typing.Optional[int], bool]:
+        first = condition.terms[0]
+        if not (isinstance(first, Unary) and first.operator == "~"):
+            return self.compile_expression_value(condition), False
+        value = self.compile_term(first.term)
+        if value is not None:
+            value = ConstantFolder.fold_unary("~", value)
+        elif not condition.operators:
+            return None, True
+        else:
+            # the ~ only applies to the first operand
+            self.output_stream.write_arithmetic("not")
+            # the stack holds ~term now, not what pushing the term gives
+            self.operand = None
+        return self.compile_operations(condition, value), False
+
+    def compile_expression(self, expression: Expression) -> None:
+        value = self.compile_expression_value(expression)
+        if value is not None:
+            self.write_constant(value)
+
+    def compile_expression_value(self, expression: Expression) -> typing.Optional[int]:
+        return self.compile_operations(expression, self.compile_term(expression.terms[0]))
+
+    def compile_operations(self, expression: Expression,
+                           value: typing.Optional[int]) -> typing.Optional[int]:
+        """Compiles the operations of an expression after its first term."""
+        boolean = self.boolean
+        for op, term in zip(expression.operators, expression.terms[1:]):
+            if value is None:
+                left = self.operand
+                self.write_operation(op, self.compile_right_term(op, term), left)
+            elif op == "*" and self.strength_reducer is not None \
+                    and self.strength_reducer.reduce(op, value) is not None:
+                right = self.compile_term(term)
+                if right is None:
+                    self.write_sequence(op, self.strength_reducer.reduce(
+                        op, value, self.operand))
+                value = None if right is None else self.combine(op, value, right)
+            else:
+                self.pending_constants.append(value)
+                right = self.compile_term(term)
+                if right is None:
+                    self.output_stream.write_arithmetic(self.input_stream.get_arit(op))
+                    value = None
+                else:
+                    value = self.combine(op, self.pending_constants.pop(), right)
+            boolean = op in comparison_ops or (op in "&|" and boolean and self.boolean)
+            self.operand = None
+        self.boolean = boolean
+        return value
+
+    def compile_right_term(self, op: str, term: Node) -> typing.Optional[int]:
+        if not self.fold_constants and self.strength_reducer is not None \
+                and op in "*/" and isinstance(term, Constant):
+            self.boolean = term.value == 0
+            return term.value
+        return self.compile_term(term)
+
+    def compile_term(self, term: Node) -> typing.Optional[int]:
+        # only set once the term is done: its subexpressions set it too
+        self.operand = operand = None
+        if self.fold_constants and (isinstance(term, Constant) or (
+                isinstance(term, Keyword) and term.word in keyword_values)):
+            value = keyword_values.get(term.word) if isinstance(term, Keyword) \
+                else term.value
+            self.boolean = value == ConstantFolder.TRUE or value == ConstantFolder.FALSE
+            return value
+        elif isinstance(term, Constant):
+            self.output_stream.write_push("const", term.value)
+            self.boolean = term.value == 0
+            operand = ("push", "const", term.value)
+        elif isinstance(term, String):
+            self.flush_constants()
+            if self.string_pool is not None:
+                self.output_stream.write_call(self.string_pool.accessor(term.value), 0)
+            else:
+                self.output_stream.write_string(term.value)
+            self.boolean = False
+        elif isinstance(term, Keyword):
+            self.flush_constants()
+            if term.word == "true":
+                self.output_stream.write_push("const", 0)
+                self.output_stream.write_arithmetic("not")
+            elif term.word == "this":
+                self.output_stream.write_push("pointer", 0)
+            else:
+                self.output_stream.write_push("const", 0)
+            self.boolean = term.word != "this"
+        elif isinstance(term, (Variable, Subscript, Call)):
+            self.flush_constants()
+            if isinstance(term, Call):
+                entry, _ = self.symTable.resolve(
+                    term.name if term.receiver is None else term.receiver)
+            else:
+                entry = self.resolve_variable(term.name)
+            segment = entry.kind if entry is not None else None
+            index = entry.index if entry is not None else None
+            if isinstance(term, Subscript):
+                self.compile_expression(term.index)
+                self.output_stream.write_push(segment, index)
+                self.output_stream.write_arithmetic("add")
+                self.output_stream.write_pop("pointer", 1)
+                self.output_stream.write_push("that", 0)
+            elif isinstance(term, Call) and term.receiver is not None:
+                self.compile_subroutineCall(term)
+            elif isinstance(term, Call):
+                count = self.compile_expression_list(term.arguments)
+                self.output_stream.write_push("arg", 0)
+                self.output_stream.write_call(term.name, count + 1)
+            else:
+                self.output_stream.write_push(segment, index)
+                operand = ("push", segment, index)
+            self.boolean = False
+        elif isinstance(term, Group):
+            return self.compile_expression_value(term.expression)
+        else:
+            value = self.compile_term(term.term)
+            # ~ keeps a boolean a boolean, - does not
+            self.boolean = self.boolean and term.operator == "~"
+            if value is not None:
+                return ConstantFolder.fold_unary(term.operator, value)
+            self.output_stream.write_arithmetic(
+                self.input_stream.get_arit_unary(term.operator))
+        self.operand = operand
+        return None
+
+    def compile_expression_list(self, arguments: tuple) -> int:
+        for argument in arguments:
+            self.compile_expression(argument)
+        return len(arguments)
+
+
+def walk(node: Node) -> typing.Iterator[Node]:
+    """Yield a node and all the nodes below it, in source order."""
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        children = []
+        for field in node.__slots__:
+            value = getattr(node, field)
+            if isinstance(value, Node):
+                children.append(value)
+            elif isinstance(value, tuple):
+                children.extend(item for item in value if isinstance(item, Node))
+        stack.extend(reversed(children))
+
+
+def unused_locals(tree: Class) -> list[tuple[str, str]]:
+    """Return the local variables that their subroutine never reads: a
+    variable only ever assigned with `let` counts, an array only ever
+    written to through `let a[i] = ...` does not.
+
+    Returns:
+        (subroutine name, variable name) pairs, in declaration order.
+    """
+    unused = []
+    for subroutine in tree.subroutines:
+        read = set()
+        for statement in subroutine.statements:
+            for node in walk(statement):
+                if isinstance(node, (Variable, Subscript)) or (
+                        isinstance(node, Let) and node.index is not None):
+                    read.add(node.name)
+                elif isinstance(node, Call) and node.receiver is not None:
+                    read.add(node.receiver)
+        unused.extend((subroutine.name, name)
+                      for variable in subroutine.variables
+                      for name in variable.names if name not in read)
+    return unused
+
+
+def call_counts(tree: Class) -> dict[str, int]:
+    """Count the call sites of each subroutine the class calls.
+
+    Returns:
+        Call sites by full subroutine name: calls on a variable go to its
+        type, and calls without a receiver to the class itself.
+    """
+    class_types = {name: variable.type for variable in tree.variables
+                   for name in variable.names}
+    counts: dict[str, int] = {}
+    for subroutine in tree.subroutines:
+        types = dict(class_types)
+        types.update((name, type) for type, name in subroutine.parameters)
+        types.update((name, variable.type) for variable in subroutine.variables
+                     for name in variable.names)
+        for statement in subroutine.statements:
+            for node in walk(statement):
+                if isinstance(node, Call):
+                    receiver = tree.name if node.receiver is None \
+                        else types.get(node.receiver, node.receiver)
+                    callee = f"{receiver}.{node.name}"
+                    counts[callee] = counts.get(callee, 0) + 1
+    return counts
+
+
+def report(tree: Class) -> dict[str, int]:
+    """Return the tree statistics for `--report`."""
+    return {"tree/nodes": sum(1 for _ in walk(tree)),
+            "tree/unused-locals": len(unused_locals(tree))}
@@ -0,0 +1,69 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Whole-program dead-subroutine elimination ("tree shaking").
+
+The call graph of a program is read off the `call` instructions of its
+`VMCode`, one class at a time. Every subroutine reachable from the roots
+(`Main.main` by default) is kept; all others are dropped before the code
+is rendered. Calls to subroutines outside the program, e.g. of the OS,
+are ignored.
+
+Jack has no function pointers, so every call is a `call` instruction with
+a fixed name and the graph is exact.
+"""
+
+import typing
+import VMCode
+
+DEFAULT_ROOTS = ("Main.main",)
+
+
+def call_graph(code: VMCode.VMCode) -> dict[str, set[str]]:
+    """Return the functions each function of the code calls (by name)."""
+    graph = {}
+    for function in code.functions:
+        graph[code.function_name(function)] = {
+            code.names[operand]
+            for opcode, operand in zip(function.opcodes, function.operands)
+            if opcode == VMCode.CALL}
+    return graph
+
+
+def reachable(graph: dict[str, set[str]],
+              roots: typing.Iterable[str]) -> set[str]:
+    """Return the functions reachable from the roots, roots included.
+
+    Args:
+        graph: The call graph of the whole program.
+        roots: The entry points; unknown names are ignored.
+    """
+    live = set()
+    pending = [root for root in roots if root in graph]
+    while pending:
+        name = pending.pop()
+        if name in live:
+            continue
+        live.add(name)
+        pending.extend(callee for callee in graph.get(name, ())
+                       if callee in graph and callee not in live)
+    return live
+
+
+def shake(code: VMCode.VMCode, live: set[str]) -> list[str]:
+    """Drop the functions of the code that are not live.
+
+    Returns:
+        The names of the functions removed, in code order.
+    """
+    removed = [code.function_name(function) for function in code.functions
+               if code.function_name(function) not in live]
+    if removed:
+        code.functions[:] = [function for function in code.functions
+                             if code.function_name(function) in live]
+    return removed
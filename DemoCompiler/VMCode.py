@@ -0,0 +1,175 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""In-memory VM instruction list (IR) for the Jack compiler.
+
+`VMCode` holds generated code as one `VMFunction` per subroutine. Each
+function stores its instructions column-wise in three compact arrays:
+- `opcodes`:  the command (`PUSH`, `ADD`, `CALL`, ...).
+- `args`:     the segment code for push/pop, the argument count for call.
+- `operands`: the index for push/pop, or the id of a label / function name
+  in the shared `VMCode.names` table.
+
+Optimization and analysis passes work on these arrays (or on the decoded
+`(opcode, arg, operand)` tuples from `VMFunction.instructions()`), and
+`VMCode.to_text()` renders the usual `.vm` text on demand, and `parse()`
+reads it back, e.g. for the `.vm` files of the OS.
+"""
+
+import typing
+from array import array
+
+# Opcodes.
+PUSH, POP, ADD, SUB, NEG, EQ, GT, LT, AND, OR, NOT, \
+    LABEL, GOTO, IF_GOTO, CALL, RETURN = range(16)
+OPCODE_NAMES = ("push", "pop", "add", "sub", "neg", "eq", "gt", "lt", "and",
+                "or", "not", "label", "goto", "if-goto", "call", "return")
+ARITHMETIC = {name: opcode for opcode, name in enumerate(OPCODE_NAMES)
+              if ADD <= opcode <= NOT}
+BRANCHES = (LABEL, GOTO, IF_GOTO)
+
+# Segment codes, indexing the VM segment names.
+CONSTANT, ARGUMENT, LOCAL, STATIC, THIS, THAT, POINTER, TEMP = range(8)
+SEGMENT_NAMES = ("constant", "argument", "local", "static", "this", "that",
+                 "pointer", "temp")
+SEGMENTS = {name: code for code, name in enumerate(SEGMENT_NAMES)}
+
+Instruction = tuple[int, int, int]
+
+
+class VMFunction:
+    """The instructions of one subroutine, in column-wise arrays."""
+    __slots__ = ("name", "n_locals", "opcodes", "args", "operands")
+
+    def __init__(self, name: int, n_locals: int) -> None:
+        """
+        Args:
+            name: The id of the function's name in `VMCode.names`.
+            n_locals: The number of local variables of the function.
+        """
+        self.name = name
+        self.n_locals = n_locals
+        self.opcodes = array("B")
+        self.args = array("H")
+        self.operands = array("i")
+
+    def __len__(self) -> int:
+        return len(self.opcodes)
+
+    def append(self, opcode: int, arg: int = 0, operand: int = 0) -> None:
+        """Append one instruction."""
+        self.opcodes.append(opcode)
+        self.args.append(arg)
+        self.operands.append(operand)
+
+    def extend(self, other: "VMFunction") -> None:
+        """Append the instructions of another function."""
+        self.opcodes.extend(other.opcodes)
+        self.args.extend(other.args)
+        self.operands.extend(other.operands)
+
+    def instructions(self) -> list[Instruction]:
+        """Return the instructions as `(opcode, arg, operand)` tuples."""
+        return list(zip(self.opcodes, self.args, self.operands))
+
+    def replace(self, instructions: typing.Iterable[Instruction]) -> None:
+        """Replace the function body with the given instructions."""
+        self.opcodes = array("B")
+        self.args = array("H")
+        self.operands = array("i")
+        for opcode, arg, operand in instructions:
+            self.append(opcode, arg, operand)
+
+
+class VMCode:
+    """A list of VM functions sharing one table of label and function names."""
+
+    def __init__(self) -> None:
+        self.names: list[str] = []
+        self.name_ids: dict[str, int] = {}
+        self.functions: list[VMFunction] = []
+
+    def name_id(self, name: str) -> int:
+        """Return the id of a label or function name, adding it if new."""
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def add_function(self, name: str, n_locals: int) -> VMFunction:
+        """Start a new function; the following instructions go into it."""
+        function = VMFunction(self.name_id(name), n_locals)
+        self.functions.append(function)
+        return function
+
+    def function_name(self, function: VMFunction) -> str:
+        """Return the name of one of the functions."""
+        return self.names[function.name]
+
+    def render(self, instruction: Instruction) -> str:
+        """Return the VM text of one instruction, without a newline."""
+        opcode, arg, operand = instruction
+        if opcode == PUSH or opcode == POP:
+            return f"{OPCODE_NAMES[opcode]} {SEGMENT_NAMES[arg]} {operand}"
+        elif opcode == CALL:
+            return f"call {self.names[operand]} {arg}"
+        elif opcode in BRANCHES:
+            return f"{OPCODE_NAMES[opcode]} {self.names[operand]}"
+        return OPCODE_NAMES[opcode]
+
+    def function_text(self, function: VMFunction) -> str:
+        """Return the VM text of one function, header included."""
+        lines = [f"function {self.names[function.name]} {function.n_locals}"]
+        lines.extend(map(self.render, zip(
+            function.opcodes, function.args, function.operands)))
+        lines.append("")
+        return "\n".join(lines)
+
+    def to_text(self) -> str:
+        """Return the VM text of all functions, as a `.vm` file holds it."""
+        return "".join(map(self.function_text, self.functions))
+
+    def clear(self) -> None:
+        """Drop all functions (the name table is kept)."""
+        self.functions.clear()
+
+
+def parse(text: str) -> VMCode:
+    """Return the code of a `.vm` file.
+
+    Raises:
+        ValueError: On a malformed line, or a command outside a function.
+    """
+    code = VMCode()
+    function = None
+    for number, line in enumerate(text.splitlines(), 1):
+        words = line.split("//", 1)[0].split()
+        if not words:
+            continue
+        command = words[0]
+        try:
+            if command == "function":
+                function = code.add_function(words[1], int(words[2]))
+            elif function is None:
+                raise ValueError("outside a function")
+            elif command == "push" or command == "pop":
+                function.append(OPCODE_NAMES.index(command),
+                                SEGMENTS[words[1]], int(words[2]))
+            elif command == "call":
+                function.append(CALL, int(words[2]), code.name_id(words[1]))
+            elif command in ("label", "goto", "if-goto"):
+                function.append(OPCODE_NAMES.index(command), 0,
+                                code.name_id(words[1]))
+            else:
+                # arithmetic, return
+                function.append(OPCODE_NAMES.index(command))
+        except (IndexError, KeyError, ValueError) as error:
+            raise ValueError(f"line {number}: cannot parse {line.strip()!r}"
+                             f" ({error})") from None
+    return code
@@ -0,0 +1,744 @@
+"""
+This file is part of nand2tetris, as taught in The Hebrew University, and
+was written by Aviv Yaish. It is an extension to the specifications given
+[here](https://www.nand2tetris.org) (Shimon Schocken and Noam Nisan, 2017),
+as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
+Unported [License](https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+
+"""Headless VM emulator with instruction counts and hot-spot profiling.
+
+`VMEmulator` runs a program given as `VMCode` instruction lists (the
+compiler's in-memory output) or as `.vm` files (`load`). The code is
+decoded up front into integer opcodes, one per segment for push and pop,
+with labels and calls resolved to instruction indices, and memory is laid
+out as on the Hack platform (SP, LCL, ARG, THIS and THAT in RAM[0..4],
+temp at 5, statics from 16, the stack from 256, the heap from 2048).
+
+OS functions that the program does not define come from `StubOS`, written
+in Python: Math, Memory, Array and String work; Output and Keyboard read
+and write text (`VMEmulator.output`, scripted keys and input lines);
+Screen calls are no-ops. A program that ships the OS as `.vm` files runs
+the Jack implementation instead.
+
+Every run counts the instructions executed per function, the calls of
+each function (OS included) and the iterations and instructions of each
+loop, i.e. each backward jump (`VMEmulator.report`).
+
+Usage:
+    python VMEmulator.py PATH [--keys K,...] [--input LINE] [--max-steps N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import typing
+import VMCode
+from VMCode import (PUSH, POP, ADD, SUB, NEG, EQ, GT, LT, AND, OR, NOT,
+                    LABEL, GOTO, IF_GOTO, CALL, RETURN, CONSTANT, ARGUMENT,
+                    LOCAL, STATIC, THIS, THAT, POINTER, TEMP)
+
+# Decoded opcodes; push and pop have one per segment.
+(D_PUSH_CONSTANT, D_PUSH_LOCAL, D_PUSH_ARGUMENT, D_PUSH_THIS, D_PUSH_THAT,
+ D_PUSH_FIXED, D_POP_LOCAL, D_POP_ARGUMENT, D_POP_THIS, D_POP_THAT,
+ D_POP_FIXED, D_ADD, D_SUB, D_NEG, D_EQ, D_GT, D_LT, D_AND, D_OR, D_NOT,
+ D_GOTO, D_IF_GOTO, D_CALL, D_CALL_OS, D_CALL_UNDEFINED, D_RETURN,
+ D_FUNCTION) = range(27)
+
+PUSHES = {CONSTANT: D_PUSH_CONSTANT, LOCAL: D_PUSH_LOCAL,
+          ARGUMENT: D_PUSH_ARGUMENT, THIS: D_PUSH_THIS, THAT: D_PUSH_THAT}
+POPS = {LOCAL: D_POP_LOCAL, ARGUMENT: D_POP_ARGUMENT, THIS: D_POP_THIS,
+        THAT: D_POP_THAT}
+OPERATIONS = {ADD: D_ADD, SUB: D_SUB, NEG: D_NEG, EQ: D_EQ, GT: D_GT,
+              LT: D_LT, AND: D_AND, OR: D_OR, NOT: D_NOT}
+
+SP, LCL, ARG, THIS_POINTER, THAT_POINTER = range(5)
+TEMP_BASE = 5
+STATIC_BASE = 16
+STACK_BASE = 256
+HEAP_BASE = 2048
+HEAP_END = 16384
+RAM_SIZE = 32768
+DEFAULT_MAX_STEPS = 50_000_000
+
+NEW_LINE, BACKSPACE, DOUBLE_QUOTE = 128, 129, 34
+
+
+class EmulatorError(Exception):
+    """A run-time error of the emulated program."""
+
+
+class Halt(Exception):
+    """Raised by `Sys.halt`, to end a run."""
+
+
+def word(value: int) -> int:
+    """Wrap a value to a signed 16-bit word."""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class StubOS:
+    """The OS functions, in Python, working on the emulator's memory.
+
+    A string is an object of three words, [capacity, length, characters],
+    the last one the address of its characters.
+    """
+
+    def __init__(self, emulator: "VMEmulator") -> None:
+        self.emulator = emulator
+        self.ram = emulator.ram
+        self.heap = HEAP_BASE
+
+    def functions(self) -> dict[str, typing.Callable[..., int]]:
+        """Return the OS functions, by VM name."""
+        functions = {}
+        for name in dir(self):
+            class_name, _, function = name.partition("_")
+            if class_name in ("Math", "Memory", "Array", "String", "Output",
+                              "Screen", "Keyboard", "Sys"):
+                functions[f"{class_name}.{function}"] = getattr(self, name)
+        return functions
+
+    # Math
+    def Math_init(self) -> int:
+        return 0
+
+    def Math_multiply(self, x: int, y: int) -> int:
+        return word(x * y)
+
+    def Math_divide(self, x: int, y: int) -> int:
+        if y == 0:
+            raise EmulatorError("division by zero")
+        quotient = abs(x) // abs(y)
+        return word(quotient if (x < 0) == (y < 0) else -quotient)
+
+    def Math_min(self, x: int, y: int) -> int:
+        return min(x, y)
+
+    def Math_max(self, x: int, y: int) -> int:
+        return max(x, y)
+
+    def Math_abs(self, x: int) -> int:
+        return word(abs(x))
+
+    def Math_sqrt(self, x: int) -> int:
+        if x < 0:
+            raise EmulatorError("square root of a negative number")
+        return int(x ** 0.5)
+
+    # Memory
+    def Memory_init(self) -> int:
+        return 0
+
+    def Memory_peek(self, address: int) -> int:
+        return self.ram[address & 0x7FFF]
+
+    def Memory_poke(self, address: int, value: int) -> int:
+        self.ram[address & 0x7FFF] = value
+        return 0
+
+    def Memory_alloc(self, size: int) -> int:
+        if size < 0:
+            raise EmulatorError(f"allocation of {size} words")
+        address = self.heap
+        self.heap += max(size, 1)
+        if self.heap > HEAP_END:
+            raise EmulatorError("heap overflow")
+        return address
+
+    def Memory_deAlloc(self, address: int) -> int:
+        return 0
+
+    # Array
+    def Array_new(self, size: int) -> int:
+        return self.Memory_alloc(size)
+
+    def Array_dispose(self, this: int) -> int:
+        return 0
+
+    # String
+    def String_new(self, capacity: int) -> int:
+        this = self.Memory_alloc(3)
+        self.ram[this:this + 3] = [capacity, 0, self.Memory_alloc(capacity)]
+        return this
+
+    def String_dispose(self, this: int) -> int:
+        return 0
+
+    def String_length(self, this: int) -> int:
+        return self.ram[this + 1]
+
+    def String_charAt(self, this: int, index: int) -> int:
+        return self.ram[self.ram[this + 2] + index]
+
+    def String_setCharAt(self, this: int, index: int, char: int) -> int:
+        self.ram[self.ram[this + 2] + index] = char
+        return 0
+
+    def String_appendChar(self, this: int, char: int) -> int:
+        length = self.ram[this + 1]
+        if length >= self.ram[this]:
+            raise EmulatorError("string is full")
+        self.ram[self.ram[this + 2] + length] = char
+        self.ram[this + 1] = length + 1
+        return this
+
+    def String_eraseLastChar(self, this: int) -> int:
+        if self.ram[this + 1] > 0:
+            self.ram[this + 1] -= 1
+        return 0
+
+    def String_intValue(self, this: int) -> int:
+        text = self.text(this)
+        digits = text[1:] if text.startswith("-") else text
+        value = 0
+        for char in digits:
+            if not char.isdigit():
+                break
+            value = value * 10 + int(char)
+        return word(-value if text.startswith("-") else value)
+
+    def String_setInt(self, this: int, value: int) -> int:
+        self.ram[this + 1] = 0
+        for char in str(value):
+            self.String_appendChar(this, ord(char))
+        return 0
+
+    def String_backSpace(self) -> int:
+        return BACKSPACE
+
+    def String_doubleQuote(self) -> int:
+        return DOUBLE_QUOTE
+
+    def String_newLine(self) -> int:
+        return NEW_LINE
+
+    def text(self, this: int) -> str:
+        """Return the characters of a string object."""
+        start = self.ram[this + 2]
+        return "".join(map(chr, self.ram[start:start + self.ram[this + 1]]))
+
+    # Output
+    def Output_init(self) -> int:
+        return 0
+
+    def Output_moveCursor(self, row: int, column: int) -> int:
+        return 0
+
+    def Output_printChar(self, char: int) -> int:
+        if char == NEW_LINE:
+            self.emulator.output.append("\n")
+        elif char == BACKSPACE:
+            self.emulator.output.append("\b")
+        else:
+            self.emulator.output.append(chr(char))
+        return 0
+
+    def Output_printString(self, string: int) -> int:
+        self.emulator.output.append(self.text(string))
+        return 0
+
+    def Output_printInt(self, value: int) -> int:
+        self.emulator.output.append(str(value))
+        return 0
+
+    def Output_println(self) -> int:
+        self.emulator.output.append("\n")
+        return 0
+
+    def Output_backSpace(self) -> int:
+        self.emulator.output.append("\b")
+        return 0
+
+    # Screen
+    def Screen_init(self) -> int:
+        return 0
+
+    def Screen_clearScreen(self) -> int:
+        return 0
+
+    def Screen_setColor(self, color: int) -> int:
+        return 0
+
+    def Screen_drawPixel(self, x: int, y: int) -> int:
+        return 0
+
+    def Screen_drawLine(self, x1: int, y1: int, x2: int, y2: int) -> int:
+        return 0
+
+    def Screen_drawRectangle(self, x1: int, y1: int, x2: int, y2: int) -> int:
+        return 0
+
+    def Screen_drawCircle(self, x: int, y: int, r: int) -> int:
+        return 0
+
+    # Keyboard
+    def Keyboard_init(self) -> int:
+        return 0
+
+    def Keyboard_keyPressed(self) -> int:
+        keys = self.emulator.keys
+        return keys.pop(0) if keys else 0
+
+    def Keyboard_readChar(self) -> int:
+        line = self.read()
+        return ord(line[0]) if line else NEW_LINE
+
+    def Keyboard_readLine(self, message: int) -> int:
+        self.Output_printString(message)
+        line = self.read()
+        string = self.String_new(len(line))
+        for char in line:
+            self.String_appendChar(string, ord(char))
+        return string
+
+    def Keyboard_readInt(self, message: int) -> int:
+        self.Output_printString(message)
+        line = self.read().strip()
+        try:
+            return word(int(line))
+        except ValueError:
+            return 0
+
+    def read(self) -> str:
+        """Return the next scripted input line, echoed to the output."""
+        lines = self.emulator.lines
+        line = lines.pop(0) if lines else ""
+        self.emulator.output.append(line + "\n")
+        return line
+
+    # Sys
+    def Sys_init(self) -> int:
+        return 0
+
+    def Sys_halt(self) -> int:
+        raise Halt
+
+    def Sys_error(self, code: int) -> int:
+        raise EmulatorError(f"Sys.error({code})")
+
+    def Sys_wait(self, duration: int) -> int:
+        return 0
+
+
+class VMEmulator:
+    """Runs a VM program, counting what it executes."""
+
+    def __init__(self, program: dict[str, VMCode.VMCode],
+                 keys: typing.Iterable[int] = (),
+                 lines: typing.Iterable[str] = ()) -> None:
+        """Decode a program.
+
+        Args:
+            program: The code of each class, by class (`.vm` file) name,
+                which names its statics.
+            keys: The codes `Keyboard.keyPressed` returns, in turn; then 0.
+            lines: The lines the Keyboard read functions return, in turn.
+
+        Raises:
+            EmulatorError: If there is no entry point, `Sys.init` or else
+                `Main.main`, or the statics do not fit.
+        """
+        self.ram = [0] * RAM_SIZE
+        self.keys = list(keys)
+        self.lines = list(lines)
+        self.output: list[str] = []
+        self.os = StubOS(self)
+
+        # function name -> entry index, for the defined functions
+        self.entries: dict[str, int] = {}
+        self.function_names: list[str] = []
+        self.function_starts: list[int] = []
+        # decoded code: opcode, argument, operand
+        self.opcodes: list[int] = []
+        self.args: list[int] = []
+        self.operands: list[int] = []
+        self.os_functions: list[tuple[str, typing.Callable[..., int]]] = []
+        self.loops: list[tuple[int, int, str]] = []
+
+        statics = STATIC_BASE
+        calls = []
+        for class_name, code in program.items():
+            last_static = -1
+            for function in code.functions:
+                for opcode, arg, operand in function.instructions():
+                    if (opcode == PUSH or opcode == POP) and arg == STATIC:
+                        last_static = max(last_static, operand)
+            calls += self.decode(code, statics)
+            statics += last_static + 1
+        if statics > STACK_BASE:
+            raise EmulatorError("too many statics")
+        self.resolve(calls)
+        if "Sys.init" in self.entries:
+            self.entry = "Sys.init"
+        elif "Main.main" in self.entries:
+            self.entry = "Main.main"
+        else:
+            raise EmulatorError("no Sys.init or Main.main")
+        self.counts = [0] * len(self.opcodes)
+        self.calls: dict[str, int] = {}
+        self.steps = 0
+
+    def decode(self, code: VMCode.VMCode, statics: int) -> list[tuple[int, str]]:
+        """Decode the code of one class, whose statics start at the given
+        address.
+
+        Returns:
+            The calls to resolve, as (instruction index, callee).
+        """
+        calls = []
+        for function in code.functions:
+            name = code.function_name(function)
+            start = len(self.opcodes)
+            self.entries[name] = start
+            self.function_names.append(name)
+            self.function_starts.append(start)
+            labels: dict[int, int] = {}
+            jumps = []
+            self.emit(D_FUNCTION, 0, function.n_locals)
+            for opcode, arg, operand in function.instructions():
+                if opcode == LABEL:
+                    labels[operand] = len(self.opcodes)
+                elif opcode == PUSH or opcode == POP:
+                    base = {STATIC: statics, TEMP: TEMP_BASE,
+                            POINTER: THIS_POINTER}.get(arg)
+                    if base is not None:
+                        decoded = D_PUSH_FIXED if opcode == PUSH else D_POP_FIXED
+                        self.emit(decoded, 0, base + operand)
+                    elif opcode == PUSH:
+                        self.emit(PUSHES[arg], 0, operand)
+                    elif arg == CONSTANT:
+                        raise EmulatorError(f"{name}: pop constant")
+                    else:
+                        self.emit(POPS[arg], 0, operand)
+                elif opcode == GOTO or opcode == IF_GOTO:
+                    jumps.append(len(self.opcodes))
+                    self.emit(D_GOTO if opcode == GOTO else D_IF_GOTO, 0,
+                              operand)
+                elif opcode == CALL:
+                    calls.append((len(self.opcodes), code.names[operand]))
+                    self.emit(D_CALL, arg, 0)
+                elif opcode == RETURN:
+                    self.emit(D_RETURN)
+                else:
+                    self.emit(OPERATIONS[opcode])
+            for index in jumps:
+                label = self.operands[index]
+                if label not in labels:
+                    raise EmulatorError(
+                        f"{name}: unknown label {code.names[label]}")
+                target = self.operands[index] = labels[label]
+                if target <= index:
+                    self.loops.append((target, index, code.names[label]))
+        return calls
+
+    def emit(self, opcode: int, arg: int = 0, operand: int = 0) -> None:
+        self.opcodes.append(opcode)
+        self.args.append(arg)
+        self.operands.append(operand)
+
+    def resolve(self, calls: list[tuple[int, str]]) -> None:
+        """Point every call at its function, defined or from the OS."""
+        os_functions = self.os.functions()
+        os_ids: dict[str, int] = {}
+        for index, callee in calls:
+            if callee in self.entries:
+                self.operands[index] = self.entries[callee]
+            elif callee in os_functions:
+                if callee not in os_ids:
+                    os_ids[callee] = len(self.os_functions)
+                    self.os_functions.append((callee, os_functions[callee]))
+                self.opcodes[index] = D_CALL_OS
+                self.operands[index] = os_ids[callee]
+            else:
+                self.opcodes[index] = D_CALL_UNDEFINED
+                self.operands[index] = len(self.os_functions)
+                self.os_functions.append((callee, None))
+
+    def run(self, max_steps: int = DEFAULT_MAX_STEPS) -> str:
+        """Run the program from its entry point.
+
+        Args:
+            max_steps: Stop after this many instructions.
+
+        Returns:
+            Why the run ended: "returned" (from the entry point), "halted"
+            (`Sys.halt`) or "max-steps".
+
+        Raises:
+            EmulatorError: On a run-time error, e.g. a call of a function
+                that is neither defined nor part of the OS.
+        """
+        ram = self.ram
+        opcodes, args, operands = self.opcodes, self.args, self.operands
+        counts = self.counts
+        os_functions = self.os_functions
+        os_calls = [0] * len(os_functions)
+        calls = [0] * len(opcodes)
+        ram[SP] = ram[LCL] = ram[ARG] = STACK_BASE
+        # the entry point returns to -1
+        ram[STACK_BASE:STACK_BASE + 5] = [-1, 0, 0, 0, 0]
+        sp = STACK_BASE + 5
+        ram[LCL] = sp
+        pc = self.entries[self.entry]
+        calls[pc] += 1
+        steps = 0
+        reason = "max-steps"
+        try:
+            while steps < max_steps:
+                steps += 1
+                counts[pc] += 1
+                opcode = opcodes[pc]
+                operand = operands[pc]
+                pc += 1
+                if opcode == D_PUSH_CONSTANT:
+                    ram[sp] = operand
+                    sp += 1
+                elif opcode == D_PUSH_LOCAL:
+                    ram[sp] = ram[ram[LCL] + operand]
+                    sp += 1
+                elif opcode == D_PUSH_ARGUMENT:
+                    ram[sp] = ram[ram[ARG] + operand]
+                    sp += 1
+                elif opcode == D_PUSH_FIXED:
+                    ram[sp] = ram[operand]
+                    sp += 1
+                elif opcode == D_POP_LOCAL:
+                    sp -= 1
+                    ram[ram[LCL] + operand] = ram[sp]
+                elif opcode == D_POP_FIXED:
+                    sp -= 1
+                    ram[operand] = ram[sp]
+                elif opcode == D_PUSH_THIS:
+                    ram[sp] = ram[ram[THIS_POINTER] + operand]
+                    sp += 1
+                elif opcode == D_PUSH_THAT:
+                    ram[sp] = ram[ram[THAT_POINTER] + operand]
+                    sp += 1
+                elif opcode == D_IF_GOTO:
+                    sp -= 1
+                    if ram[sp]:
+                        pc = operand
+                elif opcode == D_GOTO:
+                    pc = operand
+                elif opcode == D_ADD:
+                    sp -= 1
+                    value = (ram[sp - 1] + ram[sp]) & 0xFFFF
+                    ram[sp - 1] = value - 0x10000 if value & 0x8000 else value
+                elif opcode == D_SUB:
+                    sp -= 1
+                    value = (ram[sp - 1] - ram[sp]) & 0xFFFF
+                    ram[sp - 1] = value - 0x10000 if value & 0x8000 else value
+                elif opcode == D_LT:
+                    sp -= 1
+                    ram[sp - 1] = -1 if ram[sp - 1] < ram[sp] else 0
+                elif opcode == D_GT:
+                    sp -= 1
+                    ram[sp - 1] = -1 if ram[sp - 1] > ram[sp] else 0
+                elif opcode == D_EQ:
+                    sp -= 1
+                    ram[sp - 1] = -1 if ram[sp - 1] == ram[sp] else 0
+                elif opcode == D_NOT:
+                    ram[sp - 1] = ~ram[sp - 1]
+                elif opcode == D_AND:
+                    sp -= 1
+                    ram[sp - 1] &= ram[sp]
+                elif opcode == D_OR:
+                    sp -= 1
+                    ram[sp - 1] |= ram[sp]
+                elif opcode == D_NEG:
+                    ram[sp - 1] = word(-ram[sp - 1])
+                elif opcode == D_POP_THIS:
+                    sp -= 1
+                    ram[ram[THIS_POINTER] + operand] = ram[sp]
+                elif opcode == D_POP_THAT:
+                    sp -= 1
+                    ram[ram[THAT_POINTER] + operand] = ram[sp]
+                elif opcode == D_POP_ARGUMENT:
+                    sp -= 1
+                    ram[ram[ARG] + operand] = ram[sp]
+                elif opcode == D_CALL:
+                    n_args = args[pc - 1]
+                    ram[sp:sp + 5] = [pc, ram[LCL], ram[ARG],
+                                      ram[THIS_POINTER], ram[THAT_POINTER]]
+                    ram[ARG] = sp - n_args
+                    sp += 5
+                    ram[LCL] = sp
+                    pc = operand
+                    calls[pc] += 1
+                elif opcode == D_FUNCTION:
+                    if operand:
+                        ram[sp:sp + operand] = [0] * operand
+                        sp += operand
+                    if sp >= HEAP_BASE:
+                        raise EmulatorError("stack overflow")
+                elif opcode == D_RETURN:
+                    frame = ram[LCL]
+                    return_address = ram[frame - 5]
+                    arg = ram[ARG]
+                    ram[arg] = ram[sp - 1]
+                    sp = arg + 1
+                    ram[LCL], ram[ARG], ram[THIS_POINTER], ram[THAT_POINTER] = \
+                        ram[frame - 4:frame]
+                    if return_address < 0:
+                        reason = "returned"
+                        break
+                    pc = return_address
+                elif opcode == D_CALL_OS:
+                    n_args = args[pc - 1]
+                    sp -= n_args
+                    os_calls[operand] += 1
+                    ram[SP] = sp
+                    value = os_functions[operand][1](*ram[sp:sp + n_args])
+                    ram[sp] = value
+                    sp += 1
+                else:
+                    raise EmulatorError(
+                        f"call of undefined function "
+                        f"{os_functions[operand][0]}")
+        except Halt:
+            reason = "halted"
+        except IndexError:
+            raise EmulatorError(
+                f"memory access out of range in {self.function_at(pc - 1)}") \
+                from None
+        except TypeError as error:
+            raise EmulatorError(f"{self.function_at(pc - 1)}: {error}") \
+                from None
+        finally:
+            ram[SP] = sp
+            self.steps += steps
+            for name, start in self.entries.items():
+                if calls[start]:
+                    self.calls[name] = self.calls.get(name, 0) + calls[start]
+            for (name, _), count in zip(os_functions, os_calls):
+                if count:
+                    self.calls[name] = self.calls.get(name, 0) + count
+        return reason
+
+    def function_at(self, index: int) -> str:
+        """Return the name of the function holding a decoded instruction."""
+        name = "?"
+        for start, function_name in zip(self.function_starts,
+                                        self.function_names):
+            if start > index:
+                break
+            name = function_name
+        return name
+
+    def report(self, top: int = 10) -> dict[str, typing.Any]:
+        """Return the profile of the runs so far.
+
+        Args:
+            top: The number of loops to list.
+
+        Returns:
+            A JSON-serializable dict: "steps" (instructions executed, the
+            `function` commands included), "instructions" per function,
+            "calls" per function, and "loops", the `top` hottest loops
+            with their function, label, iterations and instructions.
+        """
+        instructions = {}
+        ends = self.function_starts[1:] + [len(self.opcodes)]
+        for name, start, end in zip(self.function_names,
+                                    self.function_starts, ends):
+            executed = sum(self.counts[start:end])
+            if executed:
+                instructions[name] = executed
+        loops = []
+        for target, jump, label in self.loops:
+            executed = sum(self.counts[target:jump + 1])
+            if executed:
+                loops.append({"function": self.function_at(jump),
+                              "label": label,
+                              "iterations": self.counts[jump],
+                              "instructions": executed})
+        loops.sort(key=lambda loop: -loop["instructions"])
+        return {
+            "steps": self.steps,
+            "instructions": dict(sorted(instructions.items(),
+                                        key=lambda item: -item[1])),
+            "calls": dict(sorted(self.calls.items(),
+                                 key=lambda item: -item[1])),
+            "loops": loops[:top],
+        }
+
+
+def load(path: str) -> dict[str, VMCode.VMCode]:
+    """Return the code of a `.vm` file, or of all those in a directory, by
+    class name."""
+    if os.path.isdir(path):
+        paths = [os.path.join(path, filename)
+                 for filename in sorted(os.listdir(path))
+                 if filename.endswith(".vm")]
+    else:
+        paths = [path]
+    program = {}
+    for vm_path in paths:
+        with open(vm_path) as vm_file:
+            program[os.path.splitext(os.path.basename(vm_path))[0]] = \
+                VMCode.parse(vm_file.read())
+    return program
+
+
+def format_report(report: dict[str, typing.Any], top: int = 10) -> str:
+    """Return a profile (see `VMEmulator.report`) as text."""
+    lines = [f"steps: {report['steps']}", "instructions per function:"]
+    for name, count in list(report["instructions"].items())[:top]:
+        lines.append(f"  {name:40}{count:>12}")
+    lines.append("calls:")
+    for name, count in list(report["calls"].items())[:top]:
+        lines.append(f"  {name:40}{count:>12}")
+    lines.append("hottest loops (iterations, instructions):")
+    for loop in report["loops"][:top]:
+        lines.append(f"  {loop['function'] + ' ' + loop['label']:40}"
+                     f"{loop['iterations']:>12}{loop['instructions']:>12}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] = None) -> int:
+    """Command-line entry point.
+
+    Returns:
+        The process exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="VMEmulator",
+        description="Runs the .vm files of a program and profiles them.")
+    parser.add_argument("path", help="a .vm file or a directory")
+    parser.add_argument("--keys", default="",
+                        help="comma-separated key codes for "
+                             "Keyboard.keyPressed, e.g. 130,0,132")
+    parser.add_argument("--input", action="append", default=[],
+                        metavar="LINE", help="a line for the Keyboard read "
+                                             "functions (repeatable)")
+    parser.add_argument("--max-steps", type=int, default=DEFAULT_MAX_STEPS,
+                        help="stop after this many instructions")
+    parser.add_argument("--top", type=int, default=10,
+                        help="entries per section of the profile")
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the profile to FILE as JSON")
+    args = parser.parse_args(argv)
+    keys = [int(key) for key in args.keys.split(",") if key.strip()]
+    try:
+        emulator = VMEmulator(load(args.path), keys, args.input)
+        reason = emulator.run(args.max_steps)
+    except (OSError, ValueError, EmulatorError) as error:
+        print(f"{args.path}: {error}", file=sys.stderr)
+        return 1
+    print("".join(emulator.output))
+    print(f"-- {reason}")
+    report = emulator.report(args.top)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+            json_file.write("\n")
+    else:
+        print(format_report(report, args.top))
+    return 0
+
+
+if "__main__" == __name__:
+    sys.exit(main())
@@ -15,9 +15,21 @@ output stream.
 kinds (`arg`, `var`, `static`, `field`) plus a few extra pseudo-segments used
 during compilation (`const`, `that`, `pointer`, `temp`). These are mapped to
 the Hack VM segment names via `kind_dict`.
+
+In buffered mode commands are collected in memory and written in large
+chunks (at subroutine boundaries, once enough has accumulated) and on
+`flush()`. The bytes written are the same in both modes.
+
+In IR mode commands are instead recorded in a `VMCode` instruction list
+(`self.code`), which `flush()` renders to the output stream, if any. Passes
+that rewrite the code run on `self.code` before it is flushed.
 """
 
 import typing
+import VMCode
+
+# Buffered mode writes once this many commands are pending.
+FLUSH_THRESHOLD = 8192
 
 
 class VMWriter:
@@ -26,13 +38,83 @@ class VMWriter:
     """
     # Map compiler-internal segment names -> VM segment names.
     kind_dict = {"arg": "argument", "var": "local", "static": "static", "field": "this", "const": "constant", "that": "that", "pointer": "pointer", "temp": "temp"}
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    # Pre-rendered command prefixes, per compiler-internal segment name.
+    push_dict = {kind: f"push {segment} " for kind, segment in kind_dict.items()}
+    pop_dict = {kind: f"pop {segment} " for kind, segment in kind_dict.items()}
+    # Compiler-internal segment names -> IR segment codes.
+    segment_codes = {kind: VMCode.SEGMENTS[segment] for kind, segment in kind_dict.items()}
+
+    def __init__(self, output_stream: typing.TextIO, buffered: bool = False,
+                 ir: bool = False) -> None:
         """Create a new VMWriter.
 
         Args:
             output_stream: A writable text stream where VM commands are written.
+                May be None in IR mode, to only keep the code in memory.
+            buffered: Collect commands in memory and write them in chunks.
+                `flush()` must be called once all commands are written.
+            ir: Record commands in a `VMCode` instruction list instead.
+                `flush()` must be called once all commands are written.
         """
         self.__output_file = output_stream
+        self.__buffer: list[str] = []
+        self.buffered = buffered
+        self.code: VMCode.VMCode = VMCode.VMCode() if ir else None
+        self.__function: VMCode.VMFunction = None
+        # Enclosing (emitter or function, capture) pairs; see start_capture.
+        self.__captures: list[tuple] = []
+        if buffered or ir:
+            self.__emit = self.__buffer.append
+        else:
+            self.__emit = output_stream.write
+
+    def flush(self) -> None:
+        """Write out all buffered commands (a no-op when unbuffered).
+
+        In IR mode, render the recorded code to the output stream and start
+        over with an empty instruction list; without an output stream the
+        code is kept.
+        """
+        if self.code is not None:
+            if self.__output_file is not None:
+                self.__output_file.write(self.code.to_text())
+                self.code.clear()
+                self.__function = None
+        elif self.__buffer:
+            self.__output_file.write("".join(self.__buffer))
+            self.__buffer.clear()
+
+    def start_capture(self) -> None:
+        """Divert the following commands into a capture, until
+        `end_capture()`. Captures may nest."""
+        if self.code is not None:
+            capture = VMCode.VMFunction(0, 0)
+            self.__captures.append((self.__function, capture))
+            self.__function = capture
+        else:
+            capture = []
+            self.__captures.append((self.__emit, capture))
+            self.__emit = capture.append
+
+    def end_capture(self) -> typing.Any:
+        """Stop the innermost capture.
+
+        Returns:
+            The captured commands, to pass to `write_capture()` (or drop).
+        """
+        previous, capture = self.__captures.pop()
+        if self.code is not None:
+            self.__function = previous
+        else:
+            self.__emit = previous
+        return capture
+
+    def write_capture(self, capture: typing.Any) -> None:
+        """Writes the commands of a capture."""
+        if self.code is not None:
+            self.__function.extend(capture)
+        else:
+            self.__emit("".join(capture))
 
     def write_push(self, segment: str, index: int) -> None:
         """Writes a VM push command.
@@ -42,7 +124,10 @@ class VMWriter:
             "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP"
             index (int): the index to push to.
         """
-        self.__output_file.write(f"push {self.kind_dict[segment]} {index}\n")
+        if self.code is not None:
+            self.__function.append(VMCode.PUSH, self.segment_codes[segment], index)
+        else:
+            self.__emit(f"{self.push_dict[segment]}{index}\n")
 
     def write_pop(self, segment: str, index: int) -> None:
         """Writes a VM pop command.
@@ -52,7 +137,10 @@ class VMWriter:
             "LOCAL", "STATIC", "THIS", "THAT", "POINTER", "TEMP".
             index (int): the index to pop from.
         """
-        self.__output_file.write(f"pop {self.kind_dict[segment]} {index}\n")
+        if self.code is not None:
+            self.__function.append(VMCode.POP, self.segment_codes[segment], index)
+        else:
+            self.__emit(f"{self.pop_dict[segment]}{index}\n")
 
     def write_arithmetic(self, command: str) -> None:
         """Writes a VM arithmetic command.
@@ -61,7 +149,16 @@ class VMWriter:
             command (str): the command to write, can be "ADD", "SUB", "NEG", 
             "EQ", "GT", "LT", "AND", "OR", "NOT", "SHIFTLEFT", "SHIFTRIGHT".
         """
-        self.__output_file.write(f"{command}\n")
+        if self.code is not None:
+            opcode = VMCode.ARITHMETIC.get(command)
+            if opcode is not None:
+                self.__function.append(opcode)
+            else:
+                # Multiplication and division arrive as "call Math.xxx 2".
+                _, name, n_args = command.split()
+                self.write_call(name, int(n_args))
+        else:
+            self.__emit(f"{command}\n")
 
     def write_label(self, label: str) -> None:
         """Writes a VM label command.
@@ -69,7 +166,10 @@ class VMWriter:
         Args:
             label (str): the label to write.
         """
-        self.__output_file.write(f"label {label}\n")
+        if self.code is not None:
+            self.__function.append(VMCode.LABEL, 0, self.code.name_id(label))
+        else:
+            self.__emit(f"label {label}\n")
 
     def write_goto(self, label: str) -> None:
         """Writes a VM goto command.
@@ -77,7 +177,10 @@ class VMWriter:
         Args:
             label (str): the label to go to.
         """
-        self.__output_file.write(f"goto {label}\n")
+        if self.code is not None:
+            self.__function.append(VMCode.GOTO, 0, self.code.name_id(label))
+        else:
+            self.__emit(f"goto {label}\n")
 
     def write_if(self, label: str) -> None:
         """Writes a VM if-goto command.
@@ -85,7 +188,10 @@ class VMWriter:
         Args:
             label (str): the label to go to.
         """
-        self.__output_file.write(f"if-goto {label}\n")
+        if self.code is not None:
+            self.__function.append(VMCode.IF_GOTO, 0, self.code.name_id(label))
+        else:
+            self.__emit(f"if-goto {label}\n")
 
     def write_call(self, name: str, n_args: int) -> None:
         """Writes a VM call command.
@@ -94,7 +200,10 @@ class VMWriter:
             name (str): the name of the function to call.
             n_args (int): the number of arguments the function receives.
         """
-        self.__output_file.write(f"call {name} {n_args}\n")
+        if self.code is not None:
+            self.__function.append(VMCode.CALL, n_args, self.code.name_id(name))
+        else:
+            self.__emit(f"call {name} {n_args}\n")
 
     def write_function(self, name: str, n_locals: int) -> None:
         """Writes a VM function command.
@@ -103,8 +212,36 @@ class VMWriter:
             name (str): the name of the function.
             n_locals (int): the number of local variables the function uses.
         """
-        self.__output_file.write(f"function {name} {n_locals}\n")
+        if self.code is not None:
+            self.__function = self.code.add_function(name, n_locals)
+            return
+        if self.buffered and len(self.__buffer) >= FLUSH_THRESHOLD:
+            self.flush()
+        self.__emit(f"function {name} {n_locals}\n")
+
+    def write_string(self, string: str) -> None:
+        """Writes the commands that build a string constant: `String.new`
+        followed by one `String.appendChar` call per character.
+
+        Args:
+            string (str): the string constant, without quotes.
+        """
+        if self.code is not None:
+            self.write_push("const", len(string))
+            self.write_call("String.new", 1)
+            for char in string:
+                self.write_push("const", ord(char))
+                self.write_call("String.appendChar", 2)
+            return
+        append = "\ncall String.appendChar 2\npush constant "
+        chars = append.join([str(ord(char)) for char in string])
+        if chars:
+            chars = f"push constant {chars}\ncall String.appendChar 2\n"
+        self.__emit(f"push constant {len(string)}\ncall String.new 1\n{chars}")
 
     def write_return(self) -> None:
         """Writes a VM return command."""
-        self.__output_file.write(f"return\n")
+        if self.code is not None:
+            self.__function.append(VMCode.RETURN)
+        else:
+            self.__emit("return\n")
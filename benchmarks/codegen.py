@@ -0,0 +1,135 @@
+"""Generated-code quality benchmark.
+
+Compiles every bundled project 11 program (benchmarks/programs) in memory
+under several option sets, runs it in the headless VM emulator with a
+scripted keyboard, and reports the code size (VM commands) and the
+instructions executed. `Math.multiply` and `Math.divide` run as in the Jack
+OS (benchmarks/os, compiled with the default options), so that a call of
+them costs what it does on the Hack platform, not a single instruction;
+the rest of the OS comes from the emulator. A few small programs (CASES)
+cover miscompiles that the project 11 programs do not reach. Every option
+set must print exactly what the default build prints; otherwise the exit
+status is 1.
+Everything runs offline:
+
+    python benchmarks/codegen.py [--profile PROGRAM]
+"""
+
+import argparse
+import io
+import os
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, "..", "DemoCompiler"))
+
+import JackCompiler  # noqa: E402
+import VMEmulator  # noqa: E402
+
+PROGRAMS = os.path.join(BENCHMARKS, "programs")
+OS = os.path.join(BENCHMARKS, "os")
+OPTION_SETS = {
+    "default": {},
+    "peephole": {"peephole": True},
+    "fold-constants": {"fold_constants": True},
+    "reduce-strength": {"reduce_strength": True},
+    "direct-branches": {"direct_branches": True},
+    "all": {"peephole": True, "fold_constants": True,
+            "reduce_strength": True, "direct_branches": True},
+    "all-syntax-tree": {"peephole": True, "fold_constants": True,
+                        "reduce_strength": True, "direct_branches": True,
+                        "syntax_tree": True},
+}
+# Keys and input lines, for the programs that read the keyboard.
+SCRIPTS = {
+    "Average": {"lines": ["3", "10", "20", "33"]},
+    "Square": {"keys": [0, 0, 131, 0, 0, 133, 133, 0, 90, 0, 88, 0, 130, 0,
+                        132, 0] * 5 + [81, 0]},
+    "Pong": {"keys": [0] * 50 + [130] * 30 + [0] * 30 + [132] * 40 + [140]},
+}
+MAX_STEPS = 5_000_000
+# Small programs, by name, compiled and run like those of PROGRAMS.
+CASES = {
+    # `~a * c` in a condition: the product is of ~a, not of a.
+    "NegatedProduct": """
+class Main {
+    function void main() {
+        var int a;
+        let a = 5;
+        if (~a * 2 = -12) { do Output.printInt(7); }
+        while (~a * 4 = -24) { do Output.printInt(8); let a = 0; }
+        return;
+    }
+}
+""",
+}
+
+
+def compile_program(directory: str, options: dict) -> dict:
+    """Compile the `.jack` files of a directory in memory, by class name."""
+    program = {}
+    for input_path in JackCompiler.jack_files(directory):
+        with open(input_path) as input_file:
+            engine = JackCompiler.compile_file(input_file, None, ir=True,
+                                               **options)
+        program[engine.class_name] = engine.output_stream.code
+    return program
+
+
+def compile_case(source: str, options: dict) -> dict:
+    """Compile a one-class program of CASES, by class name."""
+    engine = JackCompiler.compile_file(io.StringIO(source), None, ir=True,
+                                       **options)
+    return {engine.class_name: engine.output_stream.code}
+
+
+def run(name: str, options: dict) -> tuple[VMEmulator.VMEmulator, int]:
+    """Compile and run one program.
+
+    Returns:
+        (the emulator after the run, the number of VM commands).
+    """
+    if name in CASES:
+        program = compile_case(CASES[name], options)
+    else:
+        program = compile_program(os.path.join(PROGRAMS, name), options)
+    size = sum(len(function) + 1 for code in program.values()
+               for function in code.functions)
+    program = {**compile_program(OS, {}), **program}
+    script = SCRIPTS.get(name, {})
+    emulator = VMEmulator.VMEmulator(program, script.get("keys", ()),
+                                     script.get("lines", ()))
+    emulator.run(MAX_STEPS)
+    return emulator, size
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", metavar="PROGRAM",
+                        help="print the profile of one program's default "
+                             "build instead")
+    args = parser.parse_args()
+    if args.profile:
+        emulator, _ = run(args.profile, {})
+        print(VMEmulator.format_report(emulator.report()))
+        return 0
+
+    failures = []
+    print(f"{'program':16}{'options':18}{'commands':>10}{'steps':>12}")
+    for name in sorted(os.listdir(PROGRAMS)) + sorted(CASES):
+        expected = None
+        for label, options in OPTION_SETS.items():
+            emulator, size = run(name, options)
+            output = "".join(emulator.output)
+            if expected is None:
+                expected = output
+            elif output != expected:
+                failures.append(f"{name} with {label}")
+            print(f"{name:16}{label:18}{size:>10}{emulator.steps:>12}")
+    for failure in failures:
+        print(f"DIFFERENT OUTPUT {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
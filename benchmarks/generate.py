@@ -0,0 +1,149 @@
+"""Deterministic synthetic Jack corpus generator.
+
+Every corpus is described by a profile: the number of classes, and per
+class the number of fields, subroutines and statements per subroutine, the
+nesting depth of if / while statements, the number of operators per
+expression and the share of string literals among terms. The same profile
+and seed always give the same sources.
+
+Usage:
+    python benchmarks/generate.py PROFILE DIRECTORY [--seed N]
+"""
+
+import argparse
+import os
+import random
+
+PROFILES: dict[str, dict[str, float]] = {
+    "baseline": dict(classes=4, fields=4, subroutines=8, statements=10,
+                     depth=2, expression=3, strings=0.05),
+    "large-classes": dict(classes=2, fields=4, subroutines=60, statements=12,
+                          depth=2, expression=3, strings=0.05),
+    "deep-nesting": dict(classes=4, fields=4, subroutines=8, statements=6,
+                         depth=7, expression=3, strings=0.05),
+    "long-expressions": dict(classes=2, fields=4, subroutines=8, statements=6,
+                             depth=1, expression=12, strings=0.05),
+    "string-heavy": dict(classes=4, fields=4, subroutines=8, statements=10,
+                         depth=2, expression=3, strings=0.6),
+    "many-fields": dict(classes=4, fields=96, subroutines=8, statements=10,
+                        depth=2, expression=3, strings=0.05),
+}
+
+OPERATORS = "+-*/&|<>="
+WORDS = ("score", "level", "Game over", "Press any key", "x = ", "lives: ",
+         "Hello, world", "loading...", "ok")
+
+
+class ClassGenerator:
+    """Generates the source of one class of a synthetic corpus."""
+
+    def __init__(self, name: str, profile: dict[str, float],
+                 rng: random.Random, classes: list[str]) -> None:
+        self.name = name
+        self.profile = profile
+        self.rng = rng
+        self.classes = classes
+        self.fields = [f"f{i}" for i in range(int(profile["fields"]))]
+        self.functions = [f"fn{i}" for i in range(int(profile["subroutines"]))]
+        self.locals = ["a", "b", "c", "i"]
+
+    def variable(self) -> str:
+        return self.rng.choice(self.locals + self.fields)
+
+    def term(self, depth: int) -> str:
+        roll = self.rng.random()
+        if roll < self.profile["strings"]:
+            return '"' + self.rng.choice(WORDS) + '"'
+        roll = self.rng.random()
+        if roll < 0.3:
+            return str(self.rng.randrange(0, 1000))
+        if roll < 0.6:
+            return self.variable()
+        if roll < 0.7:
+            return f"arr[{self.variable()}]"
+        if roll < 0.8 and depth < 2:
+            return f"({self.expression(depth + 1)})"
+        if roll < 0.9:
+            return self.rng.choice("-~") + self.variable()
+        callee = f"{self.rng.choice(self.classes)}.{self.rng.choice(self.functions)}"
+        return f"{callee}({self.variable()}, {self.rng.randrange(0, 100)})"
+
+    def expression(self, depth: int = 0) -> str:
+        count = self.rng.randint(0, int(self.profile["expression"]) * 2)
+        parts = [self.term(depth)]
+        for _ in range(count):
+            parts += [self.rng.choice(OPERATORS), self.term(depth)]
+        return " ".join(parts)
+
+    def statement(self, depth: int, indent: str) -> list[str]:
+        roll = self.rng.random()
+        if depth < self.profile["depth"] and roll < 0.3:
+            keyword = self.rng.choice(("if", "while"))
+            lines = [f"{indent}{keyword} ({self.expression()}) {{"]
+            lines += self.statements(depth + 1, indent + "  ", 3)
+            if keyword == "if" and self.rng.random() < 0.5:
+                lines.append(f"{indent}}} else {{")
+                lines += self.statements(depth + 1, indent + "  ", 2)
+            return lines + [f"{indent}}}"]
+        if roll < 0.45:
+            return [f"{indent}let arr[{self.variable()}] = {self.expression()};"]
+        if roll < 0.6:
+            callee = f"{self.rng.choice(self.classes)}.{self.rng.choice(self.functions)}"
+            return [f"{indent}do {callee}({self.expression()}, {self.variable()});"]
+        return [f"{indent}let {self.variable()} = {self.expression()};"]
+
+    def statements(self, depth: int, indent: str, count: int) -> list[str]:
+        lines = []
+        for _ in range(count):
+            lines += self.statement(depth, indent)
+        return lines
+
+    def source(self) -> str:
+        lines = [f"class {self.name} {{"]
+        if self.fields:
+            lines.append(f"  field int {', '.join(self.fields)};")
+        lines.append("  static Array arr;")
+        for function in self.functions:
+            kind = self.rng.choice(("method", "function"))
+            if kind == "function":
+                # functions cannot use fields
+                saved, self.fields = self.fields, []
+            lines.append(f"  {kind} int {function}(int a, int b) {{")
+            lines.append("    var int c, i;")
+            lines += self.statements(0, "    ", int(self.profile["statements"]))
+            lines.append(f"    return {self.expression()};")
+            lines.append("  }")
+            if kind == "function":
+                self.fields = saved
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+
+def generate(profile: str, seed: int = 0) -> dict[str, str]:
+    """Return the sources of a synthetic corpus, by class name.
+
+    Args:
+        profile: One of `PROFILES`.
+        seed: The random seed.
+    """
+    settings = PROFILES[profile]
+    rng = random.Random(f"{profile}/{seed}")
+    classes = [f"C{i}" for i in range(int(settings["classes"]))]
+    return {name: ClassGenerator(name, settings, rng, classes).source()
+            for name in classes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("profile", choices=sorted(PROFILES))
+    parser.add_argument("directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    os.makedirs(args.directory, exist_ok=True)
+    for name, source in generate(args.profile, args.seed).items():
+        with open(os.path.join(args.directory, f"{name}.jack"), "w") as jack_file:
+            jack_file.write(source)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Compiler throughput benchmark suite.
+
+Compiles every synthetic corpus (see generate.py) and every bundled
+project 11 program (benchmarks/programs), timing three stages separately:
+- tokenize: `JackTokenizer` reading and classifying the source,
+- compile:  `CompilationEngine` parsing and generating VM code in memory,
+- write:    writing the VM code to `.vm` files,
+and reports tokens per second and the peak memory of a compilation
+(tracemalloc). Times are the best of --repeat runs.
+
+Results are compared with benchmarks/baseline.json; any stage more than
+--threshold slower than its baseline is a regression, and the exit status
+is then 1. Baselines depend on the machine: record one with
+--save-baseline before comparing. Everything runs offline:
+
+    python benchmarks/run.py [--repeat N] [--threshold F] [--save-baseline]
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, "..", "DemoCompiler"))
+sys.path.insert(0, BENCHMARKS)
+
+import generate  # noqa: E402
+from CompilationEngine import CompilationEngine  # noqa: E402
+from JackTokenizer import JackTokenizer  # noqa: E402
+
+PROGRAMS = os.path.join(BENCHMARKS, "programs")
+BASELINE = os.path.join(BENCHMARKS, "baseline.json")
+STAGES = ("tokenize", "compile", "write")
+# Slowdowns smaller than this many milliseconds are timer noise.
+NOISE_MS = 2.0
+
+
+def inputs() -> dict[str, dict[str, str]]:
+    """Return every benchmark input: name -> (class name -> source)."""
+    corpora = {f"synthetic/{profile}": generate.generate(profile)
+               for profile in generate.PROFILES}
+    for program in sorted(os.listdir(PROGRAMS)):
+        directory = os.path.join(PROGRAMS, program)
+        sources = {}
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".jack"):
+                with open(os.path.join(directory, filename)) as jack_file:
+                    sources[filename[:-5]] = jack_file.read()
+        corpora[f"project11/{program}"] = sources
+    return corpora
+
+
+def compile_once(sources: dict[str, str], directory: str) -> tuple[dict[str, float], int]:
+    """Compile the sources once, timing each stage.
+
+    Returns:
+        (seconds per stage, number of tokens).
+    """
+    times = dict.fromkeys(STAGES, 0.0)
+    tokens = 0
+    for name, source in sources.items():
+        start = time.perf_counter()
+        tokenizer = JackTokenizer(io.StringIO(source))
+        tokenized = time.perf_counter()
+        output = io.StringIO()
+        CompilationEngine(tokenizer, output, buffered=True).compile_class()
+        compiled = time.perf_counter()
+        with open(os.path.join(directory, f"{name}.vm"), "w") as vm_file:
+            vm_file.write(output.getvalue())
+        written = time.perf_counter()
+        times["tokenize"] += tokenized - start
+        times["compile"] += compiled - tokenized
+        times["write"] += written - compiled
+        tokens += tokenizer.total_count
+    return times, tokens
+
+
+def peak_memory(sources: dict[str, str], directory: str) -> int:
+    """Return the peak traced memory of one compilation, in bytes."""
+    tracemalloc.start()
+    try:
+        compile_once(sources, directory)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(sources: dict[str, str], repeat: int) -> dict[str, float]:
+    """Benchmark one input; times are the best of `repeat` runs."""
+    with tempfile.TemporaryDirectory() as directory:
+        best = dict.fromkeys(STAGES, float("inf"))
+        for _ in range(repeat):
+            times, tokens = compile_once(sources, directory)
+            for stage in STAGES:
+                best[stage] = min(best[stage], times[stage])
+        memory = peak_memory(sources, directory)
+    total = sum(best.values())
+    return {
+        "tokens": tokens,
+        **{f"{stage}_ms": best[stage] * 1000 for stage in STAGES},
+        "tokens_per_sec": tokens / total if total else 0.0,
+        "peak_kib": memory / 1024,
+    }
+
+
+def regressions(results: dict[str, dict[str, float]],
+                baseline: dict[str, dict[str, float]],
+                threshold: float) -> list[str]:
+    """Return a description of every stage slower than its baseline by
+    more than the threshold (a fraction, e.g. 0.25)."""
+    found = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for key in [f"{stage}_ms" for stage in STAGES] + ["peak_kib"]:
+            before, after = reference.get(key), result[key]
+            # ignore noise on stages too short to time reliably
+            if before and after > before * (1 + threshold) \
+                    and (key == "peak_kib" or after - before > NOISE_MS):
+                found.append(f"{name} {key}: {before:.2f} -> {after:.2f} "
+                             f"({after / before - 1:+.0%})")
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per input; the best time counts")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="slowdown that counts as a regression "
+                             "(fraction, default 0.25)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="record the results as the new baseline")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'input':32}{'tokens':>8}{'tokenize':>10}{'compile':>10}"
+          f"{'write':>8}{'tokens/s':>11}{'peak KiB':>10}")
+    for name, sources in inputs().items():
+        result = results[name] = measure(sources, args.repeat)
+        print(f"{name:32}{result['tokens']:>8}{result['tokenize_ms']:>10.2f}"
+              f"{result['compile_ms']:>10.2f}{result['write_ms']:>8.2f}"
+              f"{result['tokens_per_sec']:>11.0f}{result['peak_kib']:>10.0f}")
+
+    if args.save_baseline:
+        with open(BASELINE, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"baseline saved to {os.path.relpath(BASELINE)}")
+        return 0
+    if not os.path.exists(BASELINE):
+        print("no baseline; run with --save-baseline to record one")
+        return 0
+    with open(BASELINE) as baseline_file:
+        baseline = json.load(baseline_file)
+    found = regressions(results, baseline, args.threshold)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    if not found:
+        print(f"no regressions beyond {args.threshold:.0%} of the baseline")
+    return 1 if found else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
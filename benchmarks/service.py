@@ -0,0 +1,114 @@
+"""Compile service load benchmark.
+
+Starts a compile service (DemoCompiler/JackService.py) on a temporary Unix
+socket in this process, and has --clients concurrent local clients send
+--requests single-class compile requests in total, cycling over the classes
+of the bundled project 11 programs (benchmarks/programs). Reports the
+throughput, the client-side latency percentiles and the service's own
+metrics. The exit status is 1 if any request fails or its code differs from
+an in-process `compile_source`. Everything runs offline:
+
+    python benchmarks/service.py [--clients N] [--requests N] [--workers N]
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS, "..", "DemoCompiler"))
+
+import JackCompiler  # noqa: E402
+import JackService  # noqa: E402
+
+PROGRAMS = os.path.join(BENCHMARKS, "programs")
+
+
+def sources() -> list[str]:
+    """Return the source of every bundled class."""
+    found = []
+    for program in sorted(os.listdir(PROGRAMS)):
+        for input_path in JackCompiler.jack_files(os.path.join(PROGRAMS, program)):
+            with open(input_path) as input_file:
+                found.append(input_file.read())
+    return found
+
+
+async def client(socket_path: str, work: "itertools.cycle", count: int,
+                 expected: dict[str, str], latencies: list[float],
+                 failures: list[str]) -> None:
+    """Send `count` requests one after the other."""
+    for _ in range(count):
+        source = next(work)
+        start = time.perf_counter()
+        response = await JackService.request_async({"source": source},
+                                                   socket_path)
+        latencies.append(time.perf_counter() - start)
+        if response["status"]:
+            failures.append(str(response["diagnostics"]))
+        elif response["code"] != expected[source]:
+            failures.append("different code")
+
+
+async def benchmark(args: argparse.Namespace) -> int:
+    texts = sources()
+    expected = {text: JackCompiler.compile_source(text) for text in texts}
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "service.sock")
+        server = asyncio.get_running_loop().create_task(JackService.serve(
+            socket_path, workers=args.workers, max_queue=args.clients))
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.05)
+            if server.done():
+                return server.result() or 1
+
+        work = itertools.cycle(texts)
+        latencies: list[float] = []
+        failures: list[str] = []
+        counts = [args.requests // args.clients
+                  + (index < args.requests % args.clients)
+                  for index in range(args.clients)]
+        start = time.perf_counter()
+        await asyncio.gather(*(client(socket_path, work, count, expected,
+                                      latencies, failures)
+                               for count in counts))
+        elapsed = time.perf_counter() - start
+        metrics = (await JackService.request_async(
+            {"command": "metrics"}, socket_path))["metrics"]
+        await JackService.request_async({"command": "shutdown"}, socket_path)
+        await server
+
+    latencies.sort()
+    print(f"{args.requests} requests, {args.clients} clients, "
+          f"{metrics['workers']} workers: {args.requests / elapsed:.0f} "
+          "requests/s")
+    print("client latency ms: " + ", ".join(
+        f"p{rank} {JackService.percentile(latencies, rank) * 1000:.2f}"
+        for rank in JackService.PERCENTILES))
+    print("service latency ms: " + ", ".join(
+        f"{name} {value:.2f}" for name, value in metrics["latency_ms"].items()))
+    print(f"service counts: requests {metrics['requests']}, failed "
+          f"{metrics['failed']}, timeouts {metrics['timeouts']}, rejected "
+          f"{metrics['rejected']}")
+    for failure in failures[:10]:
+        print(f"FAILED {failure}")
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16,
+                        help="concurrent clients (default %(default)s)")
+    parser.add_argument("--requests", type=int, default=400,
+                        help="requests in total (default %(default)s)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="service worker processes (default: all cores)")
+    return asyncio.run(benchmark(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
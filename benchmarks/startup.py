@@ -0,0 +1,125 @@
+"""Compiler startup benchmark.
+
+For a single small file, starting the interpreter and importing the
+compiler take most of the wall time. This measures, each in a fresh
+interpreter and as the best of --repeat runs:
+- import:      importing JackCompiler,
+- first_token: importing it and reading the first token of a trivial class,
+- cli:         importing it and compiling the trivial class with
+               `JackCompiler.main(["--no-cache", path])`, in wall time minus
+               the startup of a bare interpreter (`python -c pass`).
+It also checks that the command line never imports the heavy modules that
+only parallel builds, the services and profiling need.
+
+The exit status is 1 if a time is over its budget (scaled by --scale, for
+slow machines) or a heavy module is imported. Everything runs offline:
+
+    python benchmarks/startup.py [--repeat N] [--scale F]
+"""
+
+import argparse
+import compileall
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+COMPILER = os.path.abspath(os.path.join(BENCHMARKS, "..", "DemoCompiler"))
+
+TRIVIAL = "class Main {\n    function void main() {\n        return;\n    }\n}\n"
+# Milliseconds; today's times are about half of these.
+BUDGETS_MS = {"import": 45.0, "first_token": 50.0, "cli": 60.0}
+HEAVY_MODULES = ("concurrent.futures", "multiprocessing", "asyncio",
+                 "cProfile", "socketserver")
+
+# Each runs in a fresh interpreter and prints the seconds taken; the last
+# one then prints which of the heavy modules it imported.
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import JackCompiler
+print(time.perf_counter() - start)
+"""
+FIRST_TOKEN_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import JackCompiler
+tokenizer = JackCompiler.JackTokenizer(open(sys.argv[1]))
+tokenizer.advance()
+print(time.perf_counter() - start)
+"""
+CLI_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import JackCompiler
+JackCompiler.main(["--no-cache", sys.argv[1]])
+print(time.perf_counter() - start)
+print(" ".join(name for name in sys.argv[2:] if name in sys.modules))
+"""
+
+
+def run_python(arguments: list[str]) -> tuple[float, str]:
+    """Run the interpreter from the compiler's directory.
+
+    Returns:
+        (wall seconds, stdout).
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, *arguments], cwd=COMPILER,
+                            capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, result.stdout
+
+
+def measure(repeat: int, source_path: str) -> tuple[dict[str, float], list[str]]:
+    """Return the best times in ms, and the heavy modules the CLI imported."""
+    best = dict.fromkeys(BUDGETS_MS, float("inf"))
+    interpreter = float("inf")
+    heavy: set[str] = set()
+    for _ in range(repeat):
+        interpreter = min(interpreter, run_python(["-c", "pass"])[0])
+        _, output = run_python(["-c", IMPORT_SCRIPT])
+        best["import"] = min(best["import"], float(output.split()[0]))
+        _, output = run_python(["-c", FIRST_TOKEN_SCRIPT, source_path])
+        best["first_token"] = min(best["first_token"], float(output.split()[0]))
+        wall, output = run_python(["-c", CLI_SCRIPT, source_path,
+                                   *HEAVY_MODULES])
+        best["cli"] = min(best["cli"], wall - interpreter)
+        heavy.update(output.splitlines()[1].split())
+    return {name: seconds * 1000 for name, seconds in best.items()}, sorted(heavy)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="runs per measure; the best time counts")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply the budgets, e.g. 2 on a slow machine")
+    args = parser.parse_args()
+
+    # like an installed compiler, start from up-to-date bytecode
+    compileall.compile_dir(COMPILER, quiet=1)
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, "Main.jack")
+        with open(source_path, "w") as source_file:
+            source_file.write(TRIVIAL)
+        times, heavy = measure(args.repeat, source_path)
+
+    failures = []
+    print(f"{'measure':14}{'ms':>8}{'budget':>8}")
+    for name, milliseconds in times.items():
+        budget = BUDGETS_MS[name] * args.scale
+        print(f"{name:14}{milliseconds:>8.1f}{budget:>8.0f}")
+        if milliseconds > budget:
+            failures.append(f"{name} took {milliseconds:.1f} ms, over its "
+                            f"{budget:.0f} ms budget")
+    if heavy:
+        failures.append(f"the command line imported {', '.join(heavy)}")
+    for failure in failures:
+        print(f"FAILED {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Benchmark: VM instruction counts with and without strength reduction.
+
+Compiles a generated class that multiplies and divides by a range of
+constants, with and without `--reduce-strength`, and prints for each:
+- the VM commands emitted (code size),
+- the `Math.multiply` / `Math.divide` calls left,
+- the VM commands one pass over the code executes, counting each call at
+  the cost model's estimate.
+
+Usage:
+    python benchmarks/strength_reduction.py [--multiply-cost N] [--max-length N]
+                                            [--max-growth N] [--growth-cost N]
+"""
+
+import argparse
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "DemoCompiler"))
+
+from JackCompiler import compile_file  # noqa: E402
+from StrengthReducer import CostModel  # noqa: E402
+
+CONSTANTS = list(range(-4, 17)) + [24, 31, 32, 100, 255, 1000]
+
+
+def generate_source() -> str:
+    """Return a class using `x * c`, `c * x` and `x / c` for each constant."""
+    lines = ["class Main {", "  function int main(int x) {", "    var int y;"]
+    for constant in CONSTANTS:
+        literal = str(constant) if constant >= 0 else f"(-{-constant})"
+        lines.append(f"    let y = y + (x * {literal});")
+        lines.append(f"    let y = y + ({literal} * x);")
+        if constant != 0:
+            lines.append(f"    let y = y + (x / {literal});")
+    lines += ["    return y;", "  }", "}", ""]
+    return "\n".join(lines)
+
+
+def measure(source: str, costs: CostModel, **options) -> dict[str, int]:
+    """Compile the source and count its VM commands and calls."""
+    output = io.StringIO()
+    compile_file(io.StringIO(source), output, **options)
+    commands = [line for line in output.getvalue().splitlines()
+                if line and not line.startswith(("function", "label"))]
+    multiplies = sum(line == "call Math.multiply 2" for line in commands)
+    divides = sum(line == "call Math.divide 2" for line in commands)
+    executed = (len(commands) + multiplies * costs.multiply_cost
+                + divides * costs.divide_cost)
+    return {"commands": len(commands), "multiply calls": multiplies,
+            "divide calls": divides, "executed (est.)": executed}
+
+
+def main() -> None:
+    defaults = CostModel()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--multiply-cost", type=int,
+                        default=defaults.multiply_cost)
+    parser.add_argument("--divide-cost", type=int, default=defaults.divide_cost)
+    parser.add_argument("--max-length", type=int, default=defaults.max_length)
+    parser.add_argument("--max-growth", type=int, default=defaults.max_growth)
+    parser.add_argument("--growth-cost", type=int, default=defaults.growth_cost)
+    args = parser.parse_args()
+    cost = {"multiply_cost": args.multiply_cost,
+            "divide_cost": args.divide_cost, "max_length": args.max_length,
+            "max_growth": args.max_growth, "growth_cost": args.growth_cost}
+    cost_model = CostModel(**cost)
+
+    source = generate_source()
+    baseline = measure(source, cost_model)
+    reduced = measure(source, cost_model, reduce_strength=True,
+                      cost_model=cost)
+    print(f"{'':20}{'baseline':>10}{'reduced':>10}{'change':>9}")
+    for name, before in baseline.items():
+        after = reduced[name]
+        change = f"{(after - before) / before:+.0%}" if before else "-"
+        print(f"{name:20}{before:>10}{after:>10}{change:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Syntax tree memory and time benchmark.
+
+Parses every benchmark input (the synthetic corpora and the project 11
+programs, as in run.py) into syntax trees (DemoCompiler/SyntaxTree.py) and
+reports the tree nodes and memory per token, with the time to build the
+trees ("parse", tokenizing included) and to compile from them ("walk"),
+next to the time of a direct compile (tokenizing included). The
+memory of a tree is what tracemalloc sees allocated, and still held, while
+parsing an already tokenized class.
+
+The exit status is 1 if any input's tree takes more than --budget bytes per
+token, or compiles to different code than its source. Everything runs
+offline:
+
+    python benchmarks/tree.py [--repeat N] [--budget BYTES]
+"""
+
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+
+import run  # also puts DemoCompiler on the path
+from CompilationEngine import CompilationEngine  # noqa: E402
+from JackTokenizer import JackTokenizer  # noqa: E402
+import SyntaxTree  # noqa: E402
+
+# Bytes of tree per token; the trees take 20 to 40 today.
+DEFAULT_BUDGET = 64
+
+
+def tree_memory(source: str) -> tuple[int, int, int]:
+    """Return the tokens, nodes and bytes of the syntax tree of a class."""
+    tokenizer = JackTokenizer(io.StringIO(source))
+    tracemalloc.start()
+    try:
+        tree = SyntaxTree.parse(tokenizer)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return tokenizer.total_count, sum(1 for _ in SyntaxTree.walk(tree)), size
+
+
+def compile_direct(source: str) -> str:
+    output = io.StringIO()
+    CompilationEngine(JackTokenizer(io.StringIO(source)), output,
+                      buffered=True).compile_class()
+    return output.getvalue()
+
+
+def compile_from_tree(tree: SyntaxTree.Class, tokenizer: JackTokenizer) -> str:
+    output = io.StringIO()
+    SyntaxTree.TreeCompiler(tree, tokenizer, output,
+                            buffered=True).compile_class()
+    return output.getvalue()
+
+
+def best_time(function, argument, repeat: int) -> float:
+    """Return the best of `repeat` timings of function(argument), in ms."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def measure(sources: dict[str, str], repeat: int) -> dict[str, float]:
+    """Benchmark one input, summed over its classes."""
+    result = dict.fromkeys(("tokens", "nodes", "bytes", "parse_ms",
+                            "walk_ms", "direct_ms", "different"), 0)
+    for source in sources.values():
+        tokens, nodes, size = tree_memory(source)
+        result["tokens"] += tokens
+        result["nodes"] += nodes
+        result["bytes"] += size
+        result["parse_ms"] += best_time(
+            lambda text: SyntaxTree.parse(JackTokenizer(io.StringIO(text))),
+            source, repeat)
+        tokenizer = JackTokenizer(io.StringIO(source))
+        tree = SyntaxTree.parse(tokenizer)
+        result["walk_ms"] += best_time(
+            lambda tree: compile_from_tree(tree, tokenizer), tree, repeat)
+        result["direct_ms"] += best_time(compile_direct, source, repeat)
+        result["different"] += \
+            compile_from_tree(tree, tokenizer) != compile_direct(source)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs per input; the best time counts")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET,
+                        help="most tree bytes allowed per token "
+                             f"(default {DEFAULT_BUDGET})")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'input':32}{'tokens':>8}{'nodes':>8}{'KiB':>8}{'B/token':>9}"
+          f"{'parse':>8}{'walk':>8}{'direct':>8}")
+    for name, sources in run.inputs().items():
+        result = measure(sources, args.repeat)
+        per_token = result["bytes"] / result["tokens"]
+        print(f"{name:32}{result['tokens']:>8}{result['nodes']:>8}"
+              f"{result['bytes'] / 1024:>8.0f}{per_token:>9.1f}"
+              f"{result['parse_ms']:>8.2f}{result['walk_ms']:>8.2f}"
+              f"{result['direct_ms']:>8.2f}")
+        if per_token > args.budget:
+            failures.append(f"{name}: {per_token:.1f} bytes per token")
+        if result["different"]:
+            failures.append(f"{name}: {result['different']} class(es) "
+                            "compile differently from their tree")
+    for failure in failures:
+        print(f"FAILED {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())